@@ -0,0 +1,99 @@
+"""Compara o EventStore em SQLite com o SegmentedEventStore.
+
+Mede a vazão de append (escritores concorrentes, um agregado por thread) e
+o tempo de replay completo do log.
+
+Uso:
+    python benchmarks/event_store_benchmark.py [--writers 8] [--events 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def run_writers(event_store, writers: int, events: int) -> float:
+    from domain.events import UserUpdatedEvent
+
+    def write(aggregate_id):
+        for version in range(events):
+            event_store.append_events(
+                aggregate_id,
+                [UserUpdatedEvent(aggregate_id, {"salary": 1000 + version})],
+                version,
+            )
+
+    threads = [
+        threading.Thread(target=write, args=(aggregate_id,))
+        for aggregate_id in range(1, writers + 1)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def replay_sqlite() -> int:
+    from infrastructure.db.database import get_db_connection
+
+    with get_db_connection(readonly=True) as conn:
+        cursor = conn.execute(
+            "SELECT id, event_type, aggregate_id, data, occurred_at, version "
+            "FROM events ORDER BY id"
+        )
+        return sum(1 for _ in cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    sys.path.insert(0, SRC_DIR)
+
+    from infrastructure.db.database import init_db
+    from infrastructure.db.event_store import EventStore
+    from infrastructure.eventlog.segmented_event_store import SegmentedEventStore
+
+    init_db()
+    total = args.writers * args.events
+    results = []
+
+    elapsed = run_writers(EventStore(), args.writers, args.events)
+    start = time.perf_counter()
+    replayed = replay_sqlite()
+    results.append(("sqlite", elapsed, time.perf_counter() - start, replayed))
+
+    # "segmented" espera o fsync do grupo; "segmented-nw" não, como o SQLite em
+    # WAL com synchronous=NORMAL
+    for name, wait_for_fsync in (("segmented", True), ("segmented-nw", False)):
+        segmented = SegmentedEventStore(
+            os.path.join(workdir, name), wait_for_fsync=wait_for_fsync
+        )
+        elapsed = run_writers(segmented, args.writers, args.events)
+        start = time.perf_counter()
+        replayed = sum(1 for _ in segmented.replay())
+        results.append((name, elapsed, time.perf_counter() - start, replayed))
+        segmented.close()
+
+    print(f"{total} eventos, {args.writers} escritores")
+    print(f"{'backend':<14}{'append ev/s':>14}{'replay ev/s':>14}")
+    for name, append_time, replay_time, replayed in results:
+        print(
+            f"{name:<14}{total / append_time:>14,.0f}"
+            f"{replayed / replay_time:>14,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Teste de carga HTTP contra uma instância rodando da API.
+
+Cada cliente usa uma conexão keep-alive própria e executa um mix de leituras
+e escritas durante --duration segundos. Ao final imprime throughput e
+latências (p50/p95/p99) por tipo de request.
+
+Com --tenants N (servidor com TENANT_DATA_DIR) os clientes são distribuídos
+entre N tenants, cada um com seus próprios usuários e arquivo de banco.
+
+Uso:
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --clients 32
+"""
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+# (peso, nome) do mix de requests
+REQUEST_MIX = [
+    (50, "get_user"),
+    (20, "get_events"),
+    (15, "list_users"),
+    (10, "update_user"),
+    (5, "create_user"),
+]
+
+
+class Client:
+    def __init__(self, url: str, user_ids: list, tenant: str = None):
+        parsed = urllib.parse.urlparse(url)
+        self.conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+        self.user_ids = user_ids
+        self.tenant = tenant
+
+    def request(self, method: str, path: str, body=None) -> int:
+        headers = {}
+        if self.tenant:
+            headers["X-Tenant-ID"] = self.tenant
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        if method == "POST" and response.status == 201:
+            self.user_ids.append(json.loads(data)["id"])
+        return response.status
+
+    def run(self, kind: str) -> int:
+        user_id = random.choice(self.user_ids)
+        if kind == "get_user":
+            return self.request("GET", f"/user/{user_id}")
+        if kind == "get_events":
+            return self.request("GET", f"/user/{user_id}/events")
+        if kind == "list_users":
+            return self.request("GET", "/user/")
+        if kind == "update_user":
+            return self.request(
+                "PUT",
+                f"/user/{user_id}",
+                {
+                    "name": f"Load {random.randint(0, 10**6)}",
+                    "email": f"load-{user_id}@example.com",
+                    "salary": float(random.randint(3000, 9000)),
+                },
+            )
+        return self.request(
+            "POST",
+            "/user/",
+            {
+                "name": "Load Test",
+                "email": f"load-{time.time_ns()}-{random.random()}@example.com",
+                "salary": 5000.0,
+            },
+        )
+
+
+def seed(url: str, count: int, tenant: str = None) -> list:
+    client = Client(url, [], tenant)
+    for i in range(count):
+        client.request(
+            "POST",
+            "/user/",
+            {"name": f"Seed {i}", "email": f"seed-{time.time_ns()}@example.com"},
+        )
+    return client.user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed-users", type=int, default=50)
+    parser.add_argument("--tenants", type=int, default=0)
+    args = parser.parse_args()
+
+    tenants = [f"load-{i}" for i in range(args.tenants)] or [None]
+    user_ids = {tenant: seed(args.url, args.seed_users, tenant) for tenant in tenants}
+    weights, kinds = zip(*REQUEST_MIX)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(tenant):
+        client = Client(args.url, user_ids[tenant], tenant)
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = client.run(kind)
+            except (OSError, http.client.HTTPException):
+                client = Client(args.url, user_ids[tenant], tenant)
+                status = 599
+            local[kind].append(time.perf_counter() - start)
+            if status >= 500:
+                local_errors[kind] += 1
+        with lock:
+            for kind, samples in local.items():
+                latencies[kind].extend(samples)
+            for kind, count in local_errors.items():
+                errors[kind] += count
+
+    threads = [
+        threading.Thread(target=worker, args=(tenants[i % len(tenants)],))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"clients={args.clients} tenants={args.tenants} duration={args.duration}s")
+    print(f"total: {total} requests, {total / args.duration:.1f} req/s")
+    for kind in kinds:
+        samples = sorted(latencies[kind])
+        if not samples:
+            continue
+        pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+        print(
+            f"  {kind:12s} n={len(samples):6d} "
+            f"p50={statistics.median(samples) * 1000:7.2f}ms "
+            f"p95={pct(0.95):7.2f}ms p99={pct(0.99):7.2f}ms errors={errors[kind]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Verifica se os comandos SQL mais usados continuam usando os índices esperados.
+
+Popula um banco temporário, executa os caminhos quentes do repositório e do
+EventStore coletando o EXPLAIN QUERY PLAN de cada comando e falha (código 1)
+se algum deles não usar o índice esperado. Scans em tabelas grandes fora da
+lista são listados com uma sugestão de índice.
+
+Uso:
+    python benchmarks/query_plan_check.py [--users 2000] [--events 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# (descrição, trecho do SQL que identifica o comando, índice esperado no plano)
+HOT_STATEMENTS = (
+    ("user by id", "FROM users WHERE id = ?", "INTEGER PRIMARY KEY"),
+    ("user version", "SELECT version, updated_at FROM users", "INTEGER PRIMARY KEY"),
+    ("append version check", "SELECT MAX(version)", "idx_events_aggregate_version"),
+    ("previous event id", "WHERE aggregate_id = ? AND id < ?", "idx_events_aggregate_id"),
+    ("user history", "WHERE aggregate_id = ?\n", "idx_events_aggregate_id"),
+    ("history tail probe", "AS id FROM events WHERE aggregate_id", "idx_events_aggregate_id"),
+    ("aggregate watermark", "AND event_type NOT IN (?", "idx_events_aggregate_id"),
+    ("state watermark", "COALESCE(MAX(id), 0) AS id FROM events", "idx_events_state"),
+    ("events by type", "WHERE event_type = ?", "idx_events_type"),
+    ("event query by type", "WHERE event_type IN (?", "idx_events_type_time"),
+    ("event query by actor", "WHERE actor = ?", "idx_events_actor_time"),
+    ("event query by time", "WHERE occurred_at >= ?", "idx_events_time"),
+)
+
+
+def seed(users: int, events_per_user: int):
+    """Usuários e eventos inseridos direto no banco, em uma transação"""
+    from domain.enums import Department
+    from infrastructure.db.database import transaction
+
+    departments = [department.value for department in Department]
+    start = datetime(2024, 1, 1)
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (name, email, department, salary) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    f"User {n}",
+                    f"user{n}@example.com",
+                    departments[n % len(departments)],
+                    1000.0 + n,
+                )
+                for n in range(1, users + 1)
+            ),
+        )
+        conn.executemany(
+            """
+            INSERT INTO events (event_type, aggregate_id, data, occurred_at, version, actor)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            (
+                (
+                    "user.salary.changed" if version > 1 else "user.created",
+                    user_id,
+                    json.dumps({"new_salary": 1000 + version, "changed_by": 1}),
+                    (start + timedelta(minutes=user_id * 7 + version)).isoformat(),
+                    version,
+                    1 if version > 1 else None,
+                )
+                for version in range(1, events_per_user + 1)
+                for user_id in range(1, users + 1)
+            ),
+        )
+
+
+def workload(users: int):
+    """Os caminhos quentes, como a API os chama"""
+    from domain.events import UserUpdatedEvent
+    from infrastructure.db.event_store import EventStore
+    from infrastructure.db.sqlite_user_repository import SqliteUserRepository
+
+    repository = SqliteUserRepository()
+    event_store = EventStore()
+    user_id = users // 2
+    repository.get_user_by_id(user_id)
+    repository.get_user_version(user_id)
+    version = event_store.get_events_by_aggregate(user_id)[-1].version
+    event_store.append_events(
+        user_id, [UserUpdatedEvent(user_id, {"salary": 1.0})], version
+    )
+    event_store.get_recent_raw_events(user_id, 10)
+    event_store.get_aggregate_watermark(user_id)
+    event_store.get_state_watermark()
+    event_store.get_events_by_type("user.created")
+    event_store.query_events(event_types=["user.salary.changed"], limit=100)
+    event_store.query_events(actor=1, limit=100)
+    event_store.query_events(since="2024-01-02T00:00:00", limit=100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20, help="events per user")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "plans.db")
+    os.environ.setdefault("LARGE_TABLE_ROWS", str(min(args.users, 10_000)))
+    # só os planos interessam aqui (e a coleta depende das conexões instrumentadas)
+    os.environ["SLOW_QUERY_MS"] = "60000"
+    sys.path.insert(0, SRC_DIR)
+
+    from infrastructure.db.database import init_db
+    from infrastructure.db.query_log import capture_plans
+
+    init_db()
+    seed(args.users, args.events)
+    with capture_plans() as plans:
+        workload(args.users)
+
+    failures = 0
+    print(f"{'statement':<24}{'expected index':<32}plan")
+    for name, fragment, expected in HOT_STATEMENTS:
+        matches = [analysis for sql, analysis in plans if fragment in sql and analysis]
+        if not matches:
+            failures += 1
+            print(f"{name:<24}{expected:<32}NOT EXECUTED")
+            continue
+        for analysis in matches:
+            ok = expected in analysis["indexes"]
+            failures += not ok
+            status = "ok" if ok else "FAIL"
+            print(f"{name:<24}{expected:<32}{status}: {'; '.join(analysis['plan'])}")
+
+    scans = [(sql, analysis) for sql, analysis in plans if analysis and analysis["large_scans"]]
+    if scans:
+        print("\nscans on large tables:")
+    for sql, analysis in scans:
+        print(f"  {' '.join(sql.split())[:120]}")
+        for suggestion in analysis["suggestions"]:
+            print(f"    suggestion: {suggestion}")
+
+    if failures:
+        print(f"\n{failures} statement(s) not using the expected index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Mede o tempo de cold start da aplicação.
+
+Cada amostra roda em um processo novo para medir o custo real de import
+do controller e de ``create_app()``, além do primeiro request (que dispara
+a inicialização lazy do banco e dos handlers).
+
+Uso:
+    python benchmarks/startup_benchmark.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+SNIPPETS = {
+    "import user_controller": "import infrastructure.web.user_controller",
+    "create_app()": (
+        "from infrastructure.db.routes import create_app\n" "create_app()"
+    ),
+    "create_app() + first request": (
+        "from infrastructure.db.routes import create_app\n"
+        "create_app().test_client().get('/user/')"
+    ),
+}
+
+TIMER = """
+import time
+_start = time.perf_counter()
+{snippet}
+print(time.perf_counter() - _start)
+"""
+
+
+def measure(snippet: str, runs: int, env: dict) -> list:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", TIMER.format(snippet=snippet)],
+            cwd=SRC_DIR,
+            env=env,
+            stderr=subprocess.DEVNULL,
+        )
+        samples.append(float(output.decode().strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, "bench.db"))
+        for label, snippet in SNIPPETS.items():
+            samples = measure(snippet, args.runs, env)
+            print(
+                f"{label:32s} median={statistics.median(samples) * 1000:8.2f}ms "
+                f"min={min(samples) * 1000:8.2f}ms max={max(samples) * 1000:8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
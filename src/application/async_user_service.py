@@ -0,0 +1,83 @@
+from typing import AsyncIterator, List, Optional
+from application.user_service import UserService
+from domain.user import User
+from infrastructure.db.async_storage import (
+    AsyncEventStore,
+    AsyncSqliteUserRepository,
+    run_blocking,
+)
+
+
+class AsyncUserService:
+    """Asyncio facade over UserService
+
+    Reads go through the async repository and event store. Writes run the
+    synchronous UserService operation as a single executor job, because its
+    transaction is bound to the thread that opened it.
+    """
+
+    def __init__(
+        self,
+        user_service: UserService,
+        user_repository: AsyncSqliteUserRepository = None,
+        event_store: AsyncEventStore = None,
+    ):
+        self.user_service = user_service
+        self.user_repository = user_repository or AsyncSqliteUserRepository(
+            user_service.user_repository
+        )
+        self.event_store = event_store or AsyncEventStore(user_service.event_store)
+
+    async def get_user(self, user_id: int, queried_by: int = None) -> Optional[User]:
+        """Fetch a user and publish query event"""
+        user = await self.user_repository.get_user_by_id(user_id)
+        if user:
+            await run_blocking(self.user_service.record_user_query, user_id, queried_by)
+        return user
+
+    async def get_all_users(self, queried_by: int = None) -> List[User]:
+        """Fetch all users and publish query event"""
+        return await run_blocking(self.user_service.get_all_users, None, queried_by)
+
+    async def get_user_events_raw(
+        self, user_id: int, queried_by: int = None
+    ) -> AsyncIterator[list]:
+        """Iterate batches of stored event rows of a user"""
+        await run_blocking(
+            self.user_service.record_user_events_query, user_id, queried_by
+        )
+        return self.event_store.iter_raw_events_by_aggregate(user_id)
+
+    async def create_user(self, user_data: dict) -> User:
+        return await run_blocking(self.user_service.create_user, user_data)
+
+    async def update_user(
+        self,
+        user_id: int,
+        user_data: dict,
+        changed_by: int = None,
+        expected_version: int = None,
+    ) -> Optional[User]:
+        return await run_blocking(
+            self.user_service.update_user,
+            user_id,
+            user_data,
+            changed_by,
+            expected_version,
+        )
+
+    async def delete_user(self, user_id: int, expected_version: int = None) -> bool:
+        return await run_blocking(
+            self.user_service.delete_user, user_id, expected_version
+        )
+
+    async def change_position(
+        self, user_id: int, new_position: str, new_salary: float, changed_by: int = None
+    ) -> Optional[User]:
+        return await run_blocking(
+            self.user_service.change_position,
+            user_id,
+            new_position,
+            new_salary,
+            changed_by,
+        )
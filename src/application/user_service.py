@@ -1,6 +1,9 @@
-from domain.user import User
+import copy
+from domain.user import USER_FIELDS, User, rebuild_user_image, validate_user_changes
+from domain.exceptions import ConcurrencyError
 from domain.repositories import UserRepository
 from domain.events import (
+    DomainEvent,
     UserCreatedEvent,
     UserUpdatedEvent,
     UserDeletedEvent,
@@ -24,7 +27,10 @@ from domain.events import (
 )
 from infrastructure.event_bus import get_event_bus
 from infrastructure.db.event_store import EventStore
-from typing import Optional, List
+from typing import Optional, List, Tuple
+
+# conflicts are detected before anything is written, so a retry only costs a re-read
+MAX_CONFLICT_RETRIES = 3
 
 
 class UserService:
@@ -44,12 +50,41 @@ class UserService:
 
         return user
 
+    def get_user_watermark(self, user_id: int) -> Optional[Tuple[int, str]]:
+        """Return (event id, occurred_at) of the last state change of a user"""
+        return self.event_store.get_aggregate_watermark(user_id)
+
+    def get_state_watermark(self) -> int:
+        """Return the id of the last event that changed any user (0 if none)
+
+        Query events don't count, so reads never move it.
+        """
+        return self.event_store.get_state_watermark()
+
+    def record_user_query(self, user_id: int, queried_by: int = None):
+        """Publish the query event without loading the user (conditional hits)"""
+        event = UserQueriedEvent(user_id, queried_by)
+        self.event_store.save_event(event)
+        self.event_bus.publish(event)
+
+    def record_user_events_query(self, user_id: int, queried_by: int = None):
+        """Publish the events query event without reading the history"""
+        event = UserEventsQueriedEvent(user_id, queried_by)
+        self.event_store.save_event(event)
+        self.event_bus.publish(event)
+
+    def get_user_version(self, user_id: int) -> Optional[Tuple[int, str]]:
+        """Return (version, updated_at) of an active user without loading it"""
+        return self.user_repository.get_user_version(user_id)
+
     def create_user(self, user_data: dict) -> User:
+        user_data = {k: v for k, v in user_data.items() if k != "version"}
         user = User(**user_data)
-        created_user = self.user_repository.create_user(user)
+        with self._transaction():
+            created_user = self.user_repository.create_user(user)
+            event = UserCreatedEvent(created_user.id, user_data)
+            self.event_store.append_events(created_user.id, [event], 0)
 
-        event = UserCreatedEvent(created_user.id, user_data)
-        self.event_store.save_event(event)
         self.event_bus.publish(event)
 
         return created_user
@@ -57,21 +92,96 @@ class UserService:
     def get_all_users(self, filters: dict = None, queried_by: int = None) -> List[User]:
         """Fetch all users and publish query event"""
         users = self.user_repository.get_all_users()
+        self.record_user_list_query(filters, queried_by)
+        return users
 
+    def record_user_list_query(self, filters: dict = None, queried_by: int = None):
+        """Publish the list query event without reading the users (cache hits)"""
         event = UserListQueriedEvent(filters, queried_by)
         self.event_store.save_event(event)
         self.event_bus.publish(event)
 
-        return users
-
     def update_user(
-        self, user_id: int, user_data: dict, changed_by: int = None
+        self,
+        user_id: int,
+        user_data: dict,
+        changed_by: int = None,
+        expected_version: int = None,
     ) -> Optional[User]:
-        """Update user and publish events for each detected change"""
-        current_user = self.user_repository.get_user_by_id(user_id)
+        """Update user and publish events for each detected change
+
+        With expected_version (from If-Match or a "version" field in the payload)
+        a stale update raises ConcurrencyError. Without it, an update that races
+        another writer is retried against the fresh state.
+        """
+        user_data = dict(user_data)
+        body_version = user_data.pop("version", None)
+        if expected_version is None:
+            expected_version = body_version
+        return self._update_with_retry(
+            lambda: self._update_user(user_id, user_data, changed_by, expected_version),
+            retry=expected_version is None,
+        )
+
+    def _transaction(self):
+        """Repository transaction; the event store writes its events on commit"""
+        return self.event_store.transaction(self.user_repository.transaction())
+
+    def _update_with_retry(self, attempt, retry: bool):
+        """Run attempt(), re-running it on ConcurrencyError when retry is allowed"""
+        attempts = MAX_CONFLICT_RETRIES if retry else 1
+        for remaining in reversed(range(attempts)):
+            try:
+                return attempt()
+            except ConcurrencyError:
+                if not remaining:
+                    raise
+
+    def _update_user(
+        self,
+        user_id: int,
+        user_data: dict,
+        changed_by: int = None,
+        expected_version: int = None,
+        extra_events: List[DomainEvent] = (),
+        current_user: User = None,
+    ) -> Optional[User]:
+        current_user = current_user or self.user_repository.get_user_by_id(user_id)
         if not current_user:
             return None
+        if expected_version is not None and expected_version != current_user.version:
+            raise ConcurrencyError(user_id, expected_version, current_user.version)
+
+        events = list(extra_events)
+        events += self._change_events(user_id, current_user, user_data, changed_by)
+
+        user = User(**user_data)
+        # PUT replaces every field; the event stores only the ones that changed
+        diff = {
+            field: getattr(user, field)
+            for field in USER_FIELDS
+            if getattr(user, field) != getattr(current_user, field)
+        }
+        with self._transaction():
+            # the conditional UPDATE is the write gate: losers fail here, before
+            # any change event is stored
+            updated_user = self.user_repository.update_user(
+                user_id, user, expected_version=current_user.version
+            )
+            if not updated_user:
+                return None
+            events.append(UserUpdatedEvent(user_id, diff, current_user.version))
+            self.event_store.append_events(user_id, events, current_user.version)
+
+        for event in events:
+            self.event_bus.publish(event)
+
+        return updated_user
 
+    def _change_events(
+        self, user_id: int, current_user: User, user_data: dict, changed_by: int = None
+    ) -> List[DomainEvent]:
+        """Change events for the fields of user_data that differ from current_user"""
         field_event_map = {
             "name": lambda old, new: UserNameChangedEvent(user_id, old, new),
             "email": lambda old, new: UserEmailChangedEvent(user_id, old, new),
@@ -94,42 +204,104 @@ class UserService:
             ),
         }
 
+        events = []
         for field, event_factory in field_event_map.items():
             if field in user_data:
                 old_value = getattr(current_user, field)
                 new_value = user_data[field]
                 if old_value != new_value:
-                    event = event_factory(old_value, new_value)
-                    self.event_store.save_event(event)
-                    self.event_bus.publish(event)
+                    events.append(event_factory(old_value, new_value))
 
         if (
             "is_active" in user_data
             and user_data["is_active"] != current_user.is_active
         ):
             if user_data["is_active"]:
-                event = UserActivatedEvent(user_id, changed_by)
+                events.append(UserActivatedEvent(user_id, changed_by))
             else:
-                event = UserDeactivatedEvent(user_id, changed_by)
-            self.event_store.save_event(event)
-            self.event_bus.publish(event)
+                events.append(UserDeactivatedEvent(user_id, changed_by))
+        return events
 
-        user = User(**user_data)
-        updated_user = self.user_repository.update_user(user_id, user)
+    def patch_user(
+        self,
+        user_id: int,
+        changes: dict,
+        changed_by: int = None,
+        expected_version: int = None,
+    ) -> Optional[User]:
+        """Apply a sparse update, writing and publishing only the fields that changed
 
-        if updated_user:
-            event = UserUpdatedEvent(user_id, user_data)
-            self.event_store.save_event(event)
+        Same concurrency rules as update_user. A patch that changes nothing
+        writes nothing and returns the current user.
+        """
+        changes = dict(changes)
+        body_version = changes.pop("version", None)
+        if expected_version is None:
+            expected_version = body_version
+        validate_user_changes(changes)
+        return self._update_with_retry(
+            lambda: self._patch_user(user_id, changes, changed_by, expected_version),
+            retry=expected_version is None,
+        )
+
+    def _patch_user(
+        self,
+        user_id: int,
+        changes: dict,
+        changed_by: int = None,
+        expected_version: int = None,
+        extra_events: List[DomainEvent] = (),
+        current_user: User = None,
+    ) -> Optional[User]:
+        current_user = current_user or self.user_repository.get_user_by_id(user_id)
+        if not current_user:
+            return None
+        if expected_version is not None and expected_version != current_user.version:
+            raise ConcurrencyError(user_id, expected_version, current_user.version)
+
+        diff = {
+            field: value
+            for field, value in changes.items()
+            if getattr(current_user, field) != value
+        }
+        if not diff and not extra_events:
+            return current_user
+
+        events = list(extra_events)
+        events += self._change_events(user_id, current_user, diff, changed_by)
+        with self._transaction():
+            version = self.user_repository.patch_user(
+                user_id, diff, expected_version=current_user.version
+            )
+            if version is None:
+                return None
+            events.append(UserUpdatedEvent(user_id, diff, current_user.version))
+            self.event_store.append_events(user_id, events, current_user.version)
+
+        for event in events:
             self.event_bus.publish(event)
 
+        updated_user = copy.copy(current_user)
+        for field, value in diff.items():
+            setattr(updated_user, field, value)
+        updated_user.version = version
         return updated_user
 
-    def delete_user(self, user_id: int) -> bool:
-        deleted = self.user_repository.delete_user(user_id)
+    def delete_user(self, user_id: int, expected_version: int = None) -> bool:
+        current_version = self.user_repository.get_user_version(user_id)
+        if not current_version:
+            return False
+        version = current_version[0]
+        if expected_version is not None and expected_version != version:
+            raise ConcurrencyError(user_id, expected_version, version)
+
+        with self._transaction():
+            deleted = self.user_repository.delete_user(user_id, expected_version=version)
+            if deleted:
+                event = UserDeletedEvent(user_id)
+                self.event_store.append_events(user_id, [event], version)
 
         if deleted:
-            event = UserDeletedEvent(user_id)
-            self.event_store.save_event(event)
             self.event_bus.publish(event)
 
         return deleted
@@ -142,10 +314,66 @@ class UserService:
 
         return self.event_store.get_events_by_aggregate(user_id)
 
+    def get_user_image(
+        self, user_id: int, version: int = None, queried_by: int = None
+    ) -> Optional[dict]:
+        """Rebuild the user's fields at version (default: the latest) from events
+
+        Returns None if the user or that version does not exist.
+        """
+        self.record_user_events_query(user_id, queried_by)
+        events = self.event_store.get_events_by_aggregate(user_id)
+        image = rebuild_user_image(events, version)
+        if image is None or version not in (None, image["version"]):
+            return None
+        return {"id": user_id, **image}
+
+    def get_user_events_raw(self, user_id: int, queried_by: int = None):
+        """Iterate the event rows of a user with data still as stored JSON text"""
+        self.record_user_events_query(user_id, queried_by)
+        return self.event_store.iter_raw_events_by_aggregate(user_id)
+
+    def get_recent_user_events_raw(
+        self, user_id: int, limit: int, before: int = None, queried_by: int = None
+    ) -> List[dict]:
+        """Return the last limit event rows of a user older than before, oldest first"""
+        self.record_user_events_query(user_id, queried_by)
+        return self.event_store.get_recent_raw_events(user_id, limit, before)
+
+    def query_events(
+        self,
+        event_types: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        actor: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 100,
+    ):
+        """Page through the global event log filtered by type, time range and actor"""
+        return self.event_store.query_events(
+            event_types=event_types,
+            since=since,
+            until=until,
+            actor=actor,
+            after=after,
+            limit=limit,
+        )
+
     def change_position(
         self, user_id: int, new_position: str, new_salary: float, changed_by: int = None
     ) -> Optional[User]:
         """Change a user's position (can be promotion, demotion, or lateral move)"""
+        validate_user_changes({"position": new_position, "salary": new_salary})
+        return self._update_with_retry(
+            lambda: self._change_position(
+                user_id, new_position, new_salary, changed_by
+            ),
+            retry=True,
+        )
+
+    def _change_position(
+        self, user_id: int, new_position: str, new_salary: float, changed_by: int = None
+    ) -> Optional[User]:
         current_user = self.user_repository.get_user_by_id(user_id)
         if not current_user:
             return None
@@ -169,24 +397,10 @@ class UserService:
         else:
             event = PositionChangedEvent(user_id, current_user.position, new_position)
 
-        self.event_store.save_event(event)
-        self.event_bus.publish(event)
-
-        return self.update_user(
+        return self._patch_user(
             user_id,
-            {
-                "name": current_user.name,
-                "email": current_user.email,
-                "is_active": current_user.is_active,
-                "phone": current_user.phone,
-                "salary": new_salary,
-                "position": new_position,
-                "department": current_user.department,
-                "employment_type": current_user.employment_type,
-                "manager_id": current_user.manager_id,
-                "hire_date": current_user.hire_date,
-                "birth_date": current_user.birth_date,
-                "address": current_user.address,
-            },
+            {"salary": new_salary, "position": new_position},
             changed_by,
+            extra_events=[event],
+            current_user=current_user,
         )
@@ -0,0 +1,5 @@
+from infrastructure.web.asgi_app import UserASGIApp
+
+# asyncio-native variant of the user API, e.g.:
+#   uvicorn asgi:app --workers 4
+app = UserASGIApp()
@@ -1,6 +1,7 @@
+import json
 from enum import Enum
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
 class EventType(str, Enum):
@@ -36,6 +37,22 @@ class EventType(str, Enum):
     USER_EVENTS_QUERIED = "user.events.queried"
 
 
+# query events are audit records; they don't change the state of the aggregate
+QUERY_EVENT_TYPES = frozenset(
+    {
+        EventType.USER_QUERIED,
+        EventType.USER_LIST_QUERIED,
+        EventType.USER_EVENTS_QUERIED,
+    }
+)
+
+# payload fields that record which user triggered the event
+ACTOR_FIELDS = ("changed_by", "activated_by", "deactivated_by", "queried_by")
+
+# user.updated payload key with the version the changes were applied on
+PREVIOUS_VERSION_FIELD = "previous_version"
+
+
 class DomainEvent:
     """Base domain event"""
 
@@ -45,29 +62,73 @@ class DomainEvent:
         self.data = data
         self.occurred_at = datetime.now().isoformat()
         self.event_id = None
+        self.version = None
+
+    @staticmethod
+    def from_json(event_type: EventType, aggregate_id: int, raw_data: str):
+        """Build an event whose payload is decoded only when first accessed"""
+        event = DomainEvent(event_type, aggregate_id, None)
+        event._raw_data = raw_data
+        return event
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._raw_data is not None:
+            self._data = json.loads(self._raw_data)
+            self._raw_data = None
+        return self._data
+
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        self._data = value
+        self._raw_data = None
+
+    @property
+    def actor(self) -> Optional[int]:
+        """ID of the user who triggered the event, when the payload records it"""
+        data = self.data or {}
+        for field in ACTOR_FIELDS:
+            if data.get(field) is not None:
+                return data[field]
+        return None
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "event_id": self.event_id,
-            "event_type": self.event_type,
+            # events read back from the store carry the raw string value
+            "event_type": getattr(self.event_type, "value", self.event_type),
             "aggregate_id": self.aggregate_id,
             "data": self.data,
             "occurred_at": self.occurred_at,
+            "version": self.version,
         }
 
 
 class UserCreatedEvent(DomainEvent):
-    """Event fired when a user is created"""
+    """Event fired when a user is created
+
+    Fields left empty (None) are not stored; readers rebuild them as None.
+    """
 
     def __init__(self, user_id: int, user_data: Dict[str, Any]):
-        super().__init__(EventType.USER_CREATED, user_id, user_data)
+        fields = {key: value for key, value in user_data.items() if value is not None}
+        super().__init__(EventType.USER_CREATED, user_id, fields)
 
 
 class UserUpdatedEvent(DomainEvent):
-    """Event fired when a user is updated"""
+    """Event fired when a user is updated
+
+    Holds only the fields that changed, plus the version they were applied on
+    (previous_version) when known. See domain.user.rebuild_user_image.
+    """
 
-    def __init__(self, user_id: int, changes: Dict[str, Any]):
-        super().__init__(EventType.USER_UPDATED, user_id, changes)
+    def __init__(
+        self, user_id: int, changes: Dict[str, Any], previous_version: int = None
+    ):
+        data = dict(changes)
+        if previous_version is not None:
+            data[PREVIOUS_VERSION_FIELD] = previous_version
+        super().__init__(EventType.USER_UPDATED, user_id, data)
 
 
 class UserDeletedEvent(DomainEvent):
@@ -0,0 +1,11 @@
+class ConcurrencyError(Exception):
+    """Raised when an aggregate was modified by someone else since it was read"""
+
+    def __init__(self, aggregate_id: int, expected_version: int, actual_version: int):
+        super().__init__(
+            f"Aggregate {aggregate_id} is at version {actual_version}, "
+            f"expected {expected_version}"
+        )
+        self.aggregate_id = aggregate_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
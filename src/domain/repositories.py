@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from domain.user import User
-from typing import Optional, List
+from typing import ContextManager, Iterator, Optional, List, Tuple
 
 
 class UserRepository(ABC):
@@ -17,9 +17,34 @@ class UserRepository(ABC):
         pass
 
     @abstractmethod
-    def update_user(self, user_id: int, user: User) -> Optional[User]:
+    def iter_all_users(self) -> Iterator[User]:
+        """Yield every user, active or not (maintenance tasks)"""
         pass
 
     @abstractmethod
-    def delete_user(self, user_id: int) -> bool:
+    def get_user_version(self, user_id: int) -> Optional[Tuple[int, str]]:
+        """Return (version, updated_at) of an active user without loading it"""
+        pass
+
+    @abstractmethod
+    def update_user(
+        self, user_id: int, user: User, expected_version: int = None
+    ) -> Optional[User]:
+        """Update a user; raises ConcurrencyError if expected_version is stale"""
+        pass
+
+    @abstractmethod
+    def patch_user(
+        self, user_id: int, changes: dict, expected_version: int = None
+    ) -> Optional[int]:
+        """Write only the given fields; return the new version (None if missing)"""
+        pass
+
+    @abstractmethod
+    def delete_user(self, user_id: int, expected_version: int = None) -> bool:
+        pass
+
+    @abstractmethod
+    def transaction(self) -> ContextManager:
+        """Group repository and event store writes into one atomic unit"""
         pass
@@ -1,6 +1,83 @@
-from typing import Optional, List
+from typing import Iterable, Optional, List
 from domain.enums import Department, Position, EmploymentType
-from domain.events import DomainEvent
+from domain.events import DomainEvent, EventType
+
+_POSITIONS = frozenset(p.value for p in Position)
+_DEPARTMENTS = frozenset(d.value for d in Department)
+_EMPLOYMENT_TYPES = frozenset(e.value for e in EmploymentType)
+
+# campos editáveis do usuário (tudo menos id e version)
+USER_FIELDS = (
+    "name",
+    "email",
+    "is_active",
+    "phone",
+    "salary",
+    "position",
+    "department",
+    "employment_type",
+    "manager_id",
+    "hire_date",
+    "birth_date",
+    "address",
+)
+
+# valores dos campos ausentes do evento de criação (os padrões de User)
+USER_DEFAULTS = {**dict.fromkeys(USER_FIELDS), "is_active": True, "salary": 0.0}
+
+
+def _validate_choices(position: str, department: str, employment_type: str):
+    if position and position not in _POSITIONS:
+        raise ValueError(f"Cargo inválido: {position}")
+    if department and department not in _DEPARTMENTS:
+        raise ValueError(f"Departamento inválido: {department}")
+    if employment_type and employment_type not in _EMPLOYMENT_TYPES:
+        raise ValueError(f"Tipo de contratação inválido: {employment_type}")
+
+
+def validate_user_changes(changes: dict):
+    """Valida só os campos de uma atualização parcial, sem montar um User inteiro"""
+    unknown = set(changes) - set(USER_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos inválidos: {', '.join(sorted(unknown))}")
+    if "name" in changes and not changes["name"]:
+        raise ValueError("Nome inválido")
+    if "email" in changes and "@" not in (changes["email"] or ""):
+        raise ValueError("Email inválido")
+    _validate_choices(
+        changes.get("position"),
+        changes.get("department"),
+        changes.get("employment_type"),
+    )
+
+
+def rebuild_user_image(
+    events: Iterable[DomainEvent], version: int = None
+) -> Optional[dict]:
+    """Reconstrói os campos do usuário a partir dos seus eventos, em ordem de id
+
+    O user.created traz o estado inicial (campos ausentes valem o padrão) e
+    cada user.updated só os campos que mudaram. Com version, para nela.
+    Retorna None se não há evento de criação até lá.
+    """
+    image = None
+    for event in events:
+        if version is not None and (event.version or 0) > version:
+            break
+        if event.event_type == EventType.USER_CREATED:
+            image = {**USER_DEFAULTS, "version": None}
+        elif image is None:
+            continue
+        if event.event_type in (EventType.USER_CREATED, EventType.USER_UPDATED):
+            data = event.data or {}
+            image.update((field, data[field]) for field in USER_FIELDS if field in data)
+        elif event.event_type == EventType.USER_DELETED:
+            image["is_active"] = False
+        else:
+            continue
+        if event.version is not None:
+            image["version"] = event.version
+    return image
 
 
 class User:
@@ -19,16 +96,12 @@ class User:
         hire_date: str = None,
         birth_date: str = None,
         address: str = None,
+        version: int = 1,
     ):
         if "@" not in email:
             raise ValueError("Email inválido")
 
-        if position and position not in [p.value for p in Position]:
-            raise ValueError(f"Cargo inválido: {position}")
-        if department and department not in [d.value for d in Department]:
-            raise ValueError(f"Departamento inválido: {department}")
-        if employment_type and employment_type not in [e.value for e in EmploymentType]:
-            raise ValueError(f"Tipo de contratação inválido: {employment_type}")
+        _validate_choices(position, department, employment_type)
 
         self.id = id
         self.name = name
@@ -43,6 +116,7 @@ class User:
         self.hire_date = hire_date
         self.birth_date = birth_date
         self.address = address
+        self.version = version
 
         self._uncommitted_events: List[DomainEvent] = []
 
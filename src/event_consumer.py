@@ -0,0 +1,59 @@
+"""Processo consumidor dos eventos publicados pelos workers web.
+
+Com EVENT_BUS_TRANSPORT=sqlite os workers só gravam os eventos e notificam;
+os handlers rodam aqui, um consumer group por handler, cada um em sua thread.
+Vários processos consumidores podem rodar ao mesmo tempo: cada grupo fica com
+um só deles (lease em consumer_offsets) e os demais assumem se ele cair.
+
+Uso (a partir de src/):
+    EVENT_BUS_TRANSPORT=sqlite python event_consumer.py [--groups log salary-audit]
+"""
+
+import argparse
+import signal
+import threading
+from infrastructure.bootstrap import (
+    handler_subscriptions,
+    init_schema,
+    register_event_handlers,
+)
+from infrastructure.db.database import TENANT_DATA_DIR
+from infrastructure.event_bus import EventBus
+from infrastructure.event_transport import SqliteEventConsumer
+
+
+def main():
+    names = [name for name, _, _ in handler_subscriptions()]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", nargs="+", choices=names, default=names)
+    args = parser.parse_args()
+    if TENANT_DATA_DIR is not None:
+        parser.error("TENANT_DATA_DIR is not supported: only DATABASE_PATH is consumed")
+
+    init_schema()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    consumers = []
+    for group in args.groups:
+        event_bus = EventBus()
+        register_event_handlers(event_bus, groups={group})
+        consumers.append(SqliteEventConsumer(group, event_bus))
+
+    threads = [
+        threading.Thread(target=consumer.run, args=(stop,), name=consumer.group)
+        for consumer in consumers
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"Consuming groups: {', '.join(args.groups)}")
+    stop.wait()
+    for thread in threads:
+        thread.join()
+    for consumer in consumers:
+        consumer.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Configuração do Gunicorn para produção.
+
+Uso (a partir de src/):
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Reload gracioso (novos workers sobem antes dos antigos saírem):
+    kill -HUP <pid do master>
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("WEB_THREADS", 4))
+worker_class = "gthread"
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# a aplicação é carregada no master, antes do fork
+preload_app = True
+
+
+def on_starting(server):
+    """Cria/migra o schema e registra os handlers uma única vez, no master
+
+    Backends com estado no processo não são abertos aqui, e sim no worker.
+    """
+    from infrastructure.bootstrap import get_user_service, single_process_backend
+
+    backend = single_process_backend()
+    if backend is None:
+        get_user_service()
+    elif server.cfg.workers > 1:
+        sys.exit(f"{backend} keeps its state in one process: set WEB_WORKERS=1")
+
+
+def post_fork(server, worker):
+    """Cada worker abre seu pool de conexões SQLite (e o backend com estado local)"""
+    from infrastructure.bootstrap import get_user_service, single_process_backend
+    from infrastructure.db.database import reset_pool
+
+    reset_pool()
+    if single_process_backend() is not None:
+        get_user_service()
@@ -0,0 +1,76 @@
+"""Importa usuários em massa a partir de um arquivo CSV ou JSON Lines.
+
+Colunas: os campos do usuário, mais "id" e "manager_id" opcionais do sistema
+de origem (manager_id aponta para o id de outra linha do arquivo ou, como
+"user:42", para um usuário já cadastrado). Rodar de novo o mesmo comando retoma uma importação
+interrompida; o import id padrão é derivado do caminho e do tamanho do
+arquivo. Com TENANT_DATA_DIR, use --tenant.
+
+Uso (a partir de src/):
+    python import_users.py employees.csv [--tenant acme] [--errors errors.csv]
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
+from infrastructure.bootstrap import get_user_importer, init_schema
+from infrastructure.db.database import tenant_scope
+from infrastructure.db.user_import import FORMATS, UserImportError
+
+
+def default_import_id(path: str) -> str:
+    """Mesmo arquivo, mesmo id: é o que permite retomar sem informar nada"""
+    key = f"{os.path.abspath(path)}:{os.path.getsize(path)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="default: file extension")
+    parser.add_argument("--import-id")
+    parser.add_argument("--tenant")
+    parser.add_argument("--errors", help="write the error report to this CSV file")
+    args = parser.parse_args()
+    file_format = args.format or os.path.splitext(args.path)[1].lstrip(".").lower()
+    if file_format == "ndjson":
+        file_format = "jsonl"
+    if file_format not in FORMATS:
+        parser.error("cannot infer the format from the extension, use --format")
+
+    init_schema()
+    import_id = args.import_id or default_import_id(args.path)
+    with tenant_scope(args.tenant) if args.tenant else nullcontext():
+        importer = get_user_importer(import_id)
+        if importer is None:
+            sys.exit("Imports require the SQLite storage backend")
+        started = time.perf_counter()
+        try:
+            with open(args.path, "rb") as stream:
+                progress = importer.run(stream, file_format, source=args.path)
+        except UserImportError as e:
+            sys.exit(str(e))
+        elapsed = time.perf_counter() - started
+        print(
+            f"{import_id}: {progress['rows_imported']} imported, "
+            f"{progress['rows_failed']} failed in {elapsed:.2f}s"
+        )
+        if args.errors:
+            with open(args.errors, "w", newline="") as report:
+                writer = csv.writer(report)
+                writer.writerow(("row_number", "message"))
+                writer.writerows(importer.iter_errors())
+        else:
+            for row_number, message in islice(importer.iter_errors(), 20):
+                print(f"  row {row_number}: {message}")
+            if progress["rows_failed"] > 20:
+                print("  ... use --errors to write the full report")
+
+
+if __name__ == "__main__":
+    main()
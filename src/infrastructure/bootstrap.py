@@ -0,0 +1,197 @@
+import os
+import threading
+from typing import Optional
+from application.user_service import UserService
+from application.event_handlers import (
+    LogEventHandler,
+    PositionChangeNotificationHandler,
+    SalaryChangeAuditHandler,
+    DepartmentChangeHandler,
+    UserActivationHandler,
+    PositionChangeHandler,
+    QueryAuditHandler,
+)
+from domain.events import EventType
+from infrastructure.db.database import TENANT_DATA_DIR, init_db
+from infrastructure.db.event_store import EventStore
+from infrastructure.db.sqlite_user_repository import SqliteUserRepository
+from infrastructure.db.user_import import UserImporter
+from infrastructure.event_bus import EventBus, get_event_bus
+from infrastructure.event_transport import EVENT_BUS_TRANSPORT, SocketNotifier
+from infrastructure.eventlog.segmented_event_store import SegmentedEventStore
+from infrastructure.memory.event_store import InMemoryEventStore
+from infrastructure.memory.storage import MemoryStorage
+from infrastructure.memory.user_repository import InMemoryUserRepository
+from infrastructure.projections.headcount import headcount_cube
+from infrastructure.projections.payroll import payroll_rollup
+
+# "sqlite" (padrão) ou "memory"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sqlite")
+# diretório do snapshot/journal do backend em memória (sem ele, nada é persistido)
+MEMORY_DATA_DIR = os.environ.get("MEMORY_DATA_DIR")
+MEMORY_SNAPSHOT_INTERVAL = float(os.environ.get("MEMORY_SNAPSHOT_INTERVAL", 60))
+# "default" (o event store do STORAGE_BACKEND) ou "segmented" (arquivos de segmento)
+EVENT_STORE_BACKEND = os.environ.get("EVENT_STORE_BACKEND", "default")
+EVENT_LOG_DIR = os.environ.get("EVENT_LOG_DIR", "event-log")
+
+# projeções de relatório mantidas a partir do log de events
+PROJECTIONS = (payroll_rollup, headcount_cube)
+
+_bootstrap_lock = threading.Lock()
+_schema_ready = False
+_user_service = None
+
+
+def projections_enabled() -> bool:
+    """As projeções de relatório leem e gravam tabelas no banco SQLite"""
+    return STORAGE_BACKEND == "sqlite" and EVENT_STORE_BACKEND == "default"
+
+
+def single_process_backend() -> Optional[str]:
+    """Backend configurado cujo estado vive no processo (None se não há nenhum)
+
+    Esses backends mantêm threads e índices em memória: precisam ser abertos
+    no processo que os usa (depois do fork) e não podem ser compartilhados
+    entre workers.
+    """
+    if STORAGE_BACKEND == "memory":
+        return "STORAGE_BACKEND=memory"
+    if EVENT_STORE_BACKEND == "segmented":
+        return "EVENT_STORE_BACKEND=segmented"
+    return None
+
+
+def handler_subscriptions():
+    """Consumer groups da aplicação: (nome, tópicos, handler)
+
+    O nome identifica o grupo no transporte entre processos; cada grupo tem
+    um único consumidor ativo, de modo que cada evento é tratado uma vez.
+    """
+    activation_handler = UserActivationHandler()
+    position_change_handler = PositionChangeHandler()
+    groups = [
+        ("log", ["user.#"], LogEventHandler().handle),
+        (
+            "position-notification",
+            [EventType.POSITION_CHANGED],
+            PositionChangeNotificationHandler().handle,
+        ),
+        ("salary-audit", [EventType.SALARY_CHANGED], SalaryChangeAuditHandler().handle),
+        (
+            "department",
+            [EventType.DEPARTMENT_CHANGED],
+            DepartmentChangeHandler().handle,
+        ),
+        (
+            "activation",
+            [EventType.USER_ACTIVATED, EventType.USER_DEACTIVATED],
+            activation_handler.handle,
+        ),
+        (
+            "position-change",
+            [EventType.USER_PROMOTED, EventType.USER_DEMOTED],
+            position_change_handler.handle,
+        ),
+        ("query-audit", ["user.#.queried"], QueryAuditHandler().handle),
+    ]
+    if projections_enabled():
+        for projection in PROJECTIONS:
+            groups.append(
+                (
+                    f"{projection.name}-projection",
+                    list(projection.event_types),
+                    projection.handle,
+                )
+            )
+    return groups
+
+
+def register_event_handlers(event_bus: EventBus, groups=None):
+    """Registra os handlers da aplicação (ou só os dos grupos indicados) no EventBus"""
+    for name, topics, handler in handler_subscriptions():
+        if groups is not None and name not in groups:
+            continue
+        for topic in topics:
+            event_bus.subscribe(topic, handler)
+
+
+def init_schema():
+    """Roda o DDL uma única vez por processo (e herda o estado após um fork)"""
+    global _schema_ready
+    if not _schema_ready:
+        init_db()
+        _schema_ready = True
+
+
+def build_storage():
+    """Cria o repositório e o event store do backend configurado"""
+    if STORAGE_BACKEND == "memory":
+        storage = MemoryStorage(MEMORY_DATA_DIR)
+        storage.start_snapshots(MEMORY_SNAPSHOT_INTERVAL)
+        user_repository, event_store = (
+            InMemoryUserRepository(storage),
+            InMemoryEventStore(storage),
+        )
+    else:
+        init_schema()
+        user_repository, event_store = SqliteUserRepository(), EventStore()
+
+    if EVENT_STORE_BACKEND == "segmented":
+        event_store = SegmentedEventStore(EVENT_LOG_DIR)
+        # o log é gravado após o commit do repositório: um crash entre os dois
+        # deixa usuários à frente do log
+        reconciled = event_store.reconcile(user_repository.iter_all_users())
+        if reconciled:
+            print(f"Reconciled {reconciled} users with the event log")
+    return user_repository, event_store
+
+
+def configure_event_bus(event_bus: EventBus):
+    """Handlers no próprio processo, ou só notificação quando eles rodam em event_consumer.py"""
+    if EVENT_BUS_TRANSPORT == "local":
+        register_event_handlers(event_bus)
+    elif EVENT_BUS_TRANSPORT == "sqlite":
+        if STORAGE_BACKEND != "sqlite" or EVENT_STORE_BACKEND != "default":
+            raise ValueError(
+                "EVENT_BUS_TRANSPORT=sqlite requires the SQLite event store"
+            )
+        if TENANT_DATA_DIR is not None:
+            # o consumidor só lê os events de DATABASE_PATH, não os dos shards
+            raise ValueError(
+                "EVENT_BUS_TRANSPORT=sqlite does not support TENANT_DATA_DIR"
+            )
+        event_bus.set_transport(SocketNotifier())
+    else:
+        raise ValueError(f"Unknown EVENT_BUS_TRANSPORT: {EVENT_BUS_TRANSPORT!r}")
+
+
+def get_user_service() -> UserService:
+    """Retorna o UserService global, inicializando banco e handlers no primeiro uso"""
+    global _user_service
+    if _user_service is None:
+        with _bootstrap_lock:
+            if _user_service is None:
+                user_repository, event_store = build_storage()
+                configure_event_bus(get_event_bus())
+                _user_service = UserService(user_repository, event_store)
+    return _user_service
+
+
+def get_projection(name: str):
+    """Retorna a projeção de relatório pelo nome (None se o backend não a suporta)"""
+    get_user_service()
+    if not projections_enabled():
+        return None
+    return next(projection for projection in PROJECTIONS if projection.name == name)
+
+
+def get_user_importer(import_id: str):
+    """Importador em massa de usuários (None se o backend não o suporta)
+
+    Staging, usuários e eventos precisam estar no mesmo banco SQLite para que
+    cada lote seja gravado em uma só transação.
+    """
+    get_user_service()
+    if not projections_enabled():
+        return None
+    return UserImporter(import_id)
@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+from domain.events import DomainEvent
+from domain.user import User
+from infrastructure.db.event_store import EventStore
+from infrastructure.db.sqlite_user_repository import SqliteUserRepository
+
+# threads dedicados ao SQLite; o event loop nunca bloqueia em I/O de banco
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 8))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Retorna o executor global de I/O de banco, criando-o no primeiro uso"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="sqlite"
+                )
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Executa uma função bloqueante no executor de banco
+
+    Roda em uma cópia do contexto atual, para que o tenant do request chegue
+    ao thread do executor.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+class AsyncSqliteUserRepository:
+    """Versão assíncrona do SqliteUserRepository"""
+
+    def __init__(self, repository: SqliteUserRepository = None):
+        self.repository = repository or SqliteUserRepository()
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        return await run_blocking(self.repository.get_user_by_id, user_id)
+
+    async def get_user_version(self, user_id: int) -> Optional[Tuple[int, str]]:
+        return await run_blocking(self.repository.get_user_version, user_id)
+
+    async def get_all_users(self) -> List[User]:
+        return await run_blocking(self.repository.get_all_users)
+
+
+class AsyncEventStore:
+    """Versão assíncrona do EventStore"""
+
+    def __init__(self, event_store: EventStore = None):
+        self.event_store = event_store or EventStore()
+
+    async def save_event(self, event: DomainEvent) -> int:
+        return await run_blocking(self.event_store.save_event, event)
+
+    async def get_events_by_aggregate(self, aggregate_id: int) -> List[DomainEvent]:
+        return await run_blocking(self.event_store.get_events_by_aggregate, aggregate_id)
+
+    async def get_aggregate_watermark(
+        self, aggregate_id: int
+    ) -> Optional[Tuple[int, str]]:
+        return await run_blocking(self.event_store.get_aggregate_watermark, aggregate_id)
+
+    async def iter_raw_events_by_aggregate(
+        self, aggregate_id: int, batch_size: int = 500
+    ) -> AsyncIterator[list]:
+        """Itera lotes de linhas do cursor; cada lote é lido no executor"""
+        rows = self.event_store.iter_raw_events_by_aggregate(aggregate_id, batch_size)
+
+        def take_batch():
+            return [row for _, row in zip(range(batch_size), rows)]
+
+        try:
+            while True:
+                batch = await run_blocking(take_batch)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            # devolve a conexão ao pool mesmo se o cliente desconectar no meio
+            await run_blocking(rows.close)
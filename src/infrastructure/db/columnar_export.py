@@ -0,0 +1,356 @@
+import csv
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from domain.events import QUERY_EVENT_TYPES, EventType
+from domain.user import USER_FIELDS
+from infrastructure.db.database import get_db_connection
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - depende do ambiente
+    pyarrow = None
+
+# linhas por arquivo de saída (e o máximo em memória por tabela/tipo de evento)
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 100_000))
+# linhas lidas do SQLite por fetchmany
+EXPORT_FETCH_ROWS = int(os.environ.get("EXPORT_FETCH_ROWS", 10_000))
+
+FORMATS = ("parquet", "csv.gz")
+DEFAULT_FORMAT = "parquet" if pyarrow is not None else "csv.gz"
+MANIFEST = "manifest.json"
+
+_USER_TYPES = {
+    "name": "str",
+    "email": "str",
+    "is_active": "bool",
+    "phone": "str",
+    "salary": "float",
+    "position": "str",
+    "department": "str",
+    "employment_type": "str",
+    "manager_id": "int",
+    "hire_date": "str",
+    "birth_date": "str",
+    "address": "str",
+}
+USER_COLUMNS = (
+    ("id", "int"),
+    *((field, _USER_TYPES[field]) for field in USER_FIELDS),
+    ("version", "int"),
+    ("updated_at", "str"),
+)
+
+EVENT_COLUMNS = (
+    ("id", "int"),
+    ("aggregate_id", "int"),
+    ("occurred_at", "str"),
+    ("version", "int"),
+    ("actor", "int"),
+)
+
+
+def _change(field: str, kind: str, actor: bool = False) -> Dict[str, str]:
+    columns = {f"old_{field}": kind, f"new_{field}": kind}
+    if actor:
+        columns["changed_by"] = "int"
+    return columns
+
+
+# colunas tipadas do payload de cada tipo de evento; chaves fora delas vão,
+# em JSON, para a coluna extra
+PAYLOAD_COLUMNS: Dict[EventType, Dict[str, str]] = {
+    EventType.USER_CREATED: _USER_TYPES,
+    EventType.USER_UPDATED: _USER_TYPES,
+    EventType.USER_DELETED: {},
+    EventType.USER_ACTIVATED: {"activated_by": "int"},
+    EventType.USER_DEACTIVATED: {"deactivated_by": "int"},
+    EventType.USER_NAME_CHANGED: _change("name", "str"),
+    EventType.USER_EMAIL_CHANGED: _change("email", "str"),
+    EventType.USER_PHONE_CHANGED: _change("phone", "str"),
+    EventType.USER_ADDRESS_CHANGED: _change("address", "str"),
+    EventType.USER_BIRTH_DATE_CHANGED: _change("birth_date", "str"),
+    EventType.POSITION_CHANGED: _change("position", "str", actor=True),
+    EventType.SALARY_CHANGED: _change("salary", "float", actor=True),
+    EventType.DEPARTMENT_CHANGED: _change("department", "str", actor=True),
+    EventType.MANAGER_CHANGED: _change("manager_id", "int", actor=True),
+    EventType.EMPLOYMENT_TYPE_CHANGED: _change("employment_type", "str", actor=True),
+    EventType.USER_HIRED: {
+        "hire_date": "str",
+        "position": "str",
+        "department": "str",
+        "salary": "float",
+    },
+    EventType.USER_PROMOTED: {
+        **_change("position", "str"),
+        **_change("salary", "float"),
+    },
+    EventType.USER_DEMOTED: {
+        **_change("position", "str"),
+        **_change("salary", "float"),
+    },
+    EventType.USER_QUERIED: {"queried_by": "int"},
+    EventType.USER_LIST_QUERIED: {"filters": "str", "queried_by": "int"},
+    EventType.USER_EVENTS_QUERIED: {"queried_by": "int"},
+}
+
+_CASTS = {"int": int, "float": float, "bool": bool, "str": str}
+
+
+def _cast(value, kind: str):
+    """Converte para o tipo da coluna; valores que não convertem viram None"""
+    if value is None:
+        return None
+    if kind == "str" and isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    try:
+        return _CASTS[kind](value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ChunkWriter:
+    """Acumula linhas de uma tabela e grava um arquivo a cada chunk_rows
+
+    Cada diretório tem um _schema.json com as colunas e seus tipos. Os nomes
+    dos arquivos dependem só do intervalo exportado: repetir uma exportação
+    interrompida sobrescreve as partes em vez de duplicá-las.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        columns: Tuple[Tuple[str, str], ...],
+        file_format: str,
+        prefix: str,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ):
+        self.directory = directory
+        self.columns = columns
+        self.file_format = file_format
+        self.prefix = prefix
+        self.chunk_rows = chunk_rows
+        self.rows: List[tuple] = []
+        self.parts = 0
+        self.written = 0
+
+    def append(self, row: tuple):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.parts == 0:
+            os.makedirs(self.directory, exist_ok=True)
+            schema_path = os.path.join(self.directory, "_schema.json")
+            with open(schema_path, "w") as schema:
+                json.dump(
+                    {
+                        "format": self.file_format,
+                        "columns": [
+                            {"name": name, "type": kind}
+                            for name, kind in self.columns
+                        ],
+                    },
+                    schema,
+                    indent=2,
+                )
+        self.parts += 1
+        path = os.path.join(
+            self.directory, f"{self.prefix}-{self.parts:05d}.{self.file_format}"
+        )
+        # grava num temporário e renomeia: um arquivo visível está sempre completo
+        temp_path = path + ".tmp"
+        if self.file_format == "parquet":
+            self._write_parquet(temp_path)
+        else:
+            self._write_csv_gz(temp_path)
+        os.replace(temp_path, path)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _write_parquet(self, path: str):
+        types = {
+            "int": pyarrow.int64(),
+            "float": pyarrow.float64(),
+            "bool": pyarrow.bool_(),
+            "str": pyarrow.string(),
+        }
+        table = pyarrow.table(
+            {
+                name: pyarrow.array(values, type=types[kind])
+                for (name, kind), values in zip(self.columns, zip(*self.rows))
+            }
+        )
+        pyarrow.parquet.write_table(table, path, compression="zstd")
+
+    def _write_csv_gz(self, path: str):
+        with gzip.open(path, "wt", compresslevel=5, newline="") as stream:
+            writer = csv.writer(stream)
+            writer.writerow([name for name, _ in self.columns])
+            writer.writerows(self.rows)
+
+
+class ColumnarExporter:
+    """Exporta users e events para arquivos colunares, de forma incremental
+
+    Cada execução exporta os eventos com id em (since, until], em que until é
+    o último evento no início da exportação, um diretório por tipo de evento
+    com o payload achatado em colunas tipadas. Junto vai o estado atual dos
+    usuários tocados por esses eventos (todos, na primeira exportação), lido
+    no mesmo snapshot. O manifest.json do diretório guarda o watermark para
+    a próxima execução.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        file_format: str = DEFAULT_FORMAT,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ):
+        if file_format not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        if file_format == "parquet" and pyarrow is None:
+            raise ValueError("Parquet export requires pyarrow")
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+
+    def read_manifest(self) -> dict:
+        path = os.path.join(self.output_dir, MANIFEST)
+        if not os.path.exists(path):
+            return {"watermark": 0, "format": self.file_format, "exports": []}
+        with open(path) as manifest:
+            return json.load(manifest)
+
+    def export(self, since: Optional[int] = None) -> dict:
+        """Exporta a partir de since (padrão: o watermark do manifest)"""
+        manifest = self.read_manifest()
+        if manifest["format"] != self.file_format:
+            raise ValueError(f"{self.output_dir} holds a {manifest['format']} export")
+        if since is None:
+            since = manifest["watermark"]
+
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            # uma transação de leitura: users e events vêm do mesmo snapshot
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM events")
+                until = cursor.fetchone()["id"]
+                if until <= since:
+                    return {"since": since, "until": since, "users": 0, "events": {}}
+                prefix = f"{since + 1:012d}-{until:012d}"
+                users = self._export_users(cursor, since, until, prefix)
+                events = self._export_events(cursor, since, until, prefix)
+            finally:
+                conn.rollback()
+
+        summary = {
+            "since": since,
+            "until": until,
+            "users": users,
+            "events": events,
+            "finished_at": datetime.now().isoformat(),
+        }
+        manifest["watermark"] = max(manifest["watermark"], until)
+        manifest["exports"].append(summary)
+        self._write_manifest(manifest)
+        return summary
+
+    def _export_users(self, cursor, since: int, until: int, prefix: str) -> int:
+        columns = ", ".join(name for name, _ in USER_COLUMNS)
+        if since == 0:
+            cursor.execute(f"SELECT {columns} FROM users ORDER BY id")
+        else:
+            # só os usuários cujo estado mudou no intervalo
+            query_types = [event_type.value for event_type in QUERY_EVENT_TYPES]
+            cursor.execute(
+                f"""
+                SELECT {columns} FROM users
+                WHERE id IN (
+                    SELECT aggregate_id FROM events
+                    WHERE id > ? AND id <= ?
+                      AND event_type NOT IN ({", ".join("?" * len(query_types))})
+                )
+                ORDER BY id
+            """,
+                (since, until, *query_types),
+            )
+        writer = ChunkWriter(
+            os.path.join(self.output_dir, "users"),
+            USER_COLUMNS,
+            self.file_format,
+            prefix,
+            self.chunk_rows,
+        )
+        kinds = [kind for _, kind in USER_COLUMNS]
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                writer.append(
+                    tuple(_cast(value, kind) for value, kind in zip(row, kinds))
+                )
+        writer.flush()
+        return writer.written
+
+    def _export_events(self, cursor, since: int, until: int, prefix: str) -> dict:
+        cursor.execute(
+            """
+            SELECT id, aggregate_id, occurred_at, version, actor, event_type, data
+            FROM events WHERE id > ? AND id <= ?
+            ORDER BY id
+        """,
+            (since, until),
+        )
+        writers: Dict[str, Tuple[ChunkWriter, List[Tuple[str, str]]]] = {}
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                event_type = row["event_type"]
+                if event_type not in writers:
+                    writers[event_type] = self._event_writer(event_type, prefix)
+                writer, payload = writers[event_type]
+                data = json.loads(row["data"]) if row["data"] else {}
+                values = [row[0], row[1], row[2], row[3], row[4]]
+                values += [_cast(data.pop(name, None), kind) for name, kind in payload]
+                values.append(
+                    json.dumps(data, separators=(",", ":")) if data else None
+                )
+                writer.append(tuple(values))
+        counts = {}
+        for event_type, (writer, _) in writers.items():
+            writer.flush()
+            counts[event_type] = writer.written
+        return counts
+
+    def _event_writer(self, event_type: str, prefix: str):
+        try:
+            payload = list(PAYLOAD_COLUMNS[EventType(event_type)].items())
+        except ValueError:
+            # tipo desconhecido (código mais novo ou antigo): tudo vai em extra
+            payload = []
+        writer = ChunkWriter(
+            os.path.join(self.output_dir, "events", event_type),
+            (*EVENT_COLUMNS, *payload, ("extra", "str")),
+            self.file_format,
+            prefix,
+            self.chunk_rows,
+        )
+        return writer, payload
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, MANIFEST)
+        with open(path + ".tmp", "w") as stream:
+            json.dump(manifest, stream, indent=2)
+        os.replace(path + ".tmp", path)
@@ -1,15 +1,110 @@
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
 import os
+from domain.events import ACTOR_FIELDS, QUERY_EVENT_TYPES
+from infrastructure.db.query_log import connection_factory
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "users.db")
+DATABASE_PATH = os.environ.get(
+    "DATABASE_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "users.db")
+)
+# conexões ociosas mantidas por processo
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+# conexões somente leitura ociosas (consultas), separadas das de escrita
+DB_READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", DB_POOL_SIZE))
+# tempo (ms) que um escritor espera pelo lock do SQLite antes de falhar
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+# multi-tenant: com o diretório definido, cada tenant tem seu próprio arquivo
+TENANT_DATA_DIR = os.environ.get("TENANT_DATA_DIR")
+# pools abertos mantidos ao mesmo tempo (LRU); os mais antigos são fechados
+TENANT_POOL_CACHE_SIZE = int(os.environ.get("TENANT_POOL_CACHE_SIZE", 64))
+# o id vira nome de arquivo: nada de "/", ".." ou caracteres especiais
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
 
+# tipos de evento de consulta como literais SQL: o índice parcial só é usado
+# por consultas que repetem exatamente a mesma condição (sem parâmetros)
+QUERY_EVENT_TYPES_SQL = ", ".join(
+    f"'{event_type.value}'" for event_type in sorted(QUERY_EVENT_TYPES)
+)
 
-def init_db():
+_current_tenant: ContextVar = ContextVar("tenant_id", default=None)
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Valida o id do tenant; lança ValueError se ele não puder virar nome de arquivo"""
+    if not TENANT_ID_PATTERN.match(tenant_id or ""):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    return tenant_id
+
+
+@contextmanager
+def tenant_scope(tenant_id: str):
+    """Direciona os acessos ao banco do contexto atual para o shard do tenant"""
+    token = _current_tenant.set(validate_tenant_id(tenant_id))
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def get_current_tenant() -> str:
+    return _current_tenant.get()
+
+
+class UnknownTenantError(LookupError):
+    """O tenant não tem shard: ele precisa ser criado com provision_tenant"""
+
+
+def tenant_database_path(tenant_id: str) -> str:
+    return os.path.join(TENANT_DATA_DIR, f"{validate_tenant_id(tenant_id)}.db")
+
+
+def tenant_exists(tenant_id: str) -> bool:
+    """True se o shard do tenant já foi provisionado"""
+    return TENANT_DATA_DIR is not None and os.path.exists(
+        tenant_database_path(tenant_id)
+    )
+
+
+def provision_tenant(tenant_id: str) -> bool:
+    """Cria o shard do tenant com o schema (ou o atualiza); retorna se foi criado
+
+    É o único caminho que cria arquivos em TENANT_DATA_DIR: requests só são
+    atendidos para tenants já provisionados.
+    """
+    if TENANT_DATA_DIR is None:
+        raise ValueError("TENANT_DATA_DIR is not set")
+    database_path = tenant_database_path(tenant_id)
+    created = not os.path.exists(database_path)
+    os.makedirs(TENANT_DATA_DIR, exist_ok=True)
+    init_db(database_path)
+    with _pool_lock:
+        _initialized_shards.add(database_path)
+    return created
+
+
+def get_database_path() -> str:
+    """Arquivo do banco do contexto atual: o shard do tenant ou DATABASE_PATH"""
+    tenant_id = _current_tenant.get()
+    if TENANT_DATA_DIR is None or tenant_id is None:
+        return DATABASE_PATH
+    return tenant_database_path(tenant_id)
+
+
+def init_db(database_path: str = None):
     """Inicializa o banco de dados e cria as tabelas se não existirem"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(database_path or DATABASE_PATH)
     cursor = conn.cursor()
 
+    # WAL permite leitores concorrentes com um escritor entre processos
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     # Tabela de users
     cursor.execute(
         """
@@ -27,6 +122,8 @@ def init_db():
             hire_date TEXT,
             birth_date TEXT,
             address TEXT,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT,
             FOREIGN KEY (manager_id) REFERENCES users(id)
         )
     """
@@ -41,6 +138,7 @@ def init_db():
             aggregate_id INTEGER NOT NULL,
             data TEXT NOT NULL,
             occurred_at TEXT NOT NULL,
+            version INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """
@@ -52,15 +150,436 @@ def init_db():
     """
     )
 
+    # bancos criados antes do controle de versão
+    _ensure_column(cursor, "users", "version", "INTEGER NOT NULL DEFAULT 1")
+    _ensure_column(cursor, "users", "updated_at", "TEXT")
+    _ensure_column(cursor, "events", "version", "INTEGER")
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_aggregate_version
+        ON events(aggregate_id, version)
+    """
+    )
+
+    # autor do evento extraído do JSON de data para poder ser indexado
+    if _ensure_column(cursor, "events", "actor", "INTEGER"):
+        actor_paths = ", ".join(f"json_extract(data, '$.{f}')" for f in ACTOR_FIELDS)
+        cursor.execute(f"UPDATE events SET actor = COALESCE({actor_paths})")
+
+    # consultas globais: o id (rowid) entra implicitamente no fim de cada índice
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_type_time
+        ON events(event_type, occurred_at)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_time
+        ON events(occurred_at)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_actor_time
+        ON events(actor, occurred_at) WHERE actor IS NOT NULL
+    """
+    )
+    # eventos de um tipo em ordem de id: o rowid no fim do índice dá a ordem
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_type
+        ON events(event_type)
+    """
+    )
+    # cauda do histórico de um agregado (limit/before) e seu último id
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_events_aggregate_id
+        ON events(aggregate_id, id)
+    """
+    )
+    # último evento que alterou estado (watermark do cache de resultados),
+    # sem percorrer os eventos de consulta gravados a cada leitura
+    cursor.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_events_state
+        ON events(id) WHERE event_type NOT IN ({QUERY_EVENT_TYPES_SQL})
+    """
+    )
+
+    # posição de cada consumer group no log de events (fan-out entre processos)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS consumer_offsets (
+            consumer_group TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            owner TEXT,
+            lease_until REAL,
+            updated_at TEXT
+        )
+    """
+    )
+
+    # projeções (relatórios) mantidas a partir do log: até onde cada uma já leu
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS projection_checkpoints (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            updated_at TEXT
+        )
+    """
+    )
+
+    # estado atual de cada usuário visto pela projeção de folha de pagamento
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payroll_members (
+            user_id INTEGER PRIMARY KEY,
+            salary REAL NOT NULL,
+            department TEXT,
+            position TEXT,
+            active INTEGER NOT NULL
+        )
+    """
+    )
+
+    # variação da folha e do headcount por período; o nível é a soma acumulada
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payroll_rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            dim_value TEXT NOT NULL,
+            period TEXT NOT NULL,
+            payroll_delta REAL NOT NULL,
+            headcount_delta INTEGER NOT NULL,
+            PRIMARY KEY (granularity, dimension, dim_value, period)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # departamento, tipo de contratação e situação de cada usuário (headcount)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS headcount_members (
+            user_id INTEGER PRIMARY KEY,
+            department TEXT,
+            employment_type TEXT,
+            active INTEGER NOT NULL
+        )
+    """
+    )
+
+    # cubo de headcount: variação do nível e fluxos (admissões, saídas,
+    # transferências) por dimensão e período
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS headcount_cube (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            dim_value TEXT NOT NULL,
+            period TEXT NOT NULL,
+            headcount_delta INTEGER NOT NULL DEFAULT 0,
+            hires INTEGER NOT NULL DEFAULT 0,
+            exits INTEGER NOT NULL DEFAULT 0,
+            transfers_in INTEGER NOT NULL DEFAULT 0,
+            transfers_out INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, dim_value, period)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # importações em massa: estado e checkpoint de leitura do arquivo
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_imports (
+            import_id TEXT PRIMARY KEY,
+            source TEXT,
+            status TEXT NOT NULL,
+            rows_read INTEGER NOT NULL DEFAULT 0,
+            rows_imported INTEGER NOT NULL DEFAULT 0,
+            rows_failed INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """
+    )
+
+    # linhas válidas de uma importação, com o usuário criado para cada uma
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_import_rows (
+            import_id TEXT NOT NULL,
+            row_number INTEGER NOT NULL,
+            external_id TEXT,
+            manager_ref TEXT,
+            data TEXT NOT NULL,
+            status TEXT NOT NULL,
+            user_id INTEGER,
+            PRIMARY KEY (import_id, row_number)
+        ) WITHOUT ROWID
+    """
+    )
+
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_import_rows_external
+        ON user_import_rows(import_id, external_id)
+    """
+    )
+
+    # relatório de erros de uma importação, por linha do arquivo
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_import_errors (
+            import_id TEXT NOT NULL,
+            row_number INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            PRIMARY KEY (import_id, row_number)
+        ) WITHOUT ROWID
+    """
+    )
+
+    # respostas por Idempotency-Key, compartilhadas entre os processos
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            method TEXT NOT NULL,
+            path TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status INTEGER,
+            headers TEXT,
+            body BLOB,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (method, path, idempotency_key)
+        ) WITHOUT ROWID
+    """
+    )
+
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires
+        ON idempotency_keys(expires_at)
+    """
+    )
+
     conn.commit()
     conn.close()
 
 
+def _ensure_column(cursor, table: str, column: str, definition: str) -> bool:
+    """Adiciona a coluna à tabela caso ela ainda não exista; retorna se adicionou"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    return False
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite de um processo
+
+    Conexões não podem atravessar um fork: o pool é recriado automaticamente
+    quando usado em um PID diferente daquele em que foi criado.
+
+    Com readonly=True as conexões são abertas com mode=ro e query_only, em
+    autocommit: cada SELECT lê um snapshot do WAL sem abrir transação de
+    escrita e sem commit.
+    """
+
+    def __init__(self, database_path: str, size: int, readonly: bool = False):
+        self.database_path = database_path
+        self.size = size
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.pid = os.getpid()
+        self.closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = Path(self.database_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                isolation_level=None,
+                check_same_thread=False,
+                factory=connection_factory(),
+            )
+            conn.execute("PRAGMA query_only=1")
+        else:
+            conn = sqlite3.connect(
+                self.database_path,
+                check_same_thread=False,
+                factory=connection_factory(),
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        if self.closed:
+            # pool removido do LRU enquanto a conexão estava em uso
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# pools do processo em ordem LRU, por (arquivo, somente leitura)
+_pools = OrderedDict()
+_pool_lock = threading.Lock()
+# shards de tenant cujo schema já foi criado neste processo
+_initialized_shards = set()
+
+
+def get_pool(readonly: bool = False) -> ConnectionPool:
+    """Retorna o pool do banco do contexto atual, criando-o no primeiro uso"""
+    database_path = get_database_path()
+    key = (database_path, readonly)
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != os.getpid():
+            # herdado de outro processo (fork): descarta todos
+            _pools.clear()
+            pool = None
+        if pool is None:
+            if database_path != DATABASE_PATH and database_path not in _initialized_shards:
+                # shards só nascem em provision_tenant; aqui o schema é atualizado
+                if not os.path.exists(database_path):
+                    raise UnknownTenantError(
+                        f"Unknown tenant: {_current_tenant.get()!r}"
+                    )
+                init_db(database_path)
+                _initialized_shards.add(database_path)
+            size = DB_READ_POOL_SIZE if readonly else DB_POOL_SIZE
+            pool = ConnectionPool(database_path, size, readonly)
+            _pools[key] = pool
+            while len(_pools) > TENANT_POOL_CACHE_SIZE:
+                _pools.popitem(last=False)[1].close()
+        else:
+            _pools.move_to_end(key)
+    return pool
+
+
+def reset_pool():
+    """Descarta os pools herdados; chamado em cada worker após o fork"""
+    with _pool_lock:
+        # conexões herdadas do master não são fechadas: pertencem a ele
+        _pools.clear()
+
+
+_local = threading.local()
+
+# média móvel exponencial da duração das transações de escrita; sobe quando
+# escritores esperam pelo lock do SQLite (busy_timeout)
+WRITE_LATENCY_SMOOTHING = 0.2
+# sem escritas novas o valor cai pela metade a cada intervalo destes (s)
+WRITE_LATENCY_HALF_LIFE = 1.0
+_write_latency = (0.0, 0.0)
+
+
+def _record_write_latency(seconds: float):
+    global _write_latency
+    now = time.monotonic()
+    current = _decayed_write_latency(now)
+    _write_latency = (current + WRITE_LATENCY_SMOOTHING * (seconds - current), now)
+
+
+def _decayed_write_latency(now: float) -> float:
+    value, recorded_at = _write_latency
+    return value * 0.5 ** ((now - recorded_at) / WRITE_LATENCY_HALF_LIFE)
+
+
+def get_write_latency_ms() -> float:
+    """Duração média recente (ms) das transações de escrita neste processo"""
+    return _decayed_write_latency(time.monotonic()) * 1000
+
+
 @contextmanager
-def get_db_connection():
-    """Context manager para conexão com o banco de dados"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+def transaction():
+    """Agrupa todas as chamadas a get_db_connection da thread em uma única transação"""
+    if getattr(_local, "conn", None) is not None:
+        yield _local.conn
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    _local.conn = conn
+    _local.after_commit = []
+    started = time.perf_counter()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _local.conn = None
+        callbacks, _local.after_commit = _local.after_commit, []
+        pool.release(conn)
+        _record_write_latency(time.perf_counter() - started)
+    for callback in callbacks:
+        callback()
+
+
+def after_commit(callback):
+    """Roda callback após o commit da transaction() corrente (ou já, fora dela)
+
+    Se a transação sofre rollback o callback é descartado.
+    """
+    if getattr(_local, "conn", None) is not None:
+        _local.after_commit.append(callback)
+    else:
+        callback()
+
+
+@contextmanager
+def get_db_connection(readonly: bool = False):
+    """Context manager para conexão com o banco de dados
+
+    readonly=True usa o pool somente leitura, sem commit. Dentro de
+    transaction() a conexão da transação é usada mesmo para leituras, para
+    que elas enxerguem as escritas ainda não commitadas.
+    """
+    if getattr(_local, "conn", None) is not None:
+        # dentro de transaction(): o commit fica a cargo dela
+        yield _local.conn
+        return
+
+    if readonly:
+        pool = get_pool(readonly=True)
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    started = time.perf_counter()
     try:
         yield conn
         conn.commit()
@@ -68,4 +587,5 @@ def get_db_connection():
         conn.rollback()
         raise
     finally:
-        conn.close()
+        pool.release(conn)
+        _record_write_latency(time.perf_counter() - started)
@@ -1,65 +1,189 @@
-from domain.events import DomainEvent
-from infrastructure.db.database import get_db_connection
+from domain.events import DomainEvent, QUERY_EVENT_TYPES
+from domain.exceptions import ConcurrencyError
+from infrastructure.db.database import (
+    QUERY_EVENT_TYPES_SQL,
+    after_commit,
+    get_database_path,
+    get_db_connection,
+    transaction,
+)
+from infrastructure.db.event_tail_cache import event_tail_cache
 import json
-from typing import List, Optional
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
 
 
 class EventStore:
     """Repositório para persistir eventos"""
 
+    def transaction(self, repository_transaction):
+        """Os eventos já entram na transação SQLite do repositório"""
+        return repository_transaction
+
     def save_event(self, event: DomainEvent) -> int:
         """Salva um evento no banco de dados"""
+        row = {
+            "event_type": event.event_type.value,
+            "aggregate_id": event.aggregate_id,
+            "data": json.dumps(event.data),
+            "occurred_at": event.occurred_at,
+            "version": event.version,
+        }
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
-                INSERT INTO events (event_type, aggregate_id, data, occurred_at)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO events (event_type, aggregate_id, data, occurred_at, version, actor)
+                VALUES (?, ?, ?, ?, ?, ?)
             """,
                 (
-                    event.event_type.value,
-                    event.aggregate_id,
-                    json.dumps(event.data),
-                    event.occurred_at,
+                    row["event_type"],
+                    row["aggregate_id"],
+                    row["data"],
+                    row["occurred_at"],
+                    row["version"],
+                    event.actor,
                 ),
             )
-            event.event_id = cursor.lastrowid
-            return event.event_id
+            event.event_id = row["id"] = cursor.lastrowid
+            # com o lock de escrita: nenhum evento entra entre este e o anterior
+            cursor.execute(
+                "SELECT MAX(id) AS id FROM events WHERE aggregate_id = ? AND id < ?",
+                (event.aggregate_id, event.event_id),
+            )
+            previous_id = cursor.fetchone()["id"]
+        key = (get_database_path(), event.aggregate_id)
+        after_commit(lambda: event_tail_cache.append(key, row, previous_id))
+        return event.event_id
+
+    def append_events(
+        self, aggregate_id: int, events: List[DomainEvent], expected_version: int
+    ) -> int:
+        """Salva os eventos como a versão expected_version + 1 do agregado
+
+        Lança ConcurrencyError se outro escritor já gravou uma versão mais nova.
+        """
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT MAX(version) AS version FROM events WHERE aggregate_id = ?",
+                (aggregate_id,),
+            )
+            current_version = cursor.fetchone()["version"]
+            # agregados anteriores ao versionamento não têm versão nos eventos
+            if current_version is not None and current_version != expected_version:
+                raise ConcurrencyError(aggregate_id, expected_version, current_version)
+
+            new_version = expected_version + 1
+            for event in events:
+                event.version = new_version
+                self.save_event(event)
+            return new_version
 
     def get_events_by_aggregate(self, aggregate_id: int) -> List[DomainEvent]:
         """Busca todos os eventos de um agregado específico"""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
+                FROM events
+                WHERE aggregate_id = ?
+                ORDER BY id ASC
+            """,
+                (aggregate_id,),
+            )
+
+            return [self._row_to_event(row) for row in cursor.fetchall()]
+
+    def iter_raw_events_by_aggregate(
+        self, aggregate_id: int, batch_size: int = 500
+    ) -> Iterator[sqlite3.Row]:
+        """Itera os eventos de um agregado direto do cursor, sem decodificar data
+
+        A conexão fica aberta enquanto o iterador é consumido e é fechada ao
+        final (ou quando o iterador é descartado).
+        """
+        with get_db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
-                SELECT id, event_type, aggregate_id, data, occurred_at
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
                 FROM events
                 WHERE aggregate_id = ?
                 ORDER BY id ASC
             """,
                 (aggregate_id,),
             )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
 
-            events = []
-            for row in cursor.fetchall():
-                event = DomainEvent(
-                    event_type=row["event_type"],
-                    aggregate_id=row["aggregate_id"],
-                    data=json.loads(row["data"]),
+    def get_recent_raw_events(
+        self, aggregate_id: int, limit: int, before: Optional[int] = None
+    ) -> List[dict]:
+        """Até limit eventos do agregado com id < before, em ordem de id
+
+        Servidos do cache de cauda em memória; o banco só é consultado para
+        conferir o último id do agregado (índice) e, se a cauda ficou para
+        trás ou não alcança before, para ler os eventos.
+        """
+        key = (get_database_path(), aggregate_id)
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT MAX(id) AS id FROM events WHERE aggregate_id = ?",
+                (aggregate_id,),
+            )
+            last_id = cursor.fetchone()["id"]
+            if last_id is None:
+                return []
+            rows = event_tail_cache.read(key, last_id, limit, before)
+            if rows is not None:
+                return rows
+
+            # com a cauda em dia, o que falta é anterior a ela (before abaixo do
+            # id mais antigo ou limit maior que a cauda): recarregar não ajuda
+            if event_tail_cache.oldest_id(key, last_id) is None:
+                cursor.execute(
+                    """
+                    SELECT id, event_type, aggregate_id, data, occurred_at, version
+                    FROM events
+                    WHERE aggregate_id = ? AND id <= ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                """,
+                    (aggregate_id, last_id, event_tail_cache.size),
                 )
-                event.event_id = row["id"]
-                event.occurred_at = row["occurred_at"]
-                events.append(event)
+                tail = [dict(row) for row in reversed(cursor.fetchall())]
+                complete = len(tail) < event_tail_cache.size
+                event_tail_cache.load(key, tail, complete)
+                rows = event_tail_cache.read(key, last_id, limit, before)
+                if rows is not None:
+                    return rows
 
-            return events
+            # mais antigos que a cauda
+            cursor.execute(
+                """
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
+                FROM events
+                WHERE aggregate_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+            """,
+                (aggregate_id, before or last_id + 1, limit),
+            )
+            return [dict(row) for row in reversed(cursor.fetchall())]
 
     def get_events_by_type(self, event_type: str) -> List[DomainEvent]:
         """Busca todos os eventos de um tipo específico"""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
-                SELECT id, event_type, aggregate_id, data, occurred_at
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
                 FROM events
                 WHERE event_type = ?
                 ORDER BY id ASC
@@ -67,15 +191,94 @@ class EventStore:
                 (event_type,),
             )
 
-            events = []
-            for row in cursor.fetchall():
-                event = DomainEvent(
-                    event_type=row["event_type"],
-                    aggregate_id=row["aggregate_id"],
-                    data=json.loads(row["data"]),
-                )
-                event.event_id = row["id"]
-                event.occurred_at = row["occurred_at"]
-                events.append(event)
+            return [self._row_to_event(row) for row in cursor.fetchall()]
+
+    def query_events(
+        self,
+        event_types: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        actor: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 100,
+    ) -> List[sqlite3.Row]:
+        """Busca eventos por tipo, intervalo [since, until) e autor, ordenados por
+        (occurred_at, id)
+
+        Paginação por keyset: after é o (occurred_at, id) do último evento da
+        página anterior, então cada página é uma busca de intervalo no índice.
+        """
+        clauses, params = [], []
+        if event_types:
+            clauses.append(f"event_type IN ({', '.join('?' * len(event_types))})")
+            params.extend(event_types)
+        if actor is not None:
+            clauses.append("actor = ?")
+            params.append(actor)
+        if since:
+            clauses.append("occurred_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("occurred_at < ?")
+            params.append(until)
+        if after:
+            clauses.append("(occurred_at, id) > (?, ?)")
+            params.extend(after)
+
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
+                FROM events
+                WHERE {" AND ".join(clauses) or "1"}
+                ORDER BY occurred_at, id
+                LIMIT ?
+            """,
+                (*params, limit),
+            )
+            return cursor.fetchall()
+
+    def get_aggregate_watermark(self, aggregate_id: int) -> Optional[Tuple[int, str]]:
+        """Retorna (id, occurred_at) do último evento que alterou o agregado"""
+        query_types = [event_type.value for event_type in QUERY_EVENT_TYPES]
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT id, occurred_at
+                FROM events
+                WHERE aggregate_id = ?
+                  AND event_type NOT IN ({", ".join("?" * len(query_types))})
+                ORDER BY id DESC
+                LIMIT 1
+            """,
+                (aggregate_id, *query_types),
+            )
+            row = cursor.fetchone()
+            if row:
+                return row["id"], row["occurred_at"]
+            return None
+
+    def get_state_watermark(self) -> int:
+        """Id do último evento que alterou algum agregado (0 se não há nenhum)"""
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            # literais, não parâmetros: assim a consulta usa idx_events_state
+            cursor.execute(
+                f"""
+                SELECT COALESCE(MAX(id), 0) AS id FROM events
+                WHERE event_type NOT IN ({QUERY_EVENT_TYPES_SQL})
+            """
+            )
+            return cursor.fetchone()["id"]
 
-            return events
+    def _row_to_event(self, row: sqlite3.Row) -> DomainEvent:
+        """Monta o DomainEvent; o JSON de data só é decodificado quando acessado"""
+        event = DomainEvent.from_json(
+            row["event_type"], row["aggregate_id"], row["data"]
+        )
+        event.event_id = row["id"]
+        event.occurred_at = row["occurred_at"]
+        event.version = row["version"]
+        return event
@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Hashable, Iterable, List, Optional
+
+# eventos mais recentes guardados por agregado
+EVENT_TAIL_SIZE = int(os.environ.get("EVENT_TAIL_SIZE", 64))
+# memória máxima (bytes aproximados) das caudas, por processo; 0 desliga o cache
+EVENT_TAIL_MAX_BYTES = int(os.environ.get("EVENT_TAIL_MAX_BYTES", 32 * 1024 * 1024))
+# custo estimado de uma linha além do JSON de data (dict, strings, ints)
+_ROW_OVERHEAD = 200
+
+
+def _row_bytes(row: dict) -> int:
+    return len(row["data"]) + _ROW_OVERHEAD
+
+
+class _Tail:
+    __slots__ = ("rows", "complete", "bytes")
+
+    def __init__(self, size: int, complete: bool):
+        self.rows = deque(maxlen=size)
+        # a cauda contém o histórico inteiro do agregado
+        self.complete = complete
+        self.bytes = 0
+
+    @property
+    def last_id(self) -> int:
+        return self.rows[-1]["id"] if self.rows else 0
+
+
+class EventTailCache:
+    """Ring buffer dos últimos eventos de cada agregado, com LRU entre agregados
+
+    As linhas (dicts com data ainda em JSON) entram ao fim do commit que as
+    gravou, desde que continuem a cauda: append recebe o id do evento anterior
+    do agregado e, se não for o último da cauda (outro processo escreveu no
+    meio), a cauda é descartada. Quem lê confere o último id do agregado no
+    banco; uma cauda atrasada é recarregada.
+    """
+
+    def __init__(
+        self, size: int = EVENT_TAIL_SIZE, max_bytes: int = EVENT_TAIL_MAX_BYTES
+    ):
+        self.size = size
+        self.max_bytes = max_bytes
+        self._tails: "OrderedDict[Hashable, _Tail]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def append(self, key: Hashable, row: dict, previous_id: Optional[int]):
+        """Acrescenta um evento já commitado; previous_id é o anterior do agregado"""
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is None:
+                if previous_id is not None:
+                    return
+                # primeiro evento do agregado: o histórico inteiro é conhecido
+                tail = self._tails[key] = _Tail(self.size, complete=True)
+            elif tail.last_id != (previous_id or 0):
+                self._drop(key)
+                return
+            self._push(tail, row)
+            self._tails.move_to_end(key)
+            self._evict()
+
+    def load(self, key: Hashable, rows: Iterable[dict], complete: bool):
+        """Substitui a cauda pelas linhas lidas do banco (em ordem de id)"""
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if key in self._tails:
+                self._drop(key)
+            tail = self._tails[key] = _Tail(self.size, complete)
+            for row in rows:
+                self._push(tail, row)
+            self._evict()
+
+    def read(
+        self, key: Hashable, last_id: int, limit: int, before: Optional[int] = None
+    ) -> Optional[List[dict]]:
+        """Até limit eventos com id < before, em ordem de id
+
+        None quando a cauda não está em cache, não termina em last_id ou não
+        alcança eventos antigos o bastante.
+        """
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is None or tail.last_id != last_id:
+                return None
+            self._tails.move_to_end(key)
+            rows = [row for row in tail.rows if before is None or row["id"] < before]
+            if len(rows) >= limit:
+                return rows[-limit:]
+            if tail.complete:
+                return rows
+            return None
+
+    def oldest_id(self, key: Hashable, last_id: int) -> Optional[int]:
+        """Id mais antigo da cauda em cache, ou None se ela não termina em last_id"""
+        with self._lock:
+            tail = self._tails.get(key)
+            if tail is None or not tail.rows or tail.last_id != last_id:
+                return None
+            return tail.rows[0]["id"]
+
+    def clear(self):
+        with self._lock:
+            self._tails.clear()
+            self._bytes = 0
+
+    def _push(self, tail: _Tail, row: dict):
+        if len(tail.rows) == tail.rows.maxlen:
+            dropped = tail.rows[0]
+            tail.bytes -= _row_bytes(dropped)
+            self._bytes -= _row_bytes(dropped)
+            tail.complete = False
+        tail.rows.append(row)
+        tail.bytes += _row_bytes(row)
+        self._bytes += _row_bytes(row)
+
+    def _drop(self, key: Hashable):
+        self._bytes -= self._tails.pop(key).bytes
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._tails:
+            self._drop(next(iter(self._tails)))
+
+
+event_tail_cache = EventTailCache()
@@ -0,0 +1,289 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+# comandos mais lentos que isso (ms) vão para o log de consultas lentas;
+# negativo desliga a instrumentação (conexões sqlite3 comuns)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+# entradas mantidas em memória por processo (as mais antigas saem)
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", 200))
+# tabelas com mais linhas que isso (aproximado) são grandes: SCAN nelas é sinalizado
+LARGE_TABLE_ROWS = int(os.environ.get("LARGE_TABLE_ROWS", 10_000))
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.I)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_SEARCH = re.compile(
+    r"^SEARCH (?:TABLE )?(\w+) USING (?:(?:COVERING )?INDEX (\w+)|(.*))"
+)
+_CLAUSE_END = r"(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)"
+_WHERE = re.compile(r"\bWHERE\b(.*?)" + _CLAUSE_END, re.I | re.S)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\b(.*?)(?=\bLIMIT\b|$)", re.I | re.S)
+_EQUALITY = re.compile(r"(\w+)\s*(?:=|\bIN\s*\(|\bIS\b)", re.I)
+_RANGE = re.compile(r"(\w+)\s*(?:<|>|\bBETWEEN\b|\bLIKE\b)", re.I)
+
+
+def _columns(sql_fragment: Optional[str], pattern: re.Pattern) -> List[str]:
+    if not sql_fragment:
+        return []
+    return [match.group(1).lower() for match in pattern.finditer(sql_fragment)]
+
+
+def _table_info(conn: sqlite3.Connection, table: str):
+    """(colunas, coluna INTEGER PRIMARY KEY, índices existentes) da tabela"""
+    execute = sqlite3.Connection.execute
+    columns = execute(conn, f"PRAGMA table_info({table})").fetchall()
+    rowid_alias = next(
+        (c[1].lower() for c in columns if c[5] == 1 and c[2].upper() == "INTEGER"),
+        None,
+    )
+    indexes = []
+    for index in execute(conn, f"PRAGMA index_list({table})").fetchall():
+        info = execute(conn, f"PRAGMA index_info({index[1]})")
+        indexes.append(tuple(row[2].lower() for row in info if row[2]))
+    return [c[1].lower() for c in columns], rowid_alias, indexes
+
+
+def _table_rows(conn: sqlite3.Connection, table: str) -> Optional[int]:
+    """Tamanho aproximado da tabela pelo maior rowid (uma busca na árvore)"""
+    try:
+        row = sqlite3.Connection.execute(conn, f"SELECT MAX(rowid) FROM {table}")
+        return row.fetchone()[0] or 0
+    except sqlite3.Error:
+        # WITHOUT ROWID: tamanho desconhecido
+        return None
+
+
+def suggest_index(
+    conn: sqlite3.Connection, sql: str, table: str, sort: bool = False
+) -> Optional[str]:
+    """CREATE INDEX sugerido para a tabela a partir do WHERE (e ORDER BY) do SQL
+
+    Heurística: colunas comparadas por igualdade primeiro, depois a primeira
+    de intervalo ou, se houver ordenação, as do ORDER BY. A coluna INTEGER
+    PRIMARY KEY no fim é omitida, pois todo índice já termina no rowid.
+    """
+    columns, rowid_alias, indexes = _table_info(conn, table)
+    where = _WHERE.search(sql)
+    where = where.group(1) if where else None
+    suggested = []
+    for column in _columns(where, _EQUALITY):
+        if column in columns and column not in suggested:
+            suggested.append(column)
+    ranged = [c for c in _columns(where, _RANGE) if c in columns]
+    order_by = _ORDER_BY.search(sql)
+    ordered = [
+        c.split()[0].lower()
+        for c in (order_by.group(1).split(",") if order_by and sort else [])
+        if c.split()
+    ]
+    tail = ordered if ordered and all(c in columns for c in ordered) else ranged[:1]
+    for column in tail:
+        if column not in suggested:
+            suggested.append(column)
+    if suggested and suggested[-1] == rowid_alias:
+        suggested.pop()
+    if not suggested or tuple(suggested) in indexes:
+        return None
+    return (
+        f"CREATE INDEX idx_{table}_{'_'.join(suggested)} "
+        f"ON {table}({', '.join(suggested)})"
+    )
+
+
+def explain(
+    conn: sqlite3.Connection, sql: str, parameters: Sequence = ()
+) -> Optional[dict]:
+    """EXPLAIN QUERY PLAN do comando, com scans de tabelas grandes e sugestões
+
+    Retorna None para comandos sem plano (PRAGMA, BEGIN...) ou que falham.
+    """
+    if not _EXPLAINABLE.match(sql):
+        return None
+    try:
+        plan = sqlite3.Connection.execute(
+            conn, "EXPLAIN QUERY PLAN " + sql, parameters
+        ).fetchall()
+    except sqlite3.Error:
+        return None
+    details = [row[3] for row in plan]
+    indexes, scans, suggestions = [], [], []
+    sort = any(detail.startswith("USE TEMP B-TREE FOR ORDER BY") for detail in details)
+    for detail in details:
+        search = _SEARCH.match(detail)
+        if search:
+            indexes.append(search.group(2) or search.group(3).split(" (")[0])
+            continue
+        scan = _SCAN.match(detail)
+        if not scan:
+            continue
+        table, index = scan.groups()
+        if index:
+            indexes.append(index)
+        if not _table_info(conn, table)[0]:
+            # subconsulta, CTE ou linha constante
+            continue
+        rows = _table_rows(conn, table)
+        if rows is None or rows >= LARGE_TABLE_ROWS:
+            scans.append({"table": table, "rows": rows, "index": index})
+            suggestion = suggest_index(conn, sql, table, sort)
+            if suggestion and suggestion not in suggestions:
+                suggestions.append(suggestion)
+    return {
+        "plan": details,
+        "indexes": indexes,
+        "temp_b_tree": any("TEMP B-TREE" in detail for detail in details),
+        "large_scans": scans,
+        "suggestions": suggestions,
+    }
+
+
+class SlowQueryLog:
+    """Últimos comandos SQL acima de SLOW_QUERY_MS, com o plano de execução"""
+
+    def __init__(self, size: int = SLOW_QUERY_LOG_SIZE):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.flagged = 0
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters, ms: float):
+        """Registra o comando; os parâmetros servem ao EXPLAIN e são descartados"""
+        analysis = explain(conn, sql, parameters) if parameters is not None else None
+        entry = {
+            "sql": " ".join(sql.split()),
+            "duration_ms": round(ms, 2),
+            "recorded_at": datetime.now().isoformat(),
+            **(analysis or {"plan": None}),
+        }
+        flagged = bool(analysis and analysis["large_scans"])
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+            self.flagged += flagged
+        print(f"[SLOW QUERY] {entry['duration_ms']}ms: {entry['sql'][:200]}")
+        for detail in entry["plan"] or []:
+            print(f"             {detail}")
+        for suggestion in (analysis or {}).get("suggestions", []):
+            print(f"             suggestion: {suggestion}")
+        return entry
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.recorded = 0
+            self.flagged = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threshold_ms": SLOW_QUERY_MS if SLOW_QUERY_MS >= 0 else None,
+                "recorded": self.recorded,
+                "large_scans": self.flagged,
+            }
+
+
+slow_query_log = SlowQueryLog()
+
+_capture = threading.local()
+
+
+@contextmanager
+def capture_plans():
+    """Coleta o plano de todos os comandos desta thread (verificação de índices)
+
+    Rende uma lista de (sql, análise de explain()) preenchida a cada execute.
+    """
+    previous = getattr(_capture, "plans", None)
+    _capture.plans = plans = []
+    try:
+        yield plans
+    finally:
+        _capture.plans = previous
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede execute e fetch* de cada comando
+
+    O tempo de um comando soma o execute e as leituras seguintes; ao passar
+    de SLOW_QUERY_MS ele entra no log (uma vez, com a duração atualizada até
+    o próximo execute). Iterar o cursor diretamente não é medido.
+    """
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # os parâmetros de cada linha não ficam disponíveis para o EXPLAIN
+        self._start(sql, None)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed(super().fetchmany)
+        return self._timed(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def _start(self, sql, parameters):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = 0.0
+        self._entry = None
+        plans = getattr(_capture, "plans", None)
+        if plans is not None and parameters is not None:
+            plans.append((sql, explain(self.connection, sql, parameters)))
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._add(time.perf_counter() - started)
+
+    def _add(self, seconds: float):
+        sql = getattr(self, "_sql", None)
+        if sql is None:
+            return
+        self._elapsed += seconds
+        ms = self._elapsed * 1000
+        if ms < SLOW_QUERY_MS:
+            return
+        if self._entry is None:
+            self._entry = slow_query_log.record(
+                self.connection, sql, self._parameters, ms
+            )
+        else:
+            self._entry["duration_ms"] = round(ms, 2)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de execute) são InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Classe de conexão dos pools: instrumentada, salvo com o log desligado"""
+    return InstrumentedConnection if SLOW_QUERY_MS >= 0 else sqlite3.Connection
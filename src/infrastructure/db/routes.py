@@ -1,14 +1,41 @@
-from flask import Flask
+from flask import Flask, jsonify
+from infrastructure.db.query_log import slow_query_log
 from infrastructure.web.api_config import api
+from infrastructure.web.admission import init_admission
+from infrastructure.web.compression import compress_response
+from infrastructure.web.event_controller import ns_event
+from infrastructure.web.report_controller import ns_report
+from infrastructure.web.result_cache import result_cache
+from infrastructure.web.tenancy import init_tenancy
 from infrastructure.web.user_controller import ns_user
 
-app = Flask(__name__)
+api.add_namespace(ns_user)
+api.add_namespace(ns_event)
+api.add_namespace(ns_report)
 
 
-@app.route("/health")
 def health_check():
-    return {"status_code": "ok", "code": 200, "data": "healthy"}
+    return {
+        "status_code": "ok",
+        "code": 200,
+        "data": "healthy",
+        "result_cache": result_cache.stats(),
+        "slow_queries": slow_query_log.stats(),
+    }
 
 
-api.init_app(app)
-api.add_namespace(ns_user)
+def slow_queries():
+    """Últimas consultas lentas deste processo, com plano e sugestões de índice"""
+    return jsonify(slow_query_log.entries())
+
+
+def create_app() -> Flask:
+    """Cria a aplicação Flask; banco e handlers são inicializados no primeiro uso"""
+    app = Flask(__name__)
+    app.add_url_rule("/health", "health_check", health_check)
+    app.add_url_rule("/health/slow-queries", "slow_queries", slow_queries)
+    init_admission(app)
+    init_tenancy(app)
+    api.init_app(app)
+    app.after_request(compress_response)
+    return app
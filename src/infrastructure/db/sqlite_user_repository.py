@@ -1,18 +1,21 @@
-from domain.user import User
+from domain.user import USER_FIELDS, User
+from domain.exceptions import ConcurrencyError
 from domain.repositories import UserRepository
-from infrastructure.db.database import get_db_connection
-from typing import Optional, List
+from infrastructure.db.database import get_db_connection, transaction
+from datetime import datetime
+from typing import Iterator, Optional, List, Tuple
 
 
 class SqliteUserRepository(UserRepository):
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Fetch a user by ID"""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
                 SELECT id, name, email, is_active, phone, salary, position, 
-                       department, employment_type, manager_id, hire_date, birth_date, address
+                       department, employment_type, manager_id, hire_date, birth_date, address,
+                       version
                 FROM users WHERE id = ?
             """,
                 (user_id,),
@@ -34,45 +37,53 @@ class SqliteUserRepository(UserRepository):
                     hire_date=row["hire_date"],
                     birth_date=row["birth_date"],
                     address=row["address"],
+                    version=row["version"],
                 )
             return None
 
     def create_user(self, user: User) -> User:
         """Create a new user in the database"""
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO users (name, email, is_active, phone, salary, position, 
-                                 department, employment_type, manager_id, hire_date, birth_date, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    user.name,
-                    user.email,
-                    user.is_active,
-                    user.phone,
-                    user.salary,
-                    user.position,
-                    user.department,
-                    user.employment_type,
-                    user.manager_id,
-                    user.hire_date,
-                    user.birth_date,
-                    user.address,
-                ),
-            )
-            user.id = cursor.lastrowid
+            user.id = self.insert_row(conn.cursor(), vars(user))
+            user.version = 1
             return user
 
+    def insert_row(self, cursor, row: dict) -> int:
+        """Insert an already validated user row with the caller's cursor; return its id"""
+        cursor.execute(
+            """
+            INSERT INTO users (name, email, is_active, phone, salary, position, 
+                             department, employment_type, manager_id, hire_date, birth_date, address,
+                             version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+        """,
+            (
+                row["name"],
+                row["email"],
+                row.get("is_active", True),
+                row.get("phone"),
+                row.get("salary", 0.0),
+                row.get("position"),
+                row.get("department"),
+                row.get("employment_type"),
+                row.get("manager_id"),
+                row.get("hire_date"),
+                row.get("birth_date"),
+                row.get("address"),
+                datetime.now().isoformat(),
+            ),
+        )
+        return cursor.lastrowid
+
     def get_all_users(self) -> List[User]:
         """Return all users"""
-        with get_db_connection() as conn:
+        with get_db_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
                 SELECT id, name, email, is_active, phone, salary, position,
-                       department, employment_type, manager_id, hire_date, birth_date, address
+                       department, employment_type, manager_id, hire_date, birth_date, address,
+                       version
                 FROM users WHERE is_active = 1
             """
             )
@@ -94,50 +105,150 @@ class SqliteUserRepository(UserRepository):
                     hire_date=row["hire_date"],
                     birth_date=row["birth_date"],
                     address=row["address"],
+                    version=row["version"],
                 )
                 users.append(user)
             return users
 
-    def update_user(self, user_id: int, user: User) -> Optional[User]:
-        """Update an existing user"""
+    def iter_all_users(self) -> Iterator[User]:
+        """Yield every user, active or not, in id order"""
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT id, {', '.join(USER_FIELDS)}, version FROM users ORDER BY id"
+            )
+            for row in cursor:
+                yield User(
+                    id=row["id"],
+                    version=row["version"],
+                    **{field: row[field] for field in USER_FIELDS},
+                )
+
+    def get_user_version(self, user_id: int) -> Optional[Tuple[int, str]]:
+        """Fetch (version, updated_at) of an active user"""
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT version, updated_at FROM users WHERE id = ? AND is_active = 1",
+                (user_id,),
+            )
+            row = cursor.fetchone()
+            if row:
+                return row["version"], row["updated_at"]
+            return None
+
+    def update_user(
+        self, user_id: int, user: User, expected_version: int = None
+    ) -> Optional[User]:
+        """Update an existing user, optionally only if it is still at expected_version"""
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            params = [
+                user.name,
+                user.email,
+                user.is_active,
+                user.phone,
+                user.salary,
+                user.position,
+                user.department,
+                user.employment_type,
+                user.manager_id,
+                user.hire_date,
+                user.birth_date,
+                user.address,
+                datetime.now().isoformat(),
+                user_id,
+            ]
+            version_check = ""
+            if expected_version is not None:
+                version_check = " AND version = ?"
+                params.append(expected_version)
+
             cursor.execute(
                 """
                 UPDATE users 
                 SET name = ?, email = ?, is_active = ?, phone = ?, salary = ?,
                     position = ?, department = ?, employment_type = ?, manager_id = ?,
-                    hire_date = ?, birth_date = ?, address = ?
-                WHERE id = ?
+                    hire_date = ?, birth_date = ?, address = ?,
+                    version = version + 1, updated_at = ?
+                WHERE id = ?"""
+                + version_check,
+                params,
+            )
+            if cursor.rowcount == 0:
+                self._raise_if_conflict(cursor, user_id, expected_version)
+                return None
+
+            user.id = user_id
+            if expected_version is not None:
+                user.version = expected_version + 1
+            else:
+                cursor.execute("SELECT version FROM users WHERE id = ?", (user_id,))
+                user.version = cursor.fetchone()["version"]
+            return user
+
+    def patch_user(
+        self, user_id: int, changes: dict, expected_version: int = None
+    ) -> Optional[int]:
+        """Update only the given columns; return the new version (None if missing)"""
+        columns = [field for field in USER_FIELDS if field in changes]
+        assignments = "".join(f"{column} = ?, " for column in columns)
+        params = [changes[column] for column in columns]
+        params += [datetime.now().isoformat(), user_id]
+        version_check = ""
+        if expected_version is not None:
+            version_check = " AND version = ?"
+            params.append(expected_version)
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                UPDATE users
+                SET {assignments}version = version + 1, updated_at = ?
+                WHERE id = ?{version_check}
             """,
-                (
-                    user.name,
-                    user.email,
-                    user.is_active,
-                    user.phone,
-                    user.salary,
-                    user.position,
-                    user.department,
-                    user.employment_type,
-                    user.manager_id,
-                    user.hire_date,
-                    user.birth_date,
-                    user.address,
-                    user_id,
-                ),
+                params,
             )
-            if cursor.rowcount > 0:
-                user.id = user_id
-                return user
-            return None
+            if cursor.rowcount == 0:
+                self._raise_if_conflict(cursor, user_id, expected_version)
+                return None
+            if expected_version is not None:
+                return expected_version + 1
+            cursor.execute("SELECT version FROM users WHERE id = ?", (user_id,))
+            return cursor.fetchone()["version"]
 
-    def delete_user(self, user_id: int) -> bool:
+    def delete_user(self, user_id: int, expected_version: int = None) -> bool:
         """Delete a user by ID"""
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            params = [False, datetime.now().isoformat(), user_id]
+            version_check = ""
+            if expected_version is not None:
+                version_check = " AND version = ?"
+                params.append(expected_version)
+
             cursor.execute(
-                "UPDATE users SET is_active = ? WHERE id = ?", (False, user_id)
+                """
+                UPDATE users SET is_active = ?, version = version + 1, updated_at = ?
+                WHERE id = ?"""
+                + version_check,
+                params,
             )
             if cursor.rowcount > 0:
                 return True
+            self._raise_if_conflict(cursor, user_id, expected_version)
             return False
+
+    def transaction(self):
+        """Share one SQLite transaction between the repository and the EventStore"""
+        return transaction()
+
+    def _raise_if_conflict(self, cursor, user_id: int, expected_version: int):
+        """Tell a stale expected_version apart from a missing user"""
+        if expected_version is None:
+            return
+        cursor.execute("SELECT version FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row:
+            raise ConcurrencyError(user_id, expected_version, row["version"])
@@ -0,0 +1,648 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import chain
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from domain.events import UserCreatedEvent, UserHiredEvent
+from domain.user import USER_FIELDS, validate_user_changes
+from infrastructure.db.database import get_db_connection, transaction
+from infrastructure.db.event_store import EventStore
+from infrastructure.db.sqlite_user_repository import SqliteUserRepository
+from infrastructure.event_bus import get_event_bus
+
+# linhas por tarefa de validação enviada ao pool de processos
+IMPORT_CHUNK_ROWS = int(os.environ.get("IMPORT_CHUNK_ROWS", 2000))
+# usuários gravados (com seus eventos) por transação
+IMPORT_BATCH_ROWS = int(os.environ.get("IMPORT_BATCH_ROWS", 5000))
+# processos de validação; 0 ou 1 valida no próprio processo
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", os.cpu_count() or 1))
+
+FORMATS = ("csv", "jsonl")
+# manager_id com este prefixo aponta para um usuário já cadastrado (user:42);
+# sem ele, só para o id de outra linha do arquivo
+EXISTING_USER_PREFIX = "user:"
+# parâmetros por consulta IN (o limite antigo do SQLite é 999)
+_IN_CHUNK = 500
+_TRUE = {"1", "true", "yes", "y", "t"}
+_FALSE = {"0", "false", "no", "n", "f"}
+
+
+class UserImportError(Exception):
+    pass
+
+
+def _chunks(items: list, size: int = _IN_CHUNK) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"Invalid is_active: {value!r}")
+
+
+def coerce_row(raw: dict) -> Tuple[Optional[str], Optional[str], dict]:
+    """Normaliza uma linha do arquivo; retorna (id externo, id do gestor, campos)
+
+    "id" e "manager_id" são identificadores do sistema de origem: o gestor é
+    resolvido depois, contra as outras linhas do arquivo ou, com o prefixo
+    EXISTING_USER_PREFIX, contra os usuários já cadastrados.
+    """
+    if None in raw:
+        extra = raw[None]
+        raise ValueError(
+            extra if isinstance(extra, str) else "Row has more fields than the header"
+        )
+    row = {}
+    for key, value in raw.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value != "" and value is not None:
+            row[key.strip()] = value
+
+    external_id = row.pop("id", None)
+    manager_ref = row.pop("manager_id", None)
+    validate_user_changes(row)
+    for required in ("name", "email"):
+        if required not in row:
+            raise ValueError(f"Missing required field: {required}")
+    if "salary" in row:
+        try:
+            row["salary"] = float(row["salary"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid salary: {row['salary']!r}")
+    if "is_active" in row:
+        row["is_active"] = _parse_bool(row["is_active"])
+    for field in ("hire_date", "birth_date"):
+        if field in row:
+            try:
+                row[field] = date.fromisoformat(str(row[field])).isoformat()
+            except ValueError:
+                raise ValueError(f"Invalid {field}: {row[field]!r}")
+    for field in ("name", "email", "phone", "address"):
+        if field in row:
+            row[field] = str(row[field])
+    return (
+        None if external_id is None else str(external_id),
+        None if manager_ref is None else str(manager_ref),
+        row,
+    )
+
+
+def _existing_user_id(manager_ref: str) -> Optional[int]:
+    """Id do usuário de um manager_id "user:<id>"; None para ids do arquivo"""
+    if not manager_ref.startswith(EXISTING_USER_PREFIX):
+        return None
+    user_id = manager_ref[len(EXISTING_USER_PREFIX) :]
+    return int(user_id) if user_id.isdigit() else None
+
+
+def _raw_external_id(raw: dict) -> Optional[str]:
+    """O "id" de uma linha inválida, para que os subordinados dela falhem também"""
+    for key, value in raw.items():
+        if isinstance(key, str) and key.strip() == "id" and value is not None:
+            value = str(value).strip()
+            return value or None
+    return None
+
+
+def validate_chunk(chunk: List[Tuple[int, dict]]) -> List[tuple]:
+    """Roda no pool: (linha, id externo, gestor, campos em JSON, erro) por linha"""
+    results = []
+    for row_number, raw in chunk:
+        try:
+            external_id, manager_ref, fields = coerce_row(raw)
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append((row_number, _raw_external_id(raw), None, None, str(e)))
+        else:
+            results.append(
+                (row_number, external_id, manager_ref, json.dumps(fields), None)
+            )
+    return results
+
+
+def iter_rows(stream: BinaryIO, file_format: str) -> Iterator[Tuple[int, dict]]:
+    """Lê o arquivo de forma incremental: (número da linha de dados, registro)"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        unknown = set(reader.fieldnames or ()) - {*USER_FIELDS, "id", "manager_id"}
+        if unknown:
+            raise UserImportError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, row
+    elif file_format == "jsonl":
+        row_number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {None: "invalid JSON"}
+            yield row_number, row if isinstance(row, dict) else {None: "not an object"}
+    else:
+        raise UserImportError(f"format must be one of: {', '.join(FORMATS)}")
+
+
+class UserImporter:
+    """Importação em massa de usuários a partir de CSV/JSONL, retomável
+
+    1. staging: o arquivo é lido em blocos, validado em um pool de processos
+       e as linhas vão para user_import_rows (as inválidas como 'failed', com
+       a mensagem em user_import_errors). rows_read é o checkpoint de leitura.
+    2. carga: as linhas são ordenadas topologicamente pelo gestor e gravadas
+       em lotes; cada lote insere usuários, eventos e o estado das linhas em
+       uma única transação, e só então os eventos são publicados.
+
+    Rodar de novo com o mesmo import_id continua de onde parou.
+    """
+
+    def __init__(
+        self,
+        import_id: str,
+        chunk_rows: int = IMPORT_CHUNK_ROWS,
+        batch_rows: int = IMPORT_BATCH_ROWS,
+        workers: int = IMPORT_WORKERS,
+    ):
+        self.import_id = import_id
+        self.chunk_rows = chunk_rows
+        self.batch_rows = batch_rows
+        self.workers = workers
+        self.user_repository = SqliteUserRepository()
+        self.event_store = EventStore()
+        self.event_bus = get_event_bus()
+
+    def run(self, stream: BinaryIO, file_format: str, source: str = None) -> dict:
+        """Importa o arquivo (ou retoma a importação) e retorna o progresso"""
+        status = self._start(source)
+        if status == "staging":
+            self._stage(iter_rows(stream, file_format))
+        if status != "done":
+            self._load()
+        return self.progress()
+
+    def progress(
+        self, errors_after: int = 0, errors_limit: int = 100
+    ) -> Optional[dict]:
+        """Estado da importação e uma página do relatório de erros"""
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT import_id, source, status, rows_read, rows_imported,
+                       rows_failed, created_at, updated_at
+                FROM user_imports WHERE import_id = ?
+            """,
+                (self.import_id,),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(
+                """
+                SELECT row_number, message FROM user_import_errors
+                WHERE import_id = ? AND row_number > ?
+                ORDER BY row_number LIMIT ?
+            """,
+                (self.import_id, errors_after, errors_limit),
+            )
+            return dict(row, errors=[dict(error) for error in cursor.fetchall()])
+
+    def iter_errors(self) -> Iterator[Tuple[int, str]]:
+        """Todos os erros, em ordem de linha (para o relatório)"""
+        after = 0
+        while True:
+            errors = self.progress(errors_after=after, errors_limit=1000)["errors"]
+            if not errors:
+                return
+            for error in errors:
+                yield error["row_number"], error["message"]
+            after = errors[-1]["row_number"]
+
+    def _start(self, source: str) -> str:
+        with transaction() as conn:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO user_imports
+                    (import_id, source, status, rows_read, rows_imported,
+                     rows_failed, created_at, updated_at)
+                VALUES (?, ?, 'staging', 0, 0, 0, ?, ?)
+            """,
+                (self.import_id, source, now, now),
+            )
+            cursor.execute(
+                "SELECT status FROM user_imports WHERE import_id = ?",
+                (self.import_id,),
+            )
+            return cursor.fetchone()["status"]
+
+    # -- staging --------------------------------------------------------
+
+    def _stage(self, rows: Iterator[Tuple[int, dict]]):
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT rows_read FROM user_imports WHERE import_id = ?",
+                (self.import_id,),
+            )
+            rows_read = cursor.fetchone()["rows_read"]
+
+        chunks = self._iter_chunks(row for row in rows if row[0] > rows_read)
+        for results in self._validate(chunks):
+            self._save_staged(results)
+        self._reject_duplicates()
+        with transaction() as conn:
+            conn.execute(
+                """
+                UPDATE user_imports SET status = 'loading', updated_at = ?
+                WHERE import_id = ?
+            """,
+                (datetime.now().isoformat(), self.import_id),
+            )
+
+    def _iter_chunks(self, rows) -> Iterator[list]:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _validate(self, chunks: Iterator[list]) -> Iterator[list]:
+        """Valida os blocos em paralelo, devolvendo-os na ordem do arquivo
+
+        No máximo 2 blocos por processo ficam em voo, então a memória não
+        cresce com o tamanho do arquivo. Um arquivo de um bloco só é validado
+        aqui mesmo: subir o pool custaria mais que a validação.
+        """
+        first = next(chunks, None)
+        second = next(chunks, None)
+        if second is None or self.workers <= 1:
+            for chunk in chain((first, second), chunks):
+                if chunk is not None:
+                    yield validate_chunk(chunk)
+            return
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+            pending = deque()
+            for chunk in chain((first, second), chunks):
+                pending.append(pool.submit(validate_chunk, chunk))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _save_staged(self, results: List[tuple]):
+        valid = [
+            (self.import_id, row_number, external_id, manager_ref, data)
+            for row_number, external_id, manager_ref, data, error in results
+            if error is None
+        ]
+        errors = [
+            (self.import_id, row_number, error)
+            for row_number, _, _, _, error in results
+            if error is not None
+        ]
+        # linhas inválidas ficam registradas pelo id: seus subordinados falham
+        invalid = [
+            (self.import_id, row_number, external_id)
+            for row_number, external_id, _, _, error in results
+            if error is not None and external_id is not None
+        ]
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO user_import_rows
+                    (import_id, row_number, external_id, manager_ref, data, status)
+                VALUES (?, ?, ?, ?, ?, 'pending')
+            """,
+                valid,
+            )
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO user_import_rows
+                    (import_id, row_number, external_id, data, status)
+                VALUES (?, ?, ?, '{}', 'failed')
+            """,
+                invalid,
+            )
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO user_import_errors
+                    (import_id, row_number, message)
+                VALUES (?, ?, ?)
+            """,
+                errors,
+            )
+            cursor.execute(
+                """
+                UPDATE user_imports
+                SET rows_read = ?, rows_failed = rows_failed + ?, updated_at = ?
+                WHERE import_id = ?
+            """,
+                (
+                    results[-1][0],
+                    len(errors),
+                    datetime.now().isoformat(),
+                    self.import_id,
+                ),
+            )
+
+    def _reject_duplicates(self):
+        """Ids externos repetidos no arquivo: vale a primeira ocorrência"""
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT row_number, external_id FROM user_import_rows r
+                WHERE import_id = ? AND status = 'pending' AND external_id IS NOT NULL
+                  AND row_number > (
+                      SELECT MIN(row_number) FROM user_import_rows
+                      WHERE import_id = r.import_id AND external_id = r.external_id
+                        AND status = 'pending'
+                  )
+            """,
+                (self.import_id,),
+            )
+            duplicates = cursor.fetchall()
+            self._fail(
+                cursor,
+                [
+                    (row["row_number"], f"Duplicate id {row['external_id']}")
+                    for row in duplicates
+                ],
+            )
+
+    # -- carga ----------------------------------------------------------
+
+    def _load(self):
+        for batch in self._topological_batches():
+            self._load_batch(batch)
+        with transaction() as conn:
+            conn.execute(
+                """
+                UPDATE user_imports SET status = 'done', updated_at = ?
+                WHERE import_id = ?
+            """,
+                (datetime.now().isoformat(), self.import_id),
+            )
+
+    def _topological_batches(self) -> Iterator[List[int]]:
+        """Números de linha pendentes em lotes, sempre depois da linha do gestor
+
+        Linhas cujo gestor não pode ser resolvido (inexistente, em ciclo ou
+        com erro) saem como falha no fim.
+        """
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT row_number, external_id, manager_ref, status
+                FROM user_import_rows WHERE import_id = ?
+            """,
+                (self.import_id,),
+            )
+            rows = cursor.fetchall()
+
+        # ids de linhas que falharam (validação, duplicidade ou carga)
+        failed_ids = {
+            row["external_id"]
+            for row in rows
+            if row["status"] == "failed" and row["external_id"] is not None
+        }
+        rows = [row for row in rows if row["status"] != "failed"]
+        row_by_external = {
+            row["external_id"]: row["row_number"]
+            for row in rows
+            if row["external_id"] is not None
+        }
+        existing = self._existing_managers(
+            {row["manager_ref"] for row in rows if row["manager_ref"] is not None}
+        )
+        done = {row["row_number"] for row in rows if row["status"] == "done"}
+        reports = defaultdict(list)
+        ready, unresolved = deque(), []
+        for row in rows:
+            if row["status"] == "done":
+                continue
+            manager_ref = row["manager_ref"]
+            if manager_ref is None or manager_ref in existing:
+                ready.append(row["row_number"])
+            elif manager_ref in row_by_external:
+                manager_row = row_by_external[manager_ref]
+                if manager_row in done:
+                    ready.append(row["row_number"])
+                else:
+                    reports[manager_row].append(row["row_number"])
+            elif manager_ref in failed_ids:
+                unresolved.append(
+                    (row["row_number"], f"Manager {manager_ref} was not imported")
+                )
+            else:
+                unresolved.append(
+                    (row["row_number"], f"Unknown manager_id {manager_ref}")
+                )
+
+        batch = []
+        ready = deque(sorted(ready))
+        while ready:
+            row_number = ready.popleft()
+            batch.append(row_number)
+            ready.extend(reports.pop(row_number, ()))
+            if len(batch) >= self.batch_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+        # o que sobrou nunca ficou pronto: gestores em ciclo (ou abaixo de um)
+        for manager_row, waiting in reports.items():
+            for row_number in waiting:
+                unresolved.append(
+                    (row_number, "manager_id is part of a cycle or depends on one")
+                )
+        if unresolved:
+            with transaction() as conn:
+                self._fail(conn.cursor(), unresolved)
+
+    def _existing_managers(self, refs: set) -> set:
+        """Referências com EXISTING_USER_PREFIX que são usuários ativos"""
+        ids = {ref: _existing_user_id(ref) for ref in refs}
+        ids = {ref: user_id for ref, user_id in ids.items() if user_id is not None}
+        found = set()
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            for chunk in _chunks(list(ids.values())):
+                cursor.execute(
+                    f"""
+                    SELECT id FROM users
+                    WHERE is_active = 1 AND id IN ({", ".join("?" * len(chunk))})
+                """,
+                    chunk,
+                )
+                found.update(row["id"] for row in cursor.fetchall())
+        return {ref for ref, user_id in ids.items() if user_id in found}
+
+    def _load_batch(self, batch: List[int]):
+        events, failed = [], []
+        with transaction() as conn:
+            cursor = conn.cursor()
+            staged = {}
+            for chunk in _chunks(batch):
+                cursor.execute(
+                    f"""
+                    SELECT row_number, external_id, manager_ref, data
+                    FROM user_import_rows
+                    WHERE import_id = ? AND status = 'pending'
+                      AND row_number IN ({", ".join("?" * len(chunk))})
+                """,
+                    (self.import_id, *chunk),
+                )
+                staged.update((row["row_number"], row) for row in cursor.fetchall())
+            fields_by_row = {
+                row_number: json.loads(row["data"])
+                for row_number, row in staged.items()
+            }
+            taken = self._taken_emails(
+                cursor, [fields["email"] for fields in fields_by_row.values()]
+            )
+            managers = self._resolved_managers(cursor, staged.values())
+
+            created = []
+            for row_number in batch:
+                row = staged.get(row_number)
+                if row is None:
+                    continue
+                fields = fields_by_row[row_number]
+                manager_ref = row["manager_ref"]
+                if manager_ref is not None and manager_ref not in managers:
+                    failed.append(
+                        (row_number, f"Manager {manager_ref} was not imported")
+                    )
+                    continue
+                if fields["email"] in taken:
+                    failed.append(
+                        (row_number, f"Email already registered: {fields['email']}")
+                    )
+                    continue
+                taken.add(fields["email"])
+                if manager_ref is not None:
+                    fields["manager_id"] = managers[manager_ref]
+                user_id = self.user_repository.insert_row(cursor, fields)
+                if row["external_id"] is not None:
+                    managers[row["external_id"]] = user_id
+                created.append((user_id, row_number))
+                events.extend(self._creation_events(user_id, fields))
+
+            for event in events:
+                event.version = 1
+                self.event_store.save_event(event)
+            cursor.executemany(
+                """
+                UPDATE user_import_rows SET status = 'done', user_id = ?
+                WHERE import_id = ? AND row_number = ?
+            """,
+                [
+                    (user_id, self.import_id, row_number)
+                    for user_id, row_number in created
+                ],
+            )
+            self._fail(cursor, failed)
+            cursor.execute(
+                """
+                UPDATE user_imports
+                SET rows_imported = rows_imported + ?, updated_at = ?
+                WHERE import_id = ?
+            """,
+                (len(created), datetime.now().isoformat(), self.import_id),
+            )
+
+        for event in events:
+            self.event_bus.publish(event)
+
+    def _creation_events(self, user_id: int, fields: dict) -> list:
+        events = [UserCreatedEvent(user_id, fields)]
+        if fields.get("hire_date"):
+            events.append(
+                UserHiredEvent(
+                    user_id,
+                    fields["hire_date"],
+                    fields.get("position"),
+                    fields.get("department"),
+                    fields.get("salary", 0.0),
+                )
+            )
+        return events
+
+    def _taken_emails(self, cursor, emails: list) -> set:
+        taken = set()
+        for chunk in _chunks(emails):
+            cursor.execute(
+                f"""
+                SELECT email FROM users
+                WHERE email IN ({", ".join("?" * len(chunk))})
+            """,
+                chunk,
+            )
+            taken.update(row["email"] for row in cursor.fetchall())
+        return taken
+
+    def _resolved_managers(self, cursor, rows) -> dict:
+        """Id externo (ou user:<id> de usuário existente) -> id do usuário gestor"""
+        refs = {row["manager_ref"] for row in rows if row["manager_ref"] is not None}
+        existing = self._existing_managers(refs)
+        managers = {ref: _existing_user_id(ref) for ref in existing}
+        in_file = list(refs - existing)
+        for chunk in _chunks(in_file):
+            cursor.execute(
+                f"""
+                SELECT external_id, user_id FROM user_import_rows
+                WHERE import_id = ? AND external_id IN ({", ".join("?" * len(chunk))})
+            """,
+                (self.import_id, *chunk),
+            )
+            for row in cursor.fetchall():
+                if row["user_id"] is not None:
+                    managers[row["external_id"]] = row["user_id"]
+        return managers
+
+    def _fail(self, cursor, failures: List[Tuple[int, str]]):
+        cursor.executemany(
+            """
+            UPDATE user_import_rows SET status = 'failed'
+            WHERE import_id = ? AND row_number = ?
+        """,
+            [(self.import_id, row_number) for row_number, _ in failures],
+        )
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO user_import_errors (import_id, row_number, message)
+            VALUES (?, ?, ?)
+        """,
+            [(self.import_id, row_number, message) for row_number, message in failures],
+        )
+        cursor.execute(
+            """
+            UPDATE user_imports SET rows_failed = rows_failed + ?, updated_at = ?
+            WHERE import_id = ?
+        """,
+            (len(failures), datetime.now().isoformat(), self.import_id),
+        )
@@ -1,27 +1,109 @@
-from typing import List, Callable
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Protocol, Tuple, Union
 from domain.events import DomainEvent, EventType
 
+Handler = Callable[[DomainEvent], None]
+
+
+class EventTransport(Protocol):
+    """Leva os eventos publicados a consumidores fora deste processo"""
+
+    def publish(self, event: DomainEvent) -> None: ...
+
+
+def compile_topic(topic: Union[EventType, str]):
+    """Compila um tópico em regex sobre os valores pontuados de EventType
+
+    "*" casa exatamente um segmento e "#" casa zero ou mais segmentos, como em
+    "user.*.changed" ou "user.#". Um EventType (ou valor sem curingas) casa só
+    consigo mesmo.
+    """
+    topic = getattr(topic, "value", topic)
+    parts = []
+    for segment in topic.split("."):
+        if segment == "#":
+            parts.append(r"(?:[^.]+(?:\.[^.]+)*)?")
+        elif segment == "*":
+            parts.append(r"[^.]+")
+        elif "*" in segment or "#" in segment:
+            raise ValueError(f"Wildcards must be whole segments: {topic!r}")
+        else:
+            parts.append(re.escape(segment))
+    pattern = r"\.".join(parts)
+    # "#" casando zero segmentos não deixa um ponto sobrando: "user.#" casa "user"
+    pattern = pattern.replace(r"\.(?:[^.]+(?:\.[^.]+)*)?", r"(?:\.[^.]+)*")
+    pattern = pattern.replace(r"(?:[^.]+(?:\.[^.]+)*)?\.", r"(?:[^.]+\.)*")
+    return re.compile(pattern + "$")
+
 
 class EventBus:
-    """Event Bus para publicar e assinar eventos"""
+    """Event Bus para publicar e assinar eventos
+
+    As assinaturas (tipos exatos ou tópicos com curingas) são compiladas em uma
+    tabela EventType -> tupla de handlers sempre que mudam; publish faz uma
+    única consulta nessa tabela, sem casar padrões. Com um transporte
+    configurado, cada evento também é repassado a ele, antes dos handlers locais.
+    """
 
     def __init__(self):
-        self._subscribers = {}
+        self._subscriptions: List[Tuple[re.Pattern, Handler]] = []
+        self._dispatch: Dict[EventType, Tuple[Handler, ...]] = {}
+        self._subscribe_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._transport: Optional[EventTransport] = None
+
+    def set_transport(self, transport: Optional[EventTransport]):
+        """Define o transporte para consumidores em outros processos (None desliga)"""
+        self._transport = transport
+
+    @property
+    def pending(self) -> int:
+        """Eventos sendo entregues aos handlers neste momento (todas as threads)"""
+        return self._pending
+
+    def subscribe(self, topic: Union[EventType, str], handler: Handler):
+        """Registra um handler para um tipo de evento ou um tópico ("user.*.changed", "user.#")"""
+        pattern = compile_topic(topic)
+        with self._subscribe_lock:
+            self._subscriptions.append((pattern, handler))
+            self._dispatch = self._compile()
+
+    def handlers_for(self, event_type: EventType) -> Tuple[Handler, ...]:
+        return self._dispatch.get(event_type, ())
 
-    def subscribe(self, event_type: EventType, handler: Callable[[DomainEvent], None]):
-        """Registra um handler para um tipo de evento"""
-        if event_type not in self._subscribers:
-            self._subscribers[event_type] = []
-        self._subscribers[event_type].append(handler)
+    def _compile(self) -> Dict[EventType, Tuple[Handler, ...]]:
+        """Handlers de cada EventType, na ordem em que foram assinados"""
+        dispatch = {}
+        for event_type in EventType:
+            handlers = tuple(
+                handler
+                for pattern, handler in self._subscriptions
+                if pattern.match(event_type.value)
+            )
+            if handlers:
+                dispatch[event_type] = handlers
+        return dispatch
 
     def publish(self, event: DomainEvent):
         """Publica um evento para todos os handlers registrados"""
-        if event.event_type in self._subscribers:
-            for handler in self._subscribers[event.event_type]:
+        if self._transport is not None:
+            self._transport.publish(event)
+        handlers = self._dispatch.get(event.event_type)
+        if not handlers:
+            return
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            for handler in handlers:
                 try:
                     handler(event)
                 except Exception as e:
                     print(f"Error handling event {event.event_type}: {str(e)}")
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
 
 
 _event_bus = EventBus()
@@ -0,0 +1,264 @@
+import errno
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from domain.events import DomainEvent, EventType
+from infrastructure.db.database import get_db_connection
+from infrastructure.event_bus import EventBus
+
+# "local" (handlers no próprio processo) ou "sqlite" (consumer groups lendo a
+# tabela events, ver event_consumer.py)
+EVENT_BUS_TRANSPORT = os.environ.get("EVENT_BUS_TRANSPORT", "local")
+# diretório dos sockets Unix usados para acordar os consumidores
+EVENT_NOTIFY_DIR = os.environ.get(
+    "EVENT_NOTIFY_DIR", os.path.join(tempfile.gettempdir(), "rh-eda-events")
+)
+CONSUMER_BATCH_SIZE = int(os.environ.get("CONSUMER_BATCH_SIZE", 200))
+# sem notificação, o consumidor consulta o banco a cada intervalo destes (s)
+CONSUMER_POLL_INTERVAL = float(os.environ.get("CONSUMER_POLL_INTERVAL", 1.0))
+# um consumidor que não renova a lease nesse tempo (s) é substituído
+CONSUMER_LEASE_SECONDS = float(os.environ.get("CONSUMER_LEASE_SECONDS", 15))
+# onde um consumer group novo começa: "latest" (eventos futuros) ou "earliest"
+CONSUMER_START = os.environ.get("CONSUMER_START", "latest")
+# espera máxima (s) entre tentativas depois de erros seguidos em um lote
+CONSUMER_MAX_BACKOFF = float(os.environ.get("CONSUMER_MAX_BACKOFF", 30))
+
+SOCKET_SUFFIX = ".sock"
+
+
+class SocketNotifier:
+    """Transporte do lado de quem publica: acorda os consumidores de outros processos
+
+    Os eventos já estão gravados na tabela events quando são publicados; basta
+    mandar um datagrama a cada socket de consumidor. A notificação é só uma
+    dica: se ela se perder, o consumidor encontra o evento no próximo poll.
+    """
+
+    def __init__(self, notify_dir: str = EVENT_NOTIFY_DIR, refresh_interval: float = 1.0):
+        self.notify_dir = notify_dir
+        self.refresh_interval = refresh_interval
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._targets: List[str] = []
+        self._refreshed_at = 0.0
+
+    def _consumers(self) -> List[str]:
+        now = time.monotonic()
+        if now - self._refreshed_at > self.refresh_interval:
+            try:
+                names = os.listdir(self.notify_dir)
+            except FileNotFoundError:
+                names = []
+            self._targets = [
+                os.path.join(self.notify_dir, name)
+                for name in names
+                if name.endswith(SOCKET_SUFFIX)
+            ]
+            self._refreshed_at = now
+        return self._targets
+
+    def publish(self, event: DomainEvent):
+        for path in self._consumers():
+            try:
+                self._sock.sendto(b".", path)
+            except OSError as e:
+                # consumidor ocupado (fila cheia) ou que já saiu
+                if e.errno not in (errno.EAGAIN, errno.ECONNREFUSED, errno.ENOENT):
+                    raise
+
+
+class SqliteEventConsumer:
+    """Consumer group que entrega os eventos da tabela events aos seus handlers
+
+    A posição do grupo fica em consumer_offsets. Só um processo por grupo
+    consome de cada vez: ele detém uma lease que renova a cada lote, e o
+    offset só avança com um UPDATE condicionado ao dono e ao offset lido
+    (compare-and-swap). Outros processos do mesmo grupo ficam em espera e
+    assumem quando a lease expira. A entrega é at-least-once: um lote
+    interrompido antes do commit é entregue de novo.
+    """
+
+    def __init__(
+        self,
+        group: str,
+        event_bus: EventBus,
+        batch_size: int = CONSUMER_BATCH_SIZE,
+        poll_interval: float = CONSUMER_POLL_INTERVAL,
+        lease_seconds: float = CONSUMER_LEASE_SECONDS,
+        notify_dir: str = EVENT_NOTIFY_DIR,
+    ):
+        self.group = group
+        self.event_bus = event_bus
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.notify_dir = notify_dir
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._sock = None
+
+    def _claim(self) -> Optional[int]:
+        """Obtém ou renova a lease do grupo; retorna o offset atual ou None"""
+        now = time.time()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if CONSUMER_START == "latest":
+                start = "(SELECT COALESCE(MAX(id), 0) FROM events)"
+            else:
+                start = "0"
+            cursor.execute(
+                f"""
+                INSERT OR IGNORE INTO consumer_offsets (consumer_group, last_event_id)
+                VALUES (?, {start})
+            """,
+                (self.group,),
+            )
+            cursor.execute(
+                """
+                UPDATE consumer_offsets SET owner = ?, lease_until = ?
+                WHERE consumer_group = ?
+                  AND (owner = ? OR owner IS NULL OR lease_until < ?)
+            """,
+                (self.owner, now + self.lease_seconds, self.group, self.owner, now),
+            )
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute(
+                "SELECT last_event_id FROM consumer_offsets WHERE consumer_group = ?",
+                (self.group,),
+            )
+            return cursor.fetchone()["last_event_id"]
+
+    def _fetch(self, offset: int) -> list:
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, event_type, aggregate_id, data, occurred_at, version
+                FROM events
+                WHERE id > ?
+                ORDER BY id ASC
+                LIMIT ?
+            """,
+                (offset, self.batch_size),
+            )
+            return cursor.fetchall()
+
+    def _commit(self, offset: int, new_offset: int) -> bool:
+        """Avança o offset se o grupo ainda é deste processo e ninguém o moveu"""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE consumer_offsets
+                SET last_event_id = ?, lease_until = ?, updated_at = ?
+                WHERE consumer_group = ? AND owner = ? AND last_event_id = ?
+            """,
+                (
+                    new_offset,
+                    time.time() + self.lease_seconds,
+                    datetime.now().isoformat(),
+                    self.group,
+                    self.owner,
+                    offset,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def poll_once(self) -> int:
+        """Entrega um lote ao EventBus do grupo; retorna quantos eventos foram lidos"""
+        offset = self._claim()
+        if offset is None:
+            return 0
+        rows = self._fetch(offset)
+        if not rows:
+            return 0
+        for row in rows:
+            self.event_bus.publish(self._row_to_event(row))
+        if not self._commit(offset, rows[-1]["id"]):
+            # a lease expirou durante o lote e outro processo assumiu
+            return 0
+        return len(rows)
+
+    def run(self, stop: threading.Event):
+        """Consome até stop ser sinalizado, acordando a cada notificação ou poll
+
+        Um erro no lote (handler, "database is locked"...) não encerra o grupo:
+        ele é registrado e o lote é tentado de novo após uma espera que dobra a
+        cada falha seguida, até CONSUMER_MAX_BACKOFF. O offset não avançou,
+        então os eventos do lote são entregues outra vez.
+        """
+        self._open_socket()
+        backoff = self.poll_interval
+        try:
+            while not stop.is_set():
+                try:
+                    read = self.poll_once()
+                except Exception as e:
+                    print(f"Error consuming events for {self.group}: {str(e)}")
+                    stop.wait(backoff)
+                    backoff = min(backoff * 2, CONSUMER_MAX_BACKOFF)
+                    continue
+                backoff = self.poll_interval
+                if read == self.batch_size:
+                    continue  # ainda há atraso: segue sem esperar
+                self._wait()
+        finally:
+            self._close_socket()
+
+    def release(self):
+        """Devolve a lease para que outro processo assuma o grupo imediatamente"""
+        with get_db_connection() as conn:
+            conn.execute(
+                """
+                UPDATE consumer_offsets SET owner = NULL, lease_until = NULL
+                WHERE consumer_group = ? AND owner = ?
+            """,
+                (self.group, self.owner),
+            )
+
+    def _open_socket(self):
+        os.makedirs(self.notify_dir, exist_ok=True)
+        path = os.path.join(
+            self.notify_dir, f"{self.group}-{os.getpid()}-{id(self)}{SOCKET_SUFFIX}"
+        )
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(path)
+        self._sock.settimeout(self.poll_interval)
+        self._sock_path = path
+
+    def _close_socket(self):
+        self._sock.close()
+        try:
+            os.unlink(self._sock_path)
+        except FileNotFoundError:
+            pass
+
+    def _wait(self):
+        """Bloqueia até uma notificação (ou o intervalo de poll) e descarta as demais"""
+        try:
+            self._sock.recv(64)
+        except socket.timeout:
+            return
+        # várias notificações acumuladas viram uma única leitura do banco
+        self._sock.setblocking(False)
+        try:
+            while True:
+                self._sock.recv(64)
+        except BlockingIOError:
+            pass
+        finally:
+            self._sock.settimeout(self.poll_interval)
+
+    def _row_to_event(self, row) -> DomainEvent:
+        event = DomainEvent.from_json(
+            EventType(row["event_type"]), row["aggregate_id"], row["data"]
+        )
+        event.event_id = row["id"]
+        event.occurred_at = row["occurred_at"]
+        event.version = row["version"]
+        return event
@@ -0,0 +1,529 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from domain.events import (
+    ACTOR_FIELDS,
+    QUERY_EVENT_TYPES,
+    DomainEvent,
+    UserCreatedEvent,
+    UserUpdatedEvent,
+)
+from domain.exceptions import ConcurrencyError
+from domain.user import USER_FIELDS, User
+
+# tamanho, crc32, id, aggregate_id, version (-1 = nenhuma), len(type), len(occurred_at)
+RECORD_HEADER = struct.Struct("<IIQqqHH")
+# o crc cobre tudo o que vem depois dele
+CRC_OFFSET = 8
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MAX_BYTES = int(os.environ.get("EVENT_LOG_SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+# pausa (s) antes de cada fsync para agrupar mais escritores no mesmo commit
+GROUP_COMMIT_INTERVAL = float(os.environ.get("EVENT_LOG_GROUP_COMMIT_INTERVAL", 0))
+# "0" devolve o append antes do fsync (equivale ao synchronous=NORMAL do SQLite)
+EVENT_LOG_WAIT_FSYNC = os.environ.get("EVENT_LOG_WAIT_FSYNC", "1") == "1"
+# a cada quantos eventos uma entrada é gravada no índice esparso por id
+ID_INDEX_STRIDE = 64
+
+_QUERY_TYPE_VALUES = frozenset(event_type.value for event_type in QUERY_EVENT_TYPES)
+
+
+def encode_record(row: dict) -> bytes:
+    """Serializa um evento no formato de registro do log"""
+    event_type = row["event_type"].encode("utf-8")
+    occurred_at = row["occurred_at"].encode("utf-8")
+    data = row["data"].encode("utf-8")
+    version = row["version"] if row["version"] is not None else -1
+    size = RECORD_HEADER.size + len(event_type) + len(occurred_at) + len(data)
+    body = (
+        RECORD_HEADER.pack(
+            size, 0, row["id"], row["aggregate_id"], version,
+            len(event_type), len(occurred_at),
+        )[CRC_OFFSET:]
+        + event_type
+        + occurred_at
+        + data
+    )
+    return struct.pack("<II", size, zlib.crc32(body)) + body
+
+
+def decode_record(buffer: memoryview, offset: int) -> Optional[Tuple[dict, int]]:
+    """Lê o registro em offset; retorna (linha, próximo offset) ou None se inválido
+
+    buffer é uma memoryview do mmap: o CRC e a decodificação das strings
+    trabalham direto sobre as páginas mapeadas, sem cópias intermediárias.
+    """
+    if offset + RECORD_HEADER.size > len(buffer):
+        return None
+    size, crc, event_id, aggregate_id, version, type_len, occurred_len = (
+        RECORD_HEADER.unpack_from(buffer, offset)
+    )
+    end = offset + size
+    if size < RECORD_HEADER.size or end > len(buffer):
+        return None
+    if zlib.crc32(buffer[offset + CRC_OFFSET : end]) != crc:
+        return None
+
+    position = offset + RECORD_HEADER.size
+    occurred = position + type_len
+    data = occurred + occurred_len
+    row = {
+        "id": event_id,
+        "event_type": str(buffer[position:occurred], "utf-8"),
+        "aggregate_id": aggregate_id,
+        "data": str(buffer[data:end], "utf-8"),
+        "occurred_at": str(buffer[occurred:data], "utf-8"),
+        "version": None if version == -1 else version,
+    }
+    return row, end
+
+
+class Segment:
+    def __init__(self, path: str, first_id: int):
+        self.path = path
+        self.first_id = first_id
+        self.size = 0
+        self._view = None
+        self._mapped_size = 0
+        self._map_lock = threading.Lock()
+
+    def view(self) -> memoryview:
+        """memoryview de um mmap somente leitura, remapeado quando o segmento cresce
+
+        O mapa antigo não é fechado aqui: leitores em andamento ainda podem
+        estar usando-o, e ele é liberado quando a última referência cai.
+        """
+        with self._map_lock:
+            size = self.size
+            if self._mapped_size != size:
+                with open(self.path, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                self._view = memoryview(mapped)
+                self._mapped_size = size
+            return self._view
+
+    def close(self):
+        with self._map_lock:
+            self._view = None
+            self._mapped_size = 0
+
+
+class SegmentedEventStore:
+    """EventStore em arquivos de segmento append-only
+
+    Cada evento é um registro com tamanho e CRC32. Os segmentos rolam ao
+    passar de SEGMENT_MAX_BYTES. Escritores concorrentes compartilham o mesmo
+    fsync (group commit); com wait_for_fsync=False o append retorna antes do
+    fsync, que continua sendo feito em segundo plano. As leituras usam mmap e
+    índices em memória: offsets por aggregate_id e um índice esparso por id
+    de evento. Os índices são reconstruídos na abertura varrendo os
+    segmentos; um registro final truncado ou corrompido (crash no meio da
+    escrita) é descartado.
+
+    Um único processo pode usar o diretório: ids e índices vivem nele, e o
+    thread de fsync não sobrevive a um fork. Abra o store depois do fork.
+
+    O log não participa da transação do repositório de usuários: dentro de
+    transaction() os appends ficam pendentes e só são gravados depois do
+    commit dela (ver reconcile para um crash entre os dois).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = SEGMENT_MAX_BYTES,
+        wait_for_fsync: bool = EVENT_LOG_WAIT_FSYNC,
+    ):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.wait_for_fsync = wait_for_fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # serializa as transações: o log recebe os eventos na ordem dos commits
+        self._tx_lock = threading.RLock()
+        # appends pendentes da transação aberta pelo thread
+        self._tx = threading.local()
+        self._commit = threading.Condition(threading.Lock())
+        self._written_seq = 0
+        self._durable_seq = 0
+        self._closed = False
+        self._pid = os.getpid()
+
+        self.segments: List[Segment] = []
+        self.last_id = 0
+        self._by_aggregate: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        self._id_index: List[Tuple[int, int, int]] = []
+        self._aggregate_version: Dict[int, int] = {}
+        self._watermarks: Dict[int, Tuple[int, str]] = {}
+        self._state_watermark = 0
+
+        self._open_segments()
+        self._file = open(self.segments[-1].path, "ab")
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="event-log-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    # -- abertura / recuperação --------------------------------------------
+
+    def _open_segments(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "*" + SEGMENT_SUFFIX)))
+        for path in paths:
+            first_id = int(os.path.basename(path)[: -len(SEGMENT_SUFFIX)])
+            segment = Segment(path, first_id)
+            segment.size = os.path.getsize(path)
+            self.segments.append(segment)
+            valid_size = self._index_segment(len(self.segments) - 1)
+            if valid_size != segment.size:
+                segment.close()
+                with open(path, "r+b") as f:
+                    f.truncate(valid_size)
+                segment.size = valid_size
+        if not self.segments:
+            self._new_segment()
+
+    def _index_segment(self, segment_index: int) -> int:
+        segment = self.segments[segment_index]
+        if segment.size == 0:
+            return 0
+        buffer = segment.view()
+        offset = 0
+        while True:
+            decoded = decode_record(buffer, offset)
+            if decoded is None:
+                return offset
+            row, next_offset = decoded
+            self._index(row, segment_index, offset)
+            offset = next_offset
+
+    def _new_segment(self):
+        path = os.path.join(
+            self.directory, f"{self.last_id + 1:020d}{SEGMENT_SUFFIX}"
+        )
+        open(path, "ab").close()
+        self.segments.append(Segment(path, self.last_id + 1))
+
+    def _index(self, row: dict, segment_index: int, offset: int):
+        self.last_id = row["id"]
+        aggregate_id = row["aggregate_id"]
+        self._by_aggregate[aggregate_id].append((segment_index, offset))
+        if row["id"] % ID_INDEX_STRIDE == 1:
+            self._id_index.append((row["id"], segment_index, offset))
+        if row["version"] is not None:
+            self._aggregate_version[aggregate_id] = row["version"]
+        if row["event_type"] not in _QUERY_TYPE_VALUES:
+            self._watermarks[aggregate_id] = (row["id"], row["occurred_at"])
+            self._state_watermark = row["id"]
+
+    # -- escrita --------------------------------------------------------------
+
+    def _append_rows(self, rows: List[dict]) -> int:
+        """Grava os registros (sem fsync) e retorna a sequência a aguardar"""
+        if os.getpid() != self._pid:
+            # sem o flusher (que ficou no processo pai) o append esperaria para sempre
+            raise RuntimeError(
+                "SegmentedEventStore was opened in another process; "
+                "open it after the fork"
+            )
+        with self._lock:
+            for row in rows:
+                segment = self.segments[-1]
+                if segment.size >= self.segment_max_bytes:
+                    self._file.close()
+                    self._new_segment()
+                    segment = self.segments[-1]
+                    self._file = open(segment.path, "ab")
+
+                row["id"] = self.last_id + 1
+                record = encode_record(row)
+                self._file.write(record)
+                offset = segment.size
+                segment.size += len(record)
+                self._index(row, len(self.segments) - 1, offset)
+            # visível para os leitores via mmap (page cache), ainda não durável
+            self._file.flush()
+            with self._commit:
+                self._written_seq += 1
+                self._commit.notify_all()
+                return self._written_seq
+
+    def _wait_durable(self, seq: int):
+        if not self.wait_for_fsync:
+            return
+        with self._commit:
+            while self._durable_seq < seq and not self._closed:
+                self._commit.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self._commit:
+                while self._durable_seq == self._written_seq and not self._closed:
+                    self._commit.wait()
+                if self._closed and self._durable_seq == self._written_seq:
+                    return
+            # agrupa os escritores que chegarem durante o intervalo
+            self._commit_pause()
+            with self._lock:
+                target = self._written_seq
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            with self._commit:
+                self._durable_seq = target
+                self._commit.notify_all()
+
+    def _commit_pause(self):
+        if GROUP_COMMIT_INTERVAL > 0:
+            threading.Event().wait(GROUP_COMMIT_INTERVAL)
+
+    def _row_from_event(self, event: DomainEvent) -> dict:
+        return {
+            "event_type": event.event_type.value,
+            "aggregate_id": event.aggregate_id,
+            "data": json.dumps(event.data),
+            "occurred_at": event.occurred_at,
+            "version": event.version,
+        }
+
+    @contextmanager
+    def transaction(self, repository_transaction):
+        """Envolve a transação do repositório; o log recebe os eventos após o commit
+
+        Os appends do bloco ficam pendentes: com o commit eles são gravados
+        (e os ids atribuídos) antes de o bloco terminar, e num rollback são
+        descartados. Enquanto isso nada muda no log, nem o watermark.
+        """
+        if getattr(self._tx, "pending", None) is not None:
+            with repository_transaction:
+                yield
+            return
+        self._tx_lock.acquire()
+        try:
+            self._tx.pending, self._tx.versions = [], {}
+            try:
+                with repository_transaction:
+                    yield
+                pending = self._tx.pending
+            finally:
+                self._tx.pending = self._tx.versions = None
+            if not pending:
+                return
+            rows = [row for _, row in pending]
+            seq = self._append_rows(rows)
+        finally:
+            self._tx_lock.release()
+        # o fsync é esperado fora do lock, para que transações seguintes o dividam
+        self._wait_durable(seq)
+        for event, row in pending:
+            event.event_id = row["id"]
+
+    def save_event(self, event: DomainEvent) -> int:
+        """Grava um evento e aguarda o fsync do grupo
+
+        Dentro de transaction() o evento fica pendente e o id só é atribuído
+        no commit.
+        """
+        row = self._row_from_event(event)
+        pending = getattr(self._tx, "pending", None)
+        if pending is not None:
+            pending.append((event, row))
+            return None
+        self._wait_durable(self._append_rows([row]))
+        event.event_id = row["id"]
+        return event.event_id
+
+    def append_events(
+        self, aggregate_id: int, events: List[DomainEvent], expected_version: int
+    ) -> int:
+        """Grava os eventos como a versão expected_version + 1 do agregado"""
+        pending = getattr(self._tx, "pending", None)
+        versions = self._tx.versions if pending is not None else {}
+        with self._lock:
+            current_version = versions.get(
+                aggregate_id, self._aggregate_version.get(aggregate_id)
+            )
+            if current_version is not None and current_version != expected_version:
+                raise ConcurrencyError(aggregate_id, expected_version, current_version)
+
+            new_version = expected_version + 1
+            rows = []
+            for event in events:
+                event.version = new_version
+                rows.append(self._row_from_event(event))
+            if pending is not None:
+                pending.extend(zip(events, rows))
+                versions[aggregate_id] = new_version
+                return new_version
+            seq = self._append_rows(rows)
+
+        self._wait_durable(seq)
+        for event, row in zip(events, rows):
+            event.event_id = row["id"]
+        return new_version
+
+    def reconcile(self, users: Iterable[User]) -> int:
+        """Alcança no log os usuários que estão à frente dele; retorna quantos
+
+        Um crash entre o commit do repositório e a gravação do log deixa o log
+        para trás. Cada usuário nessa situação ganha um user.created (se o log
+        não o conhece) ou um user.updated com todos os campos, na versão do
+        repositório. Roda na abertura, antes de qualquer escrita.
+        """
+        events = []
+        with self._tx_lock:
+            for user in users:
+                with self._lock:
+                    logged = self._aggregate_version.get(user.id)
+                if logged is not None and logged >= user.version:
+                    continue
+                fields = {field: getattr(user, field) for field in USER_FIELDS}
+                if logged is None and user.id not in self._by_aggregate:
+                    event = UserCreatedEvent(user.id, fields)
+                else:
+                    event = UserUpdatedEvent(user.id, fields, logged)
+                event.version = user.version
+                events.append(event)
+            if not events:
+                return 0
+            rows = [self._row_from_event(event) for event in events]
+            seq = self._append_rows(rows)
+        self._wait_durable(seq)
+        for event, row in zip(events, rows):
+            event.event_id = row["id"]
+        return len(events)
+
+    # -- leitura --------------------------------------------------------------
+
+    def _read(self, segment_index: int, offset: int) -> dict:
+        decoded = decode_record(self.segments[segment_index].view(), offset)
+        return decoded[0]
+
+    def iter_raw_events_by_aggregate(
+        self, aggregate_id: int, batch_size: int = 500
+    ) -> Iterator[dict]:
+        """Itera os eventos de um agregado lendo direto do mmap"""
+        with self._lock:
+            positions = list(self._by_aggregate.get(aggregate_id, ()))
+        for segment_index, offset in positions:
+            yield self._read(segment_index, offset)
+
+    def get_recent_raw_events(
+        self, aggregate_id: int, limit: int, before: Optional[int] = None
+    ) -> List[dict]:
+        """Até limit eventos do agregado com id < before, do fim para o início"""
+        with self._lock:
+            positions = list(self._by_aggregate.get(aggregate_id, ()))
+        rows = []
+        for segment_index, offset in reversed(positions):
+            if len(rows) >= limit:
+                break
+            row = self._read(segment_index, offset)
+            if before is None or row["id"] < before:
+                rows.append(row)
+        rows.reverse()
+        return rows
+
+    def get_events_by_aggregate(self, aggregate_id: int) -> List[DomainEvent]:
+        """Busca todos os eventos de um agregado específico"""
+        return [
+            self._row_to_event(row)
+            for row in self.iter_raw_events_by_aggregate(aggregate_id)
+        ]
+
+    def get_events_by_type(self, event_type: str) -> List[DomainEvent]:
+        """Busca todos os eventos de um tipo específico (varredura sequencial)"""
+        return [
+            self._row_to_event(row)
+            for row in self.replay()
+            if row["event_type"] == event_type
+        ]
+
+    def query_events(
+        self,
+        event_types: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        actor: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 100,
+    ) -> List[dict]:
+        """Busca eventos por tipo, intervalo [since, until) e autor, ordenados por
+        (occurred_at, id), a partir do keyset after (varredura sequencial)"""
+        matches = []
+        for row in self.replay():
+            if event_types and row["event_type"] not in event_types:
+                continue
+            if since and row["occurred_at"] < since:
+                continue
+            if until and row["occurred_at"] >= until:
+                continue
+            if after and (row["occurred_at"], row["id"]) <= tuple(after):
+                continue
+            if actor is not None:
+                data = json.loads(row["data"]) or {}
+                row_actor = next(
+                    (data[f] for f in ACTOR_FIELDS if data.get(f) is not None), None
+                )
+                if row_actor != actor:
+                    continue
+            matches.append(row)
+        matches.sort(key=lambda row: (row["occurred_at"], row["id"]))
+        return matches[:limit]
+
+    def get_event(self, event_id: int) -> Optional[dict]:
+        """Busca um evento pelo id usando o índice esparso"""
+        with self._lock:
+            if event_id < 1 or event_id > self.last_id:
+                return None
+            entry = self._id_index[(event_id - 1) // ID_INDEX_STRIDE]
+        for row in self.replay(*entry[1:]):
+            if row["id"] == event_id:
+                return row
+        return None
+
+    def get_aggregate_watermark(self, aggregate_id: int) -> Optional[Tuple[int, str]]:
+        """Retorna (id, occurred_at) do último evento que alterou o agregado"""
+        return self._watermarks.get(aggregate_id)
+
+    def get_state_watermark(self) -> int:
+        """Id do último evento que alterou algum agregado (0 se não há nenhum)"""
+        return self._state_watermark
+
+    def replay(self, segment_index: int = 0, offset: int = 0) -> Iterator[dict]:
+        """Varre sequencialmente o log a partir de (segmento, offset)"""
+        with self._lock:
+            sizes = [segment.size for segment in self.segments]
+        for index in range(segment_index, len(sizes)):
+            if sizes[index] == 0:
+                continue
+            buffer = self.segments[index].view()
+            position = offset if index == segment_index else 0
+            while position < sizes[index]:
+                row, position = decode_record(buffer, position)
+                yield row
+
+    def close(self):
+        """Aguarda o último fsync e fecha os arquivos"""
+        with self._commit:
+            self._closed = True
+            self._commit.notify_all()
+        self._flusher.join()
+        with self._lock:
+            self._file.close()
+            for segment in self.segments:
+                segment.close()
+
+    def _row_to_event(self, row: dict) -> DomainEvent:
+        event = DomainEvent.from_json(
+            row["event_type"], row["aggregate_id"], row["data"]
+        )
+        event.event_id = row["id"]
+        event.occurred_at = row["occurred_at"]
+        event.version = row["version"]
+        return event
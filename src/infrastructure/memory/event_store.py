@@ -0,0 +1,156 @@
+import json
+from typing import Iterator, List, Optional, Tuple
+from domain.events import ACTOR_FIELDS, DomainEvent, QUERY_EVENT_TYPES
+from domain.exceptions import ConcurrencyError
+from infrastructure.memory.storage import MemoryStorage
+
+_QUERY_TYPE_VALUES = frozenset(event_type.value for event_type in QUERY_EVENT_TYPES)
+
+
+class InMemoryEventStore:
+    """EventStore sobre um log append-only em memória (mesma interface do SQLite)
+
+    As leituras pegam o lock do storage: não veem eventos de uma transação
+    aberta, que ainda pode sofrer rollback.
+    """
+
+    def __init__(self, storage: MemoryStorage):
+        self.storage = storage
+
+    def transaction(self, repository_transaction):
+        """Os eventos já entram na transação do MemoryStorage do repositório"""
+        return repository_transaction
+
+    def save_event(self, event: DomainEvent) -> int:
+        """Salva um evento no log"""
+        row = {
+            "event_type": event.event_type.value,
+            "aggregate_id": event.aggregate_id,
+            "data": json.dumps(event.data),
+            "occurred_at": event.occurred_at,
+            "version": event.version,
+            "actor": event.actor,
+        }
+        self.storage.append_event(row)
+        event.event_id = row["id"]
+        return event.event_id
+
+    def append_events(
+        self, aggregate_id: int, events: List[DomainEvent], expected_version: int
+    ) -> int:
+        """Salva os eventos como a versão expected_version + 1 do agregado"""
+        with self.storage.transaction():
+            current_version = None
+            for position in reversed(self.storage.events_by_aggregate[aggregate_id]):
+                current_version = self.storage.events[position]["version"]
+                if current_version is not None:
+                    break
+            if current_version is not None and current_version != expected_version:
+                raise ConcurrencyError(aggregate_id, expected_version, current_version)
+
+            new_version = expected_version + 1
+            for event in events:
+                event.version = new_version
+                self.save_event(event)
+            return new_version
+
+    def get_events_by_aggregate(self, aggregate_id: int) -> List[DomainEvent]:
+        """Busca todos os eventos de um agregado específico"""
+        return [self._row_to_event(row) for row in self._rows_by(aggregate_id)]
+
+    def iter_raw_events_by_aggregate(
+        self, aggregate_id: int, batch_size: int = 500
+    ) -> Iterator[dict]:
+        """Itera os eventos de um agregado sem decodificar data"""
+        yield from self._rows_by(aggregate_id)
+
+    def get_recent_raw_events(
+        self, aggregate_id: int, limit: int, before: Optional[int] = None
+    ) -> List[dict]:
+        """Até limit eventos do agregado com id < before, em ordem de id"""
+        rows = [
+            row
+            for row in self._rows_by(aggregate_id)
+            if before is None or row["id"] < before
+        ]
+        return rows[-limit:]
+
+    def get_events_by_type(self, event_type: str) -> List[DomainEvent]:
+        """Busca todos os eventos de um tipo específico"""
+        with self.storage.lock:
+            positions = self.storage.events_by_type.get(event_type, ())
+            rows = [self.storage.events[p] for p in positions]
+        return [self._row_to_event(row) for row in rows]
+
+    def query_events(
+        self,
+        event_types: Optional[List[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        actor: Optional[int] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 100,
+    ) -> List[dict]:
+        """Busca eventos por tipo, intervalo [since, until) e autor, ordenados por
+        (occurred_at, id), a partir do keyset after"""
+        with self.storage.lock:
+            if event_types:
+                rows = [
+                    self.storage.events[position]
+                    for event_type in event_types
+                    for position in self.storage.events_by_type.get(event_type, ())
+                ]
+            else:
+                rows = list(self.storage.events)
+        matches = [
+            row
+            for row in rows
+            if (actor is None or _row_actor(row) == actor)
+            and (not since or row["occurred_at"] >= since)
+            and (not until or row["occurred_at"] < until)
+            and (not after or (row["occurred_at"], row["id"]) > tuple(after))
+        ]
+        matches.sort(key=lambda row: (row["occurred_at"], row["id"]))
+        return matches[:limit]
+
+    def get_aggregate_watermark(self, aggregate_id: int) -> Optional[Tuple[int, str]]:
+        """Retorna (id, occurred_at) do último evento que alterou o agregado"""
+        with self.storage.lock:
+            positions = self.storage.events_by_aggregate.get(aggregate_id, ())
+            for position in reversed(positions):
+                row = self.storage.events[position]
+                if row["event_type"] not in _QUERY_TYPE_VALUES:
+                    return row["id"], row["occurred_at"]
+        return None
+
+    def get_state_watermark(self) -> int:
+        """Id do último evento que alterou algum agregado (0 se não há nenhum)"""
+        watermark = 0
+        with self.storage.lock:
+            for event_type, positions in self.storage.events_by_type.items():
+                if positions and event_type not in _QUERY_TYPE_VALUES:
+                    row = self.storage.events[positions[-1]]
+                    watermark = max(watermark, row["id"])
+        return watermark
+
+    def _rows_by(self, aggregate_id: int) -> List[dict]:
+        with self.storage.lock:
+            positions = self.storage.events_by_aggregate.get(aggregate_id, ())
+            return [self.storage.events[p] for p in positions]
+
+    def _row_to_event(self, row: dict) -> DomainEvent:
+        event = DomainEvent.from_json(
+            row["event_type"], row["aggregate_id"], row["data"]
+        )
+        event.event_id = row["id"]
+        event.occurred_at = row["occurred_at"]
+        event.version = row["version"]
+        return event
+
+
+def _row_actor(row: dict) -> Optional[int]:
+    """Autor do evento; linhas gravadas antes da coluna actor são lidas do JSON"""
+    if "actor" in row:
+        return row["actor"]
+    data = json.loads(row["data"]) or {}
+    return next((data[f] for f in ACTOR_FIELDS if data.get(f) is not None), None)
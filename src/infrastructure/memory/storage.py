@@ -0,0 +1,243 @@
+import glob
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from domain.events import QUERY_EVENT_TYPES
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_PATTERN = "journal.{:06d}.log"
+
+_QUERY_TYPE_VALUES = frozenset(event_type.value for event_type in QUERY_EVENT_TYPES)
+
+
+class MemoryStorage:
+    """Estado em memória de users e events com persistência durável
+
+    Toda escrita é aplicada em memória e registrada em um journal append-only
+    (uma linha JSON por transação). Periodicamente o estado inteiro é gravado
+    em um snapshot e os journals anteriores a ele são descartados. Na
+    inicialização o snapshot é carregado e os journals seguintes reaplicados.
+
+    O estado pertence ao processo que o abriu: depois de um fork o filho não
+    pode usá-lo (deve abrir o seu), e só um processo pode usar o diretório.
+
+    Uma transação segura self.lock até o commit ou rollback: leitores que
+    pegam o lock nunca veem escritas ainda não confirmadas. Transações só com
+    eventos de consulta vão para o journal sem fsync (perdê-los num crash não
+    altera estado); o fsync da próxima escrita os torna duráveis também.
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, fsync: bool = True):
+        self.lock = threading.RLock()
+        self.data_dir = data_dir
+        self.fsync = fsync
+
+        self.users: Dict[int, dict] = {}
+        self.users_by_email: Dict[str, int] = {}
+        self.users_by_department: Dict[str, set] = defaultdict(set)
+        self.events: List[dict] = []
+        self.events_by_aggregate: Dict[int, List[int]] = defaultdict(list)
+        self.events_by_type: Dict[str, List[int]] = defaultdict(list)
+        self.next_user_id = 1
+        # não volta no rollback: um id de evento nunca é reutilizado
+        self.next_event_id = 1
+
+        self._pid = os.getpid()
+        self._tx = None
+        self._journal = None
+        self._journal_seq = 0
+        self._snapshot_thread = None
+        self._stop = threading.Event()
+
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            self._recover()
+            self._open_journal(self._journal_seq + 1)
+
+    # -- transações -------------------------------------------------------
+
+    @contextmanager
+    def transaction(self):
+        """Aplica as escritas do bloco atomicamente (tudo ou nada)"""
+        if os.getpid() != self._pid:
+            raise RuntimeError(
+                "MemoryStorage was opened in another process; open it after the fork"
+            )
+        with self.lock:
+            if self._tx is not None:
+                yield
+                return
+            self._tx = {"undo": [], "ops": []}
+            next_user_id = self.next_user_id
+            try:
+                yield
+            except BaseException:
+                for undo in reversed(self._tx["undo"]):
+                    undo()
+                self.next_user_id = next_user_id
+                raise
+            else:
+                if self._tx["ops"]:
+                    self._write_journal(
+                        self._tx["ops"], durable=not _only_queries(self._tx["ops"])
+                    )
+            finally:
+                self._tx = None
+
+    def put_user(self, row: dict):
+        """Insere ou substitui uma linha de users"""
+        with self.transaction():
+            previous = self.users.get(row["id"])
+            self._apply_user(row)
+            self._tx["undo"].append(lambda: self._restore_user(row["id"], previous))
+            self._tx["ops"].append(["user", row])
+
+    def append_event(self, row: dict):
+        """Acrescenta uma linha ao log de events, atribuindo seu id"""
+        with self.transaction():
+            row["id"] = self.next_event_id
+            self.next_event_id += 1
+            self._apply_event(row)
+            self._tx["undo"].append(self._pop_event)
+            self._tx["ops"].append(["event", row])
+
+    # -- índices ----------------------------------------------------------
+
+    def _apply_user(self, row: dict):
+        previous = self.users.get(row["id"])
+        if previous:
+            self._unindex_user(previous)
+        self.users[row["id"]] = row
+        self.users_by_email[row["email"]] = row["id"]
+        self.users_by_department[row.get("department")].add(row["id"])
+        self.next_user_id = max(self.next_user_id, row["id"] + 1)
+
+    def _unindex_user(self, row: dict):
+        self.users_by_email.pop(row["email"], None)
+        self.users_by_department[row.get("department")].discard(row["id"])
+
+    def _restore_user(self, user_id: int, previous: Optional[dict]):
+        self._unindex_user(self.users.pop(user_id))
+        if previous:
+            self._apply_user(previous)
+
+    def _apply_event(self, row: dict):
+        position = len(self.events)
+        self.events.append(row)
+        self.events_by_aggregate[row["aggregate_id"]].append(position)
+        self.events_by_type[row["event_type"]].append(position)
+        self.next_event_id = max(self.next_event_id, row["id"] + 1)
+
+    def _pop_event(self):
+        row = self.events.pop()
+        self.events_by_aggregate[row["aggregate_id"]].pop()
+        self.events_by_type[row["event_type"]].pop()
+
+    # -- persistência -----------------------------------------------------
+
+    def _journal_path(self, seq: int) -> str:
+        return os.path.join(self.data_dir, JOURNAL_PATTERN.format(seq))
+
+    def _open_journal(self, seq: int):
+        self._journal_seq = seq
+        self._journal = open(self._journal_path(seq), "a", encoding="utf-8")
+
+    def _write_journal(self, ops: list, durable: bool = True):
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps(ops) + "\n")
+        self._journal.flush()
+        if self.fsync and durable:
+            os.fsync(self._journal.fileno())
+
+    def _recover(self):
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        first_journal = 1
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            for row in snapshot["users"]:
+                self._apply_user(row)
+            for row in snapshot["events"]:
+                self._apply_event(row)
+            first_journal = snapshot["journal_seq"]
+
+        journals = sorted(glob.glob(os.path.join(self.data_dir, "journal.*.log")))
+        for path in journals:
+            seq = int(os.path.basename(path).split(".")[1])
+            if seq < first_journal:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ops = json.loads(line)
+                    except ValueError:
+                        # transação truncada por um crash no meio da escrita
+                        break
+                    for kind, row in ops:
+                        if kind == "user":
+                            self._apply_user(row)
+                        else:
+                            self._apply_event(row)
+            self._journal_seq = seq
+        self._journal_seq = max(self._journal_seq, first_journal - 1)
+
+    def snapshot(self):
+        """Grava o estado completo e descarta os journals já cobertos por ele"""
+        if not self.data_dir:
+            return
+        with self.lock:
+            # novas escritas vão para um journal novo; o snapshot cobre os antigos
+            users = list(self.users.values())
+            events = list(self.events)
+            old_journal = self._journal
+            self._open_journal(self._journal_seq + 1)
+            snapshot_seq = self._journal_seq
+        old_journal.close()
+
+        tmp_path = os.path.join(self.data_dir, SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"journal_seq": snapshot_seq, "users": users, "events": events}, f
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.data_dir, SNAPSHOT_FILE))
+
+        for path in glob.glob(os.path.join(self.data_dir, "journal.*.log")):
+            if int(os.path.basename(path).split(".")[1]) < snapshot_seq:
+                os.remove(path)
+
+    def start_snapshots(self, interval: float):
+        """Inicia um thread que grava snapshots a cada interval segundos"""
+        if self._snapshot_thread or not self.data_dir:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.snapshot()
+
+        self._snapshot_thread = threading.Thread(
+            target=loop, name="memory-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def close(self):
+        """Para os snapshots periódicos, grava um último e fecha o journal"""
+        self._stop.set()
+        if self._snapshot_thread:
+            self._snapshot_thread.join()
+        if self.data_dir:
+            self.snapshot()
+            self._journal.close()
+
+
+def _only_queries(ops: list) -> bool:
+    """Se a transação só registrou eventos de consulta"""
+    return all(
+        kind == "event" and row["event_type"] in _QUERY_TYPE_VALUES
+        for kind, row in ops
+    )
@@ -0,0 +1,147 @@
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+from domain.exceptions import ConcurrencyError
+from domain.repositories import UserRepository
+from domain.user import USER_FIELDS, User
+from infrastructure.memory.storage import MemoryStorage
+
+
+class InMemoryUserRepository(UserRepository):
+    """UserRepository over MemoryStorage, indexed by id, email and department
+
+    Reads take the storage lock, so they wait for an open transaction instead
+    of seeing writes that may still roll back. Rows are never mutated in
+    place, so they are turned into Users after the lock is released.
+    """
+
+    def __init__(self, storage: MemoryStorage):
+        self.storage = storage
+
+    def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """Fetch a user by ID"""
+        with self.storage.lock:
+            row = self.storage.users.get(user_id)
+        if row and row["is_active"]:
+            return self._row_to_user(row)
+        return None
+
+    def get_user_version(self, user_id: int) -> Optional[Tuple[int, str]]:
+        """Fetch (version, updated_at) of an active user"""
+        with self.storage.lock:
+            row = self.storage.users.get(user_id)
+        if row and row["is_active"]:
+            return row["version"], row["updated_at"]
+        return None
+
+    def get_all_users(self) -> List[User]:
+        """Return all users"""
+        with self.storage.lock:
+            rows = list(self.storage.users.values())
+        return [self._row_to_user(row) for row in rows if row["is_active"]]
+
+    def iter_all_users(self) -> Iterator[User]:
+        """Yield every user, active or not, in id order"""
+        with self.storage.lock:
+            ids = sorted(self.storage.users)
+            rows = [self.storage.users[user_id] for user_id in ids]
+        for row in rows:
+            yield self._row_to_user(row)
+
+    def get_users_by_department(self, department: str) -> List[User]:
+        """Return active users of a department using the department index"""
+        with self.storage.lock:
+            ids = sorted(self.storage.users_by_department.get(department, ()))
+            rows = [self.storage.users[user_id] for user_id in ids]
+        return [self._row_to_user(row) for row in rows if row["is_active"]]
+
+    def create_user(self, user: User) -> User:
+        """Create a new user"""
+        with self.storage.transaction():
+            self._check_email_available(user.email)
+            user.id = self.storage.next_user_id
+            user.version = 1
+            self.storage.put_user(self._user_to_row(user))
+            return user
+
+    def update_user(
+        self, user_id: int, user: User, expected_version: int = None
+    ) -> Optional[User]:
+        """Update an existing user, optionally only if it is still at expected_version"""
+        with self.storage.transaction():
+            row = self.storage.users.get(user_id)
+            if not row:
+                return None
+            if expected_version is not None and row["version"] != expected_version:
+                raise ConcurrencyError(user_id, expected_version, row["version"])
+            if user.email != row["email"]:
+                self._check_email_available(user.email)
+
+            user.id = user_id
+            user.version = row["version"] + 1
+            self.storage.put_user(self._user_to_row(user))
+            return user
+
+    def patch_user(
+        self, user_id: int, changes: dict, expected_version: int = None
+    ) -> Optional[int]:
+        """Apply only the given fields; return the new version (None if missing)"""
+        with self.storage.transaction():
+            row = self.storage.users.get(user_id)
+            if not row:
+                return None
+            if expected_version is not None and row["version"] != expected_version:
+                raise ConcurrencyError(user_id, expected_version, row["version"])
+            if "email" in changes and changes["email"] != row["email"]:
+                self._check_email_available(changes["email"])
+
+            version = row["version"] + 1
+            self.storage.put_user(
+                dict(
+                    row,
+                    **changes,
+                    version=version,
+                    updated_at=datetime.now().isoformat(),
+                )
+            )
+            return version
+
+    def delete_user(self, user_id: int, expected_version: int = None) -> bool:
+        """Delete a user by ID"""
+        with self.storage.transaction():
+            row = self.storage.users.get(user_id)
+            if not row:
+                return False
+            if expected_version is not None and row["version"] != expected_version:
+                raise ConcurrencyError(user_id, expected_version, row["version"])
+
+            self.storage.put_user(
+                dict(
+                    row,
+                    is_active=False,
+                    version=row["version"] + 1,
+                    updated_at=datetime.now().isoformat(),
+                )
+            )
+            return True
+
+    def transaction(self):
+        """Share one MemoryStorage transaction with the InMemoryEventStore"""
+        return self.storage.transaction()
+
+    def _check_email_available(self, email: str):
+        if email in self.storage.users_by_email:
+            raise ValueError(f"Email already registered: {email}")
+
+    def _user_to_row(self, user: User) -> dict:
+        row = {field: getattr(user, field) for field in USER_FIELDS}
+        row["id"] = user.id
+        row["version"] = user.version
+        row["updated_at"] = datetime.now().isoformat()
+        return row
+
+    def _row_to_user(self, row: dict) -> User:
+        return User(
+            id=row["id"],
+            version=row["version"],
+            **{field: row[field] for field in USER_FIELDS},
+        )
@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from domain.events import DomainEvent, EventType
+from infrastructure.db.database import get_database_path, get_db_connection, transaction
+
+# eventos aplicados por transação ao alcançar o log
+PROJECTION_BATCH_SIZE = int(os.environ.get("PROJECTION_BATCH_SIZE", 1000))
+# maior série que um relatório devolve (dez anos de dias)
+REPORT_MAX_PERIODS = int(os.environ.get("REPORT_MAX_PERIODS", 3660))
+
+GRANULARITIES = ("month", "day")
+_PERIOD_FORMATS = {"month": "%Y-%m", "day": "%Y-%m-%d"}
+
+
+def period_of(occurred_at: str, granularity: str) -> str:
+    """Período (YYYY-MM ou YYYY-MM-DD) de um timestamp ISO"""
+    return occurred_at[: 7 if granularity == "month" else 10]
+
+
+def parse_period(value: str, granularity: str) -> date:
+    """Valida um período no formato da granularidade; lança ValueError"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    try:
+        return datetime.strptime(value, _PERIOD_FORMATS[granularity]).date()
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"Invalid {granularity} period {value!r}, expected "
+            f"{'YYYY-MM' if granularity == 'month' else 'YYYY-MM-DD'}"
+        )
+
+
+def iter_periods(start: str, end: str, granularity: str) -> Iterator[str]:
+    """Todos os períodos de start a end, inclusive"""
+    current, last = parse_period(start, granularity), parse_period(end, granularity)
+    if current > last:
+        raise ValueError("from must not be after to")
+    count = 0
+    while current <= last:
+        count += 1
+        if count > REPORT_MAX_PERIODS:
+            raise ValueError(f"Range is longer than {REPORT_MAX_PERIODS} periods")
+        yield current.strftime(_PERIOD_FORMATS[granularity])
+        if granularity == "day":
+            current += timedelta(days=1)
+        elif current.month == 12:
+            current = current.replace(year=current.year + 1, month=1)
+        else:
+            current = current.replace(month=current.month + 1)
+
+
+class Projection(ABC):
+    """Tabelas derivadas do log de events, atualizadas incrementalmente
+
+    Cada projeção guarda em projection_checkpoints o id do último evento
+    aplicado e, a cada chamada de catch_up, aplica em ordem os eventos
+    seguintes dos tipos que lhe interessam, no mesmo commit que avança o
+    checkpoint. Sem checkpoint, catch_up reconstrói tudo desde o início do
+    log (backfill). As subclasses definem name, event_types, apply e clear.
+    """
+
+    name: str = None
+    event_types: Tuple[EventType, ...] = ()
+
+    def __init__(self, batch_size: int = PROJECTION_BATCH_SIZE):
+        self.batch_size = batch_size
+        # último id aplicado, por arquivo de banco (tenant), para evitar
+        # consultas quando um evento já foi coberto por outro catch_up
+        self._applied = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def apply(
+        self,
+        cursor,
+        event_type: EventType,
+        aggregate_id: int,
+        data: dict,
+        occurred_at: str,
+    ):
+        """Atualiza as tabelas da projeção com um evento, na transação do cursor"""
+
+    @abstractmethod
+    def clear(self, cursor):
+        """Apaga as tabelas da projeção"""
+
+    def handle(self, event: DomainEvent):
+        """Handler do EventBus: alcança o log até (pelo menos) este evento"""
+        applied = self._applied.get(get_database_path(), 0)
+        if event.event_id is not None and event.event_id <= applied:
+            return
+        self.catch_up()
+
+    def catch_up(self) -> int:
+        """Aplica os eventos ainda não vistos; retorna quantos foram aplicados"""
+        total = 0
+        while self._has_pending():
+            applied = self._apply_batch()
+            total += applied
+            if applied < self.batch_size:
+                break
+        return total
+
+    def rebuild(self) -> int:
+        """Apaga a projeção e a recalcula a partir do log inteiro"""
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM projection_checkpoints WHERE name = ?", (self.name,)
+            )
+            self.clear(cursor)
+        self._applied.pop(get_database_path(), None)
+        return self.catch_up()
+
+    def _has_pending(self) -> bool:
+        """Checagem só de leitura, para não disputar o lock de escrita à toa"""
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT last_event_id FROM projection_checkpoints WHERE name = ?",
+                (self.name,),
+            )
+            row = cursor.fetchone()
+            last_event_id = row["last_event_id"] if row else 0
+            cursor.execute(
+                f"""
+                SELECT 1 FROM events
+                WHERE id > ? AND event_type IN ({self._type_placeholders()})
+                LIMIT 1
+            """,
+                (last_event_id, *self._type_values()),
+            )
+            if cursor.fetchone() is None:
+                self._remember(last_event_id)
+                return False
+            return True
+
+    def _apply_batch(self) -> int:
+        with transaction() as conn:
+            cursor = conn.cursor()
+            # a primeira instrução escreve: a transação pega o lock de escrita
+            # antes de ler o checkpoint, então dois catch_up não aplicam o
+            # mesmo evento
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO projection_checkpoints (name, last_event_id)
+                VALUES (?, 0)
+            """,
+                (self.name,),
+            )
+            cursor.execute(
+                "SELECT last_event_id FROM projection_checkpoints WHERE name = ?",
+                (self.name,),
+            )
+            last_event_id = cursor.fetchone()["last_event_id"]
+            cursor.execute(
+                f"""
+                SELECT id, event_type, aggregate_id, data, occurred_at
+                FROM events
+                WHERE id > ? AND event_type IN ({self._type_placeholders()})
+                ORDER BY id ASC
+                LIMIT ?
+            """,
+                (last_event_id, *self._type_values(), self.batch_size),
+            )
+            rows = cursor.fetchall()
+            for row in rows:
+                self.apply(
+                    cursor,
+                    EventType(row["event_type"]),
+                    row["aggregate_id"],
+                    json.loads(row["data"]),
+                    row["occurred_at"],
+                )
+            if rows:
+                last_event_id = rows[-1]["id"]
+                cursor.execute(
+                    """
+                    UPDATE projection_checkpoints SET last_event_id = ?, updated_at = ?
+                    WHERE name = ?
+                """,
+                    (last_event_id, datetime.now().isoformat(), self.name),
+                )
+        self._remember(last_event_id)
+        return len(rows)
+
+    def _remember(self, last_event_id: int):
+        path = get_database_path()
+        with self._lock:
+            self._applied[path] = max(self._applied.get(path, 0), last_event_id)
+
+    def _type_placeholders(self) -> str:
+        return ", ".join("?" for _ in self.event_types)
+
+    def _type_values(self) -> list:
+        return [event_type.value for event_type in self.event_types]
+
+
+class BucketProjection(Projection):
+    """Projeção agregada em buckets granularidade × dimensão × valor × período
+
+    Colunas de nível (levels) guardam variações: o valor de um período é a
+    soma acumulada de todas até ele. Colunas de fluxo (flows) valem só para
+    o próprio período. Uma série lê apenas os buckets: um SUM dos anteriores
+    ao início dá os níveis iniciais, e os do intervalo são acumulados.
+    """
+
+    table: str = None
+    dimensions: Tuple[str, ...] = ()
+    # coluna de variação -> nome do nível na resposta
+    levels: Dict[str, str] = {}
+    flows: Tuple[str, ...] = ()
+
+    def add(self, cursor, dimension: str, dim_value, occurred_at: str, **measures):
+        """Soma as medidas ao bucket do período do evento, em todas as granularidades"""
+        columns = ", ".join(measures)
+        updates = ", ".join(
+            f"{column} = {column} + excluded.{column}" for column in measures
+        )
+        for granularity in GRANULARITIES:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table}
+                    (granularity, dimension, dim_value, period, {columns})
+                VALUES (?, ?, ?, ?{", ?" * len(measures)})
+                ON CONFLICT (granularity, dimension, dim_value, period)
+                DO UPDATE SET {updates}
+            """,
+                (
+                    granularity,
+                    dimension,
+                    dim_value or "",
+                    period_of(occurred_at, granularity),
+                    *measures.values(),
+                ),
+            )
+
+    def point(self, period: str, values: dict, opening: dict) -> dict:
+        """Monta um ponto da série; opening são os níveis no início do período"""
+        return {"period": period, **values}
+
+    def series(
+        self,
+        dimension: str,
+        granularity: str = "month",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        value: Optional[str] = None,
+    ) -> List[dict]:
+        """Série densa de start a end (padrão: todos os buckets) por valor da dimensão"""
+        if dimension not in self.dimensions:
+            raise ValueError(
+                f"dimension must be one of: {', '.join(self.dimensions)}"
+            )
+        if start is not None:
+            parse_period(start, granularity)
+        if end is not None:
+            parse_period(end, granularity)
+        self.catch_up()
+
+        value_filter, params = "", [granularity, dimension]
+        if value is not None:
+            value_filter = " AND dim_value = ?"
+            params.append(value)
+        with get_db_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            if start is None or end is None:
+                cursor.execute(
+                    f"""
+                    SELECT MIN(period) AS first, MAX(period) AS last
+                    FROM {self.table}
+                    WHERE granularity = ? AND dimension = ?{value_filter}
+                """,
+                    params,
+                )
+                bounds = cursor.fetchone()
+                if bounds["first"] is None:
+                    return []
+                start = start or bounds["first"]
+                end = end or bounds["last"]
+            periods = list(iter_periods(start, end, granularity))
+
+            sums = ", ".join(f"SUM({column}) AS {column}" for column in self.levels)
+            cursor.execute(
+                f"""
+                SELECT dim_value, {sums}
+                FROM {self.table}
+                WHERE granularity = ? AND dimension = ?{value_filter} AND period < ?
+                GROUP BY dim_value
+            """,
+                (*params, start),
+            )
+            opening = {row["dim_value"]: dict(row) for row in cursor.fetchall()}
+            columns = ", ".join((*self.levels, *self.flows))
+            cursor.execute(
+                f"""
+                SELECT dim_value, period, {columns}
+                FROM {self.table}
+                WHERE granularity = ? AND dimension = ?{value_filter}
+                  AND period BETWEEN ? AND ?
+            """,
+                (*params, start, end),
+            )
+            buckets = {
+                (row["dim_value"], row["period"]): row for row in cursor.fetchall()
+            }
+
+        result = []
+        for dim_value in sorted(opening.keys() | {key[0] for key in buckets}):
+            row = opening.get(dim_value)
+            current = {
+                name: row[column] if row else 0
+                for column, name in self.levels.items()
+            }
+            points = []
+            for period in periods:
+                bucket = buckets.get((dim_value, period))
+                previous = dict(current)
+                if bucket:
+                    for column, name in self.levels.items():
+                        current[name] += bucket[column]
+                flows = {flow: bucket[flow] if bucket else 0 for flow in self.flows}
+                points.append(self.point(period, {**current, **flows}, previous))
+            result.append({dimension: dim_value or None, "points": points})
+        return result
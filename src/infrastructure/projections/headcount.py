@@ -0,0 +1,120 @@
+from domain.events import EventType
+from infrastructure.projections.base import BucketProjection
+
+
+class HeadcountCube(BucketProjection):
+    """Headcount, admissões, saídas e transferências por departamento e tipo de contrato
+
+    headcount_members guarda o departamento, o tipo de contratação e a
+    situação atuais de cada usuário. Cada evento do ciclo de vida vira, em
+    cada dimensão, uma variação do headcount e um fluxo no período: admissão
+    (criação ou reativação), saída (exclusão ou desativação) ou
+    transferência entre valores da dimensão.
+    """
+
+    name = "headcount"
+    table = "headcount_cube"
+    dimensions = ("department", "employment_type")
+    levels = {"headcount_delta": "headcount"}
+    flows = ("hires", "exits", "transfers_in", "transfers_out")
+    event_types = (
+        EventType.USER_CREATED,
+        EventType.USER_DELETED,
+        EventType.USER_ACTIVATED,
+        EventType.USER_DEACTIVATED,
+        EventType.DEPARTMENT_CHANGED,
+        EventType.EMPLOYMENT_TYPE_CHANGED,
+    )
+
+    def apply(self, cursor, event_type, aggregate_id, data, occurred_at):
+        cursor.execute(
+            """
+            SELECT department, employment_type, active
+            FROM headcount_members WHERE user_id = ?
+        """,
+            (aggregate_id,),
+        )
+        row = cursor.fetchone()
+        if row is None and event_type != EventType.USER_CREATED:
+            return
+        old = dict(row) if row else None
+        new = dict(old) if old else None
+
+        if event_type == EventType.USER_CREATED:
+            new = {
+                "department": data.get("department"),
+                "employment_type": data.get("employment_type"),
+                "active": 1 if data.get("is_active", True) else 0,
+            }
+        elif event_type == EventType.DEPARTMENT_CHANGED:
+            new["department"] = data.get("new_department")
+        elif event_type == EventType.EMPLOYMENT_TYPE_CHANGED:
+            new["employment_type"] = data.get("new_employment_type")
+        elif event_type == EventType.USER_ACTIVATED:
+            new["active"] = 1
+        else:
+            new["active"] = 0
+
+        if new == old:
+            return
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO headcount_members
+                (user_id, department, employment_type, active)
+            VALUES (?, ?, ?, ?)
+        """,
+            (aggregate_id, new["department"], new["employment_type"], new["active"]),
+        )
+        was_active = bool(old and old["active"])
+        for dimension in self.dimensions:
+            if not was_active and new["active"]:
+                self.add(
+                    cursor,
+                    dimension,
+                    new[dimension],
+                    occurred_at,
+                    headcount_delta=1,
+                    hires=1,
+                )
+            elif was_active and not new["active"]:
+                self.add(
+                    cursor,
+                    dimension,
+                    old[dimension],
+                    occurred_at,
+                    headcount_delta=-1,
+                    exits=1,
+                )
+            elif was_active and old[dimension] != new[dimension]:
+                self.add(
+                    cursor,
+                    dimension,
+                    old[dimension],
+                    occurred_at,
+                    headcount_delta=-1,
+                    transfers_out=1,
+                )
+                self.add(
+                    cursor,
+                    dimension,
+                    new[dimension],
+                    occurred_at,
+                    headcount_delta=1,
+                    transfers_in=1,
+                )
+
+    def clear(self, cursor):
+        cursor.execute("DELETE FROM headcount_members")
+        cursor.execute("DELETE FROM headcount_cube")
+
+    def point(self, period: str, values: dict, opening: dict) -> dict:
+        # saídas sobre o headcount médio do período
+        average = (opening["headcount"] + values["headcount"]) / 2
+        return {
+            "period": period,
+            **values,
+            "attrition_rate": round(values["exits"] / average, 4) if average else None,
+        }
+
+
+headcount_cube = HeadcountCube()
@@ -0,0 +1,117 @@
+from domain.events import EventType
+from infrastructure.projections.base import BucketProjection
+
+
+class PayrollRollup(BucketProjection):
+    """Folha de pagamento e salário médio por departamento/cargo, por mês e por dia
+
+    payroll_members guarda o salário, departamento, cargo e situação atuais de
+    cada usuário. Cada evento vira variações de folha e headcount no bucket
+    do período em que ocorreu; o valor de um período é a folha mensal
+    vigente ao fim dele.
+    """
+
+    name = "payroll"
+    table = "payroll_rollups"
+    dimensions = ("department", "position")
+    levels = {"payroll_delta": "payroll", "headcount_delta": "headcount"}
+    event_types = (
+        EventType.USER_CREATED,
+        EventType.USER_DELETED,
+        EventType.USER_ACTIVATED,
+        EventType.USER_DEACTIVATED,
+        EventType.SALARY_CHANGED,
+        EventType.POSITION_CHANGED,
+        EventType.DEPARTMENT_CHANGED,
+        EventType.USER_PROMOTED,
+        EventType.USER_DEMOTED,
+    )
+
+    def apply(self, cursor, event_type, aggregate_id, data, occurred_at):
+        cursor.execute(
+            """
+            SELECT salary, department, position, active
+            FROM payroll_members WHERE user_id = ?
+        """,
+            (aggregate_id,),
+        )
+        row = cursor.fetchone()
+        if row is None and event_type != EventType.USER_CREATED:
+            return
+        old = dict(row) if row else None
+        new = dict(old) if old else None
+
+        if event_type == EventType.USER_CREATED:
+            new = {
+                "salary": data.get("salary") or 0.0,
+                "department": data.get("department"),
+                "position": data.get("position"),
+                "active": 1 if data.get("is_active", True) else 0,
+            }
+        elif event_type == EventType.SALARY_CHANGED:
+            new["salary"] = data.get("new_salary") or 0.0
+        elif event_type == EventType.POSITION_CHANGED:
+            new["position"] = data.get("new_position")
+        elif event_type == EventType.DEPARTMENT_CHANGED:
+            new["department"] = data.get("new_department")
+        elif event_type in (EventType.USER_PROMOTED, EventType.USER_DEMOTED):
+            # o mesmo commit traz salary/position changed: aplicar é idempotente
+            new["position"] = data.get("new_position")
+            new["salary"] = data.get("new_salary") or 0.0
+        elif event_type == EventType.USER_ACTIVATED:
+            new["active"] = 1
+        else:
+            new["active"] = 0
+
+        if new == old:
+            return
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO payroll_members
+                (user_id, salary, department, position, active)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            (
+                aggregate_id,
+                new["salary"],
+                new["department"],
+                new["position"],
+                new["active"],
+            ),
+        )
+        for dimension in self.dimensions:
+            deltas = {}
+            if old and old["active"]:
+                key = old[dimension]
+                payroll, headcount = deltas.get(key, (0.0, 0))
+                deltas[key] = (payroll - old["salary"], headcount - 1)
+            if new["active"]:
+                key = new[dimension]
+                payroll, headcount = deltas.get(key, (0.0, 0))
+                deltas[key] = (payroll + new["salary"], headcount + 1)
+            for dim_value, (payroll, headcount) in deltas.items():
+                if payroll or headcount:
+                    self.add(
+                        cursor,
+                        dimension,
+                        dim_value,
+                        occurred_at,
+                        payroll_delta=payroll,
+                        headcount_delta=headcount,
+                    )
+
+    def clear(self, cursor):
+        cursor.execute("DELETE FROM payroll_members")
+        cursor.execute("DELETE FROM payroll_rollups")
+
+    def point(self, period: str, values: dict, opening: dict) -> dict:
+        payroll, headcount = values["payroll"], values["headcount"]
+        return {
+            "period": period,
+            "payroll": round(payroll, 2),
+            "headcount": headcount,
+            "average_salary": round(payroll / headcount, 2) if headcount else None,
+        }
+
+
+payroll_rollup = PayrollRollup()
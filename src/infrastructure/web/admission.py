@@ -0,0 +1,185 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from flask import Flask, g, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+from infrastructure.db.database import get_write_latency_ms
+from infrastructure.event_bus import get_event_bus
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+# token bucket por cliente: reposição (tokens/s) e capacidade (rajada)
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", 50))
+ADMISSION_BURST = float(os.environ.get("ADMISSION_BURST", 100))
+# custo em tokens de um request pesado (listagens, históricos, bulk/export)
+ADMISSION_HEAVY_COST = float(os.environ.get("ADMISSION_HEAVY_COST", 5))
+# requests em execução ao mesmo tempo no processo
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", 64))
+# vagas que só leituras leves podem usar
+ADMISSION_LIGHT_RESERVED = int(
+    os.environ.get("ADMISSION_LIGHT_RESERVED", ADMISSION_MAX_CONCURRENCY // 4)
+)
+# limite próprio dos requests pesados
+ADMISSION_HEAVY_CONCURRENCY = int(
+    os.environ.get("ADMISSION_HEAVY_CONCURRENCY", max(1, ADMISSION_MAX_CONCURRENCY // 4))
+)
+# acima destes níveis de pressão, escritas e requests pesados são recusados
+ADMISSION_DB_LATENCY_MS = float(os.environ.get("ADMISSION_DB_LATENCY_MS", 250))
+ADMISSION_EVENT_BACKLOG = int(os.environ.get("ADMISSION_EVENT_BACKLOG", 256))
+# proxies reversos confiáveis na frente da aplicação: o endereço do cliente vem
+# do X-Forwarded-For que eles acrescentam (0 = o endereço da própria conexão)
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+# clientes com bucket guardado (LRU)
+ADMISSION_MAX_CLIENTS = int(os.environ.get("ADMISSION_MAX_CLIENTS", 10000))
+
+LIGHT, NORMAL, HEAVY = "light", "normal", "heavy"
+
+EXEMPT_PATHS = ("/health", "/docs", "/swagger.json", "/swaggerui")
+HEAVY_PATHS = [
+    ("GET", re.compile(r"^/user/$")),
+    ("GET", re.compile(r"^/user/\d+/events$")),
+    ("GET", re.compile(r"^/events/?$")),
+    ("GET", re.compile(r"^/reports/")),
+    ("POST", re.compile(r"^/user/import$")),
+]
+
+
+def register_heavy_path(method: str, pattern: str):
+    """Marca uma rota como pesada (menor prioridade e custo maior no bucket)"""
+    HEAVY_PATHS.append((method, re.compile(pattern)))
+
+
+def classify(method: str, path: str) -> str:
+    for heavy_method, pattern in HEAVY_PATHS:
+        if method == heavy_method and pattern.match(path):
+            return HEAVY
+    if method in ("GET", "HEAD"):
+        return LIGHT
+    return NORMAL
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Consome cost tokens; retorna 0 ou quantos segundos esperar"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Decide se um request entra, por cliente (rate) e por processo (concorrência/pressão)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.in_flight = 0
+        self.heavy_in_flight = 0
+
+    def _bucket(self, client) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(ADMISSION_RATE, ADMISSION_BURST)
+            self._buckets[client] = bucket
+            if len(self._buckets) > ADMISSION_MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket
+
+    def _overloaded(self, request_class: str) -> bool:
+        """Leituras leves passam sob pressão: no WAL elas não disputam o lock de escrita"""
+        if request_class == LIGHT:
+            return False
+        return (
+            get_write_latency_ms() > ADMISSION_DB_LATENCY_MS
+            or get_event_bus().pending > ADMISSION_EVENT_BACKLOG
+        )
+
+    def _capacity(self, request_class: str) -> int:
+        if request_class == LIGHT:
+            return ADMISSION_MAX_CONCURRENCY
+        return ADMISSION_MAX_CONCURRENCY - ADMISSION_LIGHT_RESERVED
+
+    def admit(self, client, request_class: str):
+        """Retorna None se o request pode seguir, ou (status, mensagem, retry_after)"""
+        if self._overloaded(request_class):
+            return 503, "Server is under pressure, try again later", 1
+        with self._lock:
+            if self.in_flight >= self._capacity(request_class) or (
+                request_class == HEAVY
+                and self.heavy_in_flight >= ADMISSION_HEAVY_CONCURRENCY
+            ):
+                return 503, "Too many concurrent requests", 1
+            cost = ADMISSION_HEAVY_COST if request_class == HEAVY else 1
+            wait = self._bucket(client).take(cost)
+            if wait:
+                return 429, "Rate limit exceeded", math.ceil(wait)
+            self.in_flight += 1
+            if request_class == HEAVY:
+                self.heavy_in_flight += 1
+        return None
+
+    def release(self, request_class: str):
+        with self._lock:
+            self.in_flight -= 1
+            if request_class == HEAVY:
+                self.heavy_in_flight -= 1
+
+
+_controller = AdmissionController()
+
+
+def _client_key():
+    # atrás de TRUSTED_PROXIES proxies, remote_addr já é o do cliente (ProxyFix);
+    # headers controlados pelo cliente (como X-Tenant-ID) ficam fora da chave
+    return request.remote_addr
+
+
+def _admit():
+    if request.path.startswith(EXEMPT_PATHS):
+        return None
+    request_class = classify(request.method, request.path)
+    rejection = _controller.admit(_client_key(), request_class)
+    if rejection is not None:
+        status, message, retry_after = rejection
+        return {"message": message}, status, {"Retry-After": str(retry_after)}
+    g.admission_class = request_class
+    return None
+
+
+def _release_streamed_on_close(response):
+    # respostas em streaming continuam ocupando a vaga até serem consumidas
+    if response.is_streamed:
+        request_class = g.pop("admission_class", None)
+        if request_class is not None:
+            response.call_on_close(lambda: _controller.release(request_class))
+    return response
+
+
+def _release(exc=None):
+    request_class = g.pop("admission_class", None)
+    if request_class is not None:
+        _controller.release(request_class)
+
+
+def init_admission(app: Flask):
+    """Limita a taxa por cliente e a concorrência do processo, com prioridade para GETs leves"""
+    if TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+    if not ADMISSION_ENABLED:
+        return
+    app.before_request(_admit)
+    app.after_request(_release_streamed_on_close)
+    app.teardown_request(_release)
@@ -1,4 +1,6 @@
+from flask import make_response
 from flask_restx import Api
+from infrastructure.web.json_codec import dumps
 
 api = Api(
     title="RH EDA API",
@@ -6,3 +8,12 @@ api = Api(
     description="API para gerenciamento de recursos humanos utilizando EDA",
     doc="/docs",
 )
+
+
+@api.representation("application/json")
+def output_json(data, code, headers=None):
+    """Representação JSON da API usando o encoder rápido"""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
@@ -0,0 +1,237 @@
+import json
+import re
+import sqlite3
+from contextlib import nullcontext
+from application.async_user_service import AsyncUserService
+from domain.exceptions import ConcurrencyError
+from infrastructure.bootstrap import get_user_service
+from infrastructure.db.async_storage import run_blocking
+from infrastructure.db.database import tenant_exists, tenant_scope
+from infrastructure.web.json_codec import dumps, encode_event_row
+from infrastructure.web.serializers import user_to_dict
+from infrastructure.web.tenancy import TENANT_HEADER, tenant_required
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+
+    async def json(self):
+        body = b""
+        while True:
+            message = await self.receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body")
+
+    async def json_object(self) -> dict:
+        data = await self.json()
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return data
+
+
+async def send_json(send, data, status: int = 200):
+    body = dumps(data)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class UserASGIApp:
+    """Variante asyncio/ASGI da API de usuários
+
+    Rode com um servidor ASGI, por exemplo: uvicorn asgi:app
+    Toda espera por I/O de SQLite acontece no executor de banco, então clientes
+    lentos ocupam apenas uma coroutine, não um thread.
+
+    Só cobre as rotas listadas em __init__. Não implementa PATCH, ETag/If-Match
+    (nem 304), Idempotency-Key, controle de admissão ou compressão da API Flask.
+    """
+
+    def __init__(self):
+        self.routes = [
+            ("GET", r"/health", self.health),
+            ("GET", r"/user/", self.list_users),
+            ("POST", r"/user/", self.create_user),
+            ("GET", r"/user/(?P<user_id>\d+)", self.get_user),
+            ("PUT", r"/user/(?P<user_id>\d+)", self.update_user),
+            ("DELETE", r"/user/(?P<user_id>\d+)", self.delete_user),
+            ("GET", r"/user/(?P<user_id>\d+)/events", self.get_user_events),
+            ("POST", r"/user/(?P<user_id>\d+)/change-position", self.change_position),
+        ]
+        self.routes = [
+            (method, re.compile(pattern + "$"), handler)
+            for method, pattern, handler in self.routes
+        ]
+        self._service = None
+
+    @property
+    def service(self) -> AsyncUserService:
+        if self._service is None:
+            self._service = AsyncUserService(get_user_service())
+        return self._service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        request = Request(scope, receive)
+        started = False
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            handler, params = self.resolve(request)
+            with self.tenant(request):
+                await handler(request, tracked_send, **params)
+        except Exception as e:
+            status, message = self.error_response(e)
+            if not started:
+                await send_json(send, {"message": message}, status)
+                return
+            # o status já foi enviado (resposta em streaming): só resta encerrar
+            # o corpo, que fica truncado
+            print(f"Error streaming {request.path}: {str(e)}")
+            await send({"type": "http.response.body", "body": b""})
+
+    def error_response(self, error: Exception):
+        """(status, mensagem) da resposta de erro para uma exceção do handler"""
+        if isinstance(error, HTTPError):
+            return error.status, error.message
+        if isinstance(error, ConcurrencyError):
+            return 409, str(error)
+        if isinstance(error, ValueError):
+            return 400, str(error)
+        if isinstance(error, sqlite3.IntegrityError):
+            # ex.: email já cadastrado
+            return 400, f"Invalid data: {error}"
+        return 500, "Internal error"
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await run_blocking(get_user_service)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def tenant(self, request: Request):
+        """Escopo do shard do tenant do request (run_blocking propaga o contexto)"""
+        if not tenant_required(request.path):
+            return nullcontext()
+        tenant_id = request.headers.get(TENANT_HEADER.lower())
+        if not tenant_id:
+            raise HTTPError(400, f"Missing {TENANT_HEADER} header")
+        if not tenant_exists(tenant_id):
+            raise HTTPError(404, f"Unknown tenant: {tenant_id}")
+        return tenant_scope(tenant_id)
+
+    def resolve(self, request: Request):
+        path_matched = False
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match:
+                path_matched = True
+                if method == request.method:
+                    return handler, {k: int(v) for k, v in match.groupdict().items()}
+        if path_matched:
+            raise HTTPError(405, "Method not allowed")
+        raise HTTPError(404, "Not found")
+
+    async def health(self, request, send):
+        await send_json(send, {"status_code": "ok", "code": 200, "data": "healthy"})
+
+    async def list_users(self, request, send):
+        users = await self.service.get_all_users()
+        await send_json(send, [user_to_dict(u) for u in users])
+
+    async def create_user(self, request, send):
+        user = await self.service.create_user(await request.json_object())
+        await send_json(send, user_to_dict(user), 201)
+
+    async def get_user(self, request, send, user_id):
+        user = await self.service.get_user(user_id)
+        if not user:
+            raise HTTPError(404, "User not found")
+        await send_json(send, user_to_dict(user))
+
+    async def update_user(self, request, send, user_id):
+        user = await self.service.update_user(user_id, await request.json_object())
+        if not user:
+            raise HTTPError(404, "User not found")
+        await send_json(send, user_to_dict(user))
+
+    async def delete_user(self, request, send, user_id):
+        if not await self.service.delete_user(user_id):
+            raise HTTPError(404, "User not found")
+        await send_json(send, {"msg": "User deleted successfully"})
+
+    async def change_position(self, request, send, user_id):
+        data = await request.json_object()
+        user = await self.service.change_position(
+            user_id,
+            data.get("new_position"),
+            data.get("new_salary"),
+            data.get("changed_by"),
+        )
+        if not user:
+            raise HTTPError(404, "User not found")
+        await send_json(send, user_to_dict(user))
+
+    async def get_user_events(self, request, send, user_id):
+        batches = await self.service.get_user_events_raw(user_id)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        first = True
+        async for batch in batches:
+            chunk = b",".join(encode_event_row(row) for row in batch)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": (b"[" if first else b",") + chunk,
+                    "more_body": True,
+                }
+            )
+            first = False
+        await send({"type": "http.response.body", "body": b"[]" if first else b"]"})
@@ -0,0 +1,93 @@
+import gzip
+import os
+import zlib
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende do ambiente
+    zstandard = None
+
+# respostas menores que isso não compensam o custo de comprimir
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/csv", "text/html"}
+
+
+def _encoders():
+    """Encoders disponíveis, em ordem de preferência do servidor"""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = zstandard.ZstdCompressor(level=3).compress
+    if brotli is not None:
+        encoders["br"] = lambda data: brotli.compress(data, quality=4)
+    encoders["gzip"] = lambda data: gzip.compress(data, compresslevel=5)
+    return encoders
+
+
+ENCODERS = _encoders()
+
+
+def negotiate_encoding() -> str:
+    """Escolhe o encoding aceito pelo cliente com maior qualidade"""
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in ENCODERS:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _gzip_stream(chunks):
+    """Comprime incrementalmente os blocos de uma resposta em streaming"""
+    compressor = zlib.compressobj(5, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _tag_encoding(response: Response, encoding: str):
+    """ETag forte da versão comprimida: outra representação, outro valor"""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+
+
+def compress_response(response: Response) -> Response:
+    """after_request: comprime respostas grandes conforme o Accept-Encoding"""
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed:
+        # o tamanho é desconhecido: streams são sempre comprimidos, só com gzip
+        if request.accept_encodings["gzip"]:
+            response.response = _gzip_stream(response.iter_encoded())
+            response.headers["Content-Encoding"] = "gzip"
+            _tag_encoding(response, "gzip")
+        return response
+
+    if response.content_length is None or response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(ENCODERS[encoding](response.get_data()))
+    response.headers["Content-Encoding"] = encoding
+    _tag_encoding(response, encoding)
+    return response
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from flask import request, Response
+from werkzeug.http import http_date, quote_etag
+from infrastructure.web.compression import ENCODERS
+
+Watermark = Optional[Tuple[int, str]]
+
+
+def make_etag(prefix: str, aggregate_id: int, version: int) -> str:
+    """Monta o valor (sem aspas) da ETag de um recurso versionado"""
+    return f"{prefix}-{aggregate_id}-{version}"
+
+
+def etag_variants(etag: str) -> Tuple[str, ...]:
+    """A ETag e as das versões comprimidas (ver compress_response)"""
+    return (etag, *(f"{etag}-{encoding}" for encoding in ENCODERS))
+
+
+def to_http_datetime(occurred_at: Optional[str]) -> Optional[datetime]:
+    """Converte o occurred_at (ISO, horário local) para datetime UTC sem microssegundos"""
+    if not occurred_at:
+        return None
+    moment = datetime.fromisoformat(occurred_at).astimezone(timezone.utc)
+    return moment.replace(microsecond=0)
+
+
+def validator_headers(
+    etag: Optional[str], last_modified: Optional[datetime], weak: bool = False
+) -> dict:
+    """Headers ETag/Last-Modified para anexar à resposta"""
+    headers = {}
+    if etag:
+        headers["ETag"] = quote_etag(etag, weak)
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since do request atual"""
+    if request.if_none_match:
+        return etag is not None and any(
+            request.if_none_match.contains_weak(tag) for tag in etag_variants(etag)
+        )
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def precondition_failed(etag: Optional[str]) -> bool:
+    """True quando o request traz If-Match e ele não bate com a ETag atual"""
+    if not request.if_match:
+        return False
+    if request.if_match.star_tag:
+        return etag is None
+    return etag is None or not any(
+        request.if_match.contains(tag) for tag in etag_variants(etag)
+    )
+
+
+def not_modified_response(headers: dict) -> Response:
+    """Resposta 304 sem corpo, repetindo os validadores"""
+    response = Response(status=304, headers=headers)
+    etag, weak = response.get_etag()
+    if etag and not weak and request.if_none_match:
+        # repete a variante (comprimida ou não) que o cliente tem em cache
+        for tag in etag_variants(etag):
+            if request.if_none_match.contains_weak(tag):
+                response.set_etag(tag)
+                break
+    return response
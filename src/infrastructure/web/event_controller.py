@@ -0,0 +1,104 @@
+import base64
+import binascii
+from datetime import datetime
+from flask import request, Response
+from flask_restx import Resource, Namespace
+from domain.events import EventType
+from infrastructure.bootstrap import get_user_service
+from infrastructure.web.json_codec import dumps, encode_event_rows, loads
+
+ns_event = Namespace("events", description="Event log queries")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+_EVENT_TYPES = frozenset(event_type.value for event_type in EventType)
+
+
+def encode_cursor(row) -> str:
+    """Opaque keyset cursor pointing after the given event row"""
+    raw = dumps([row["occurred_at"], row["id"]])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        occurred_at, event_id = loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if not isinstance(occurred_at, str) or not isinstance(event_id, int):
+        raise ValueError("Invalid cursor")
+    return occurred_at, event_id
+
+
+def _timestamp(name: str):
+    """Normalize a query timestamp to the stored format (local time, ISO 8601)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' timestamp: {value}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat()
+
+
+def _int_arg(name: str, default=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+
+
+@ns_event.route("")
+class EventsResource(Resource):
+    @ns_event.doc("query_events")
+    @ns_event.param(
+        "type",
+        "Event type (repeat for several types)",
+        type="array",
+        items={"type": "string", "enum": sorted(_EVENT_TYPES)},
+        collectionFormat="multi",
+    )
+    @ns_event.param("from", "Only events at or after this ISO 8601 timestamp")
+    @ns_event.param("to", "Only events before this ISO 8601 timestamp")
+    @ns_event.param("actor", "ID of the user who triggered the event", type=int)
+    @ns_event.param("limit", f"Page size (max {MAX_PAGE_SIZE})", type=int)
+    @ns_event.param("cursor", "next_cursor of the previous page")
+    @ns_event.response(200, "Success")
+    @ns_event.response(400, "Invalid filters")
+    def get(self):
+        """Query the event log by type, time range and actor, ordered by time"""
+        try:
+            event_types = request.args.getlist("type") or None
+            unknown = set(event_types or ()) - _EVENT_TYPES
+            if unknown:
+                raise ValueError(f"Unknown event type(s): {', '.join(sorted(unknown))}")
+            limit = _int_arg("limit", DEFAULT_PAGE_SIZE)
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+            cursor = request.args.get("cursor")
+            rows = get_user_service().query_events(
+                event_types=event_types,
+                since=_timestamp("from"),
+                until=_timestamp("to"),
+                actor=_int_arg("actor"),
+                after=decode_cursor(cursor) if cursor else None,
+                limit=limit,
+            )
+        except ValueError as e:
+            ns_event.abort(400, str(e))
+
+        next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+        body = (
+            b'{"events":'
+            + encode_event_rows(rows)
+            + b',"next_cursor":'
+            + dumps(next_cursor)
+            + b"}"
+        )
+        return Response(body, status=200, mimetype="application/json")
@@ -0,0 +1,163 @@
+import functools
+import hashlib
+import json
+import os
+import time
+from typing import Optional, Tuple
+from flask import request, Response
+from flask_restx.utils import unpack
+from infrastructure.bootstrap import init_schema
+from infrastructure.db.database import transaction
+from infrastructure.web.api_config import api
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# por quanto tempo (s) uma resposta fica disponível para retries
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+# por quanto tempo (s) uma chave fica reservada para um request em andamento;
+# se o processo morrer antes de responder, a chave volta a valer depois disso
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class IdempotencyStore:
+    """Respostas já enviadas, por chave de idempotência, na tabela idempotency_keys
+
+    A tabela fica no banco do contexto atual (o shard do tenant, se houver),
+    de modo que todos os workers veem as mesmas chaves. A chave é reservada
+    com INSERT ... ON CONFLICT: só um request consegue inseri-la. Linhas
+    vencidas são apagadas antes de cada reserva.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL,
+        lock_timeout: float = IDEMPOTENCY_LOCK_TIMEOUT,
+    ):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    def begin(self, key: tuple, fingerprint: str) -> Optional[Tuple[int, dict, bytes]]:
+        """Reserva a chave; retorna a resposta guardada se ela já foi processada
+
+        Lança IdempotencyConflict se a chave está em uso por outro request ainda
+        em andamento (409) ou foi usada com outro corpo (422).
+        """
+        init_schema()
+        now = time.time()
+        with transaction() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+            claimed = conn.execute(
+                """
+                INSERT INTO idempotency_keys
+                    (method, path, idempotency_key, fingerprint, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (method, path, idempotency_key) DO NOTHING
+            """,
+                (*key, fingerprint, now + min(self.lock_timeout, self.ttl)),
+            ).rowcount
+            if claimed:
+                return None
+            entry = conn.execute(
+                """
+                SELECT fingerprint, status, headers, body FROM idempotency_keys
+                WHERE method = ? AND path = ? AND idempotency_key = ?
+            """,
+                key,
+            ).fetchone()
+        if entry[0] != fingerprint:
+            raise IdempotencyConflict(
+                422, "Idempotency-Key was already used with a different request"
+            )
+        if entry[1] is None:
+            raise IdempotencyConflict(
+                409, "A request with this Idempotency-Key is still in progress"
+            )
+        return entry[1], json.loads(entry[2]), entry[3]
+
+    def complete(self, key: tuple, status: int, headers: dict, body: bytes):
+        with transaction() as conn:
+            conn.execute(
+                """
+                UPDATE idempotency_keys
+                SET status = ?, headers = ?, body = ?, expires_at = ?
+                WHERE method = ? AND path = ? AND idempotency_key = ?
+                AND status IS NULL
+            """,
+                (status, json.dumps(headers), body, time.time() + self.ttl, *key),
+            )
+
+    def release(self, key: tuple):
+        """Libera a chave de um request que falhou, permitindo um novo retry"""
+        with transaction() as conn:
+            conn.execute(
+                """
+                DELETE FROM idempotency_keys
+                WHERE method = ? AND path = ? AND idempotency_key = ?
+                AND status IS NULL
+            """,
+                key,
+            )
+
+
+_store = IdempotencyStore()
+
+
+def _replay(response: Tuple[int, dict, bytes]) -> Response:
+    status, headers, body = response
+    replayed = Response(body, status=status, headers=headers)
+    replayed.headers["Idempotent-Replayed"] = "true"
+    return replayed
+
+
+def idempotent(view):
+    """Responde retries com o mesmo Idempotency-Key a partir da resposta guardada
+
+    Só respostas 2xx são guardadas; erros liberam a chave para que o cliente
+    possa tentar de novo. A chave vale por método e rota, no banco do tenant.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not idempotency_key:
+            return view(*args, **kwargs)
+        if len(idempotency_key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+            api.abort(400, "Idempotency-Key is too long")
+
+        key = (request.method, request.path, idempotency_key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        try:
+            cached = _store.begin(key, fingerprint)
+        except IdempotencyConflict as e:
+            api.abort(e.status, e.message)
+        if cached is not None:
+            return _replay(cached)
+
+        try:
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response):
+                data, code, headers = unpack(response)
+                response = api.make_response(data, code, headers=headers)
+        except BaseException:
+            _store.release(key)
+            raise
+
+        if 200 <= response.status_code < 300:
+            headers = {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in ("content-length", "content-encoding")
+            }
+            _store.complete(key, response.status_code, headers, response.get_data())
+        else:
+            _store.release(key)
+        return response
+
+    return wrapper
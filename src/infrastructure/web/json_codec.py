@@ -0,0 +1,61 @@
+import json
+from typing import Any, Iterable, Iterator, Mapping
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializa para JSON (bytes) usando orjson quando disponível"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data) -> Any:
+    """Desserializa JSON (str ou bytes)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_event_row(row: Mapping[str, Any]) -> bytes:
+    """Serializa uma linha da tabela events reaproveitando o texto JSON de data
+
+    O payload já está gravado como JSON em events.data; ele é inserido no
+    documento sem passar por loads/dumps.
+    """
+    head = dumps(
+        {
+            "event_id": row["id"],
+            "event_type": row["event_type"],
+            "aggregate_id": row["aggregate_id"],
+            "occurred_at": row["occurred_at"],
+            "version": row["version"],
+        }
+    )
+    return head[:-1] + b',"data":' + row["data"].encode("utf-8") + b"}"
+
+
+def encode_event_rows(rows: Iterable[Mapping[str, Any]]) -> bytes:
+    """Serializa uma lista de linhas de events como um array JSON"""
+    return b"".join(iter_encode_event_rows(rows))
+
+
+def iter_encode_event_rows(
+    rows: Iterable[Mapping[str, Any]], chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """Gera o array JSON das linhas de events em blocos de ~chunk_size bytes"""
+    buffer = bytearray(b"[")
+    separator = b""
+    for row in rows:
+        buffer += separator
+        buffer += encode_event_row(row)
+        separator = b","
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
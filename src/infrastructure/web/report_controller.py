@@ -0,0 +1,72 @@
+from flask import request
+from flask_restx import Resource, Namespace
+from infrastructure.bootstrap import get_projection, get_user_service
+from infrastructure.projections.base import GRANULARITIES
+from infrastructure.projections.headcount import headcount_cube
+from infrastructure.projections.payroll import payroll_rollup
+from infrastructure.web.result_cache import cached_json
+
+ns_report = Namespace("reports", description="Pre-aggregated HR reports")
+
+
+def _projection(name: str):
+    projection = get_projection(name)
+    if projection is None:
+        ns_report.abort(501, "Reports require the SQLite storage backend")
+    return projection
+
+
+def _report(projection):
+    """Série da projeção para os parâmetros do request, servida do cache de resultados
+
+    Os buckets só mudam com eventos novos, então o resultado vale enquanto o
+    watermark de escrita não muda.
+    """
+    dimension = request.args.get("dimension", "department")
+    granularity = request.args.get("granularity", "month")
+    watermark = get_user_service().get_state_watermark()
+
+    def compute():
+        series = projection.series(
+            dimension=dimension,
+            granularity=granularity,
+            start=request.args.get("from"),
+            end=request.args.get("to"),
+            value=request.args.get("value"),
+        )
+        return {"dimension": dimension, "granularity": granularity, "series": series}
+
+    try:
+        return cached_json(f"reports/{projection.name}", watermark, compute)
+    except ValueError as e:
+        ns_report.abort(400, str(e))
+
+
+@ns_report.route("/payroll")
+class PayrollReportResource(Resource):
+    @ns_report.doc("payroll_report")
+    @ns_report.param("dimension", "Group by", enum=list(payroll_rollup.dimensions))
+    @ns_report.param("granularity", "Bucket size", enum=list(GRANULARITIES))
+    @ns_report.param("from", "First period (YYYY-MM or YYYY-MM-DD)")
+    @ns_report.param("to", "Last period, inclusive")
+    @ns_report.param("value", "Only this department/position")
+    @ns_report.response(200, "Success")
+    @ns_report.response(400, "Invalid parameters")
+    def get(self):
+        """Monthly payroll, headcount and average salary per department or position"""
+        return _report(_projection("payroll"))
+
+
+@ns_report.route("/headcount")
+class HeadcountReportResource(Resource):
+    @ns_report.doc("headcount_report")
+    @ns_report.param("dimension", "Group by", enum=list(headcount_cube.dimensions))
+    @ns_report.param("granularity", "Bucket size", enum=list(GRANULARITIES))
+    @ns_report.param("from", "First period (YYYY-MM or YYYY-MM-DD)")
+    @ns_report.param("to", "Last period, inclusive")
+    @ns_report.param("value", "Only this department/employment type")
+    @ns_report.response(200, "Success")
+    @ns_report.response(400, "Invalid parameters")
+    def get(self):
+        """Headcount, hires, exits, transfers and attrition per department or employment type"""
+        return _report(_projection("headcount"))
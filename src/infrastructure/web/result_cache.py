@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+from flask import Response, request
+from infrastructure.db.database import get_database_path
+from infrastructure.web.json_codec import dumps
+
+# memória máxima (bytes) das respostas guardadas por processo; 0 desliga o cache
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# respostas maiores que isso não são guardadas (não expulsam o resto do cache)
+RESULT_CACHE_MAX_ENTRY_BYTES = int(
+    os.environ.get("RESULT_CACHE_MAX_ENTRY_BYTES", RESULT_CACHE_MAX_BYTES // 4)
+)
+
+
+class ResultCache:
+    """LRU de respostas JSON já serializadas, limitado em bytes
+
+    Cada entrada guarda o watermark de escrita (id do último evento que
+    alterou estado) com que foi calculada e só vale enquanto ele não muda:
+    qualquer escrita, de qualquer processo, invalida as entradas antigas.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[int, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, watermark: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != watermark:
+                self.stale += 1
+                self._remove(key)
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, watermark: int, body: bytes):
+        if len(body) > min(self.max_entry_bytes, self.max_bytes):
+            return
+        with self._lock:
+            if key in self._entries:
+                if self._entries[key][0] > watermark:
+                    # outra thread já guardou um resultado mais novo
+                    return
+                self._remove(key)
+            self._entries[key] = (watermark, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _remove(self, key: Hashable):
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+
+result_cache = ResultCache()
+
+
+def request_cache_key(endpoint: str) -> tuple:
+    """Chave do request: banco (tenant/shard), endpoint e query string normalizada"""
+    args = tuple(sorted(request.args.items(multi=True)))
+    return get_database_path(), endpoint, args
+
+
+def cached_json(
+    endpoint: str,
+    watermark: int,
+    compute: Callable[[], Any],
+    on_hit: Callable[[], None] = None,
+) -> Response:
+    """Responde com o JSON guardado para o request ou o calcula e guarda
+
+    O watermark deve ser lido antes de compute(): se uma escrita acontecer no
+    meio, a entrada fica com o watermark antigo e é recalculada na próxima.
+    on_hit roda quando a resposta vem do cache (ex.: eventos de auditoria).
+    """
+    key = request_cache_key(endpoint)
+    body = result_cache.get(key, watermark)
+    if body is None:
+        body = dumps(compute())
+        result_cache.put(key, watermark, body)
+    elif on_hit is not None:
+        on_hit()
+    return Response(body, status=200, mimetype="application/json")
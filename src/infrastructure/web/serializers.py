@@ -14,4 +14,5 @@ def user_to_dict(user):
         "hire_date": user.hire_date,
         "birth_date": user.birth_date,
         "address": user.address,
+        "version": user.version,
     }
@@ -30,6 +30,19 @@ def generate_swagger_model_from_class(cls, exclude_fields=None):
     if exclude_fields is None:
         exclude_fields = []
 
+    return _reflect_class_fields(cls, exclude_fields)
+
+
+def generate_patch_model_from_class(cls, exclude_fields=None):
+    """Gera um modelo Swagger com todos os campos opcionais (atualizações parciais)"""
+    if exclude_fields is None:
+        exclude_fields = []
+
+    return _reflect_class_fields(cls, exclude_fields, all_optional=True)
+
+
+def _reflect_class_fields(cls, exclude_fields, all_optional=False):
+    """Inspeciona o __init__ da classe e monta os campos Swagger"""
     swagger_fields = {}
     sig = inspect.signature(cls.__init__)
 
@@ -42,7 +55,7 @@ def generate_swagger_model_from_class(cls, exclude_fields=None):
         if param_name == "self" or param_name in exclude_fields:
             continue
 
-        is_required = param.default == inspect.Parameter.empty
+        is_required = not all_optional and param.default == inspect.Parameter.empty
         param_type = type_hints.get(param_name, str)
 
         enum_values = get_enum_values(param_name)
@@ -0,0 +1,76 @@
+from contextlib import ExitStack
+from typing import Iterable, Iterator
+from flask import Flask, g, request
+from infrastructure.db.database import (
+    TENANT_DATA_DIR,
+    get_current_tenant,
+    tenant_exists,
+    tenant_scope,
+)
+
+TENANT_HEADER = "X-Tenant-ID"
+# rotas que não dependem de tenant
+TENANT_EXEMPT_PATHS = ("/health", "/docs", "/swagger.json", "/swaggerui")
+
+
+def tenant_required(path: str) -> bool:
+    """Com TENANT_DATA_DIR definido, toda rota da API precisa do header de tenant"""
+    return TENANT_DATA_DIR is not None and not (
+        path == "/" or path.startswith(TENANT_EXEMPT_PATHS)
+    )
+
+
+def _bind_tenant():
+    if not tenant_required(request.path):
+        return None
+    tenant_id = request.headers.get(TENANT_HEADER)
+    if not tenant_id:
+        return {"message": f"Missing {TENANT_HEADER} header"}, 400
+    try:
+        exists = tenant_exists(tenant_id)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    if not exists:
+        # shards são criados por provision_tenant.py, nunca por um request
+        return {"message": f"Unknown tenant: {tenant_id}"}, 404
+    scope = ExitStack()
+    scope.enter_context(tenant_scope(tenant_id))
+    # desfeito no teardown do request
+    g.tenant_scope = scope
+    return None
+
+
+def _release_tenant(exc=None):
+    scope = g.pop("tenant_scope", None)
+    if scope is not None:
+        scope.close()
+
+
+def _vary_on_tenant(response):
+    if TENANT_DATA_DIR is not None:
+        response.vary.add(TENANT_HEADER)
+    return response
+
+
+def stream_in_tenant(iterable: Iterable) -> Iterator:
+    """Consome um corpo de resposta em streaming no shard do tenant do request
+
+    O corpo é lido depois do teardown do request, quando o tenant já foi
+    desvinculado do contexto.
+    """
+    tenant_id = get_current_tenant()
+    if tenant_id is None:
+        return iter(iterable)
+    return _iter_in_tenant(tenant_id, iterable)
+
+
+def _iter_in_tenant(tenant_id: str, iterable: Iterable) -> Iterator:
+    with tenant_scope(tenant_id):
+        yield from iterable
+
+
+def init_tenancy(app: Flask):
+    """Seleciona o shard do tenant em cada request (sem efeito se não houver TENANT_DATA_DIR)"""
+    app.before_request(_bind_tenant)
+    app.after_request(_vary_on_tenant)
+    app.teardown_request(_release_tenant)
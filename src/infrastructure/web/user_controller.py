@@ -1,67 +1,98 @@
+import io
+import re
+import uuid
 from flask_restx import Resource, Namespace, fields
-from flask import request
-from application.user_service import UserService
-from infrastructure.db.sqlite_user_repository import SqliteUserRepository
-from infrastructure.db.database import init_db
-from infrastructure.db.event_store import EventStore
+from flask import request, Response
+from infrastructure.bootstrap import get_user_importer, get_user_service
+from infrastructure.db.user_import import FORMATS, UserImportError
 from domain.user import User
 from infrastructure.web.swagger_mapper import (
     generate_swagger_model_from_class,
+    generate_patch_model_from_class,
     generate_response_model_from_class,
 )
 from infrastructure.web.serializers import user_to_dict
-from infrastructure.event_bus import get_event_bus
-from application.event_handlers import (
-    LogEventHandler,
-    PositionChangeNotificationHandler,
-    SalaryChangeAuditHandler,
-    DepartmentChangeHandler,
-    UserActivationHandler,
-    PositionChangeHandler,
-    QueryAuditHandler,
+from infrastructure.web.json_codec import iter_encode_event_rows
+from infrastructure.web.result_cache import cached_json
+from infrastructure.web.tenancy import stream_in_tenant
+from infrastructure.web.idempotency import IDEMPOTENCY_KEY_HEADER, idempotent
+from domain.exceptions import ConcurrencyError
+from infrastructure.web.conditional import (
+    make_etag,
+    to_http_datetime,
+    validator_headers,
+    is_not_modified,
+    precondition_failed,
+    not_modified_response,
 )
 from domain.enums import Position
-from domain.events import EventType
 
 ns_user = Namespace("user", description="User related operations")
 
-init_db()
-
-event_bus = get_event_bus()
-log_handler = LogEventHandler()
-position_handler = PositionChangeNotificationHandler()
-salary_handler = SalaryChangeAuditHandler()
-department_handler = DepartmentChangeHandler()
-activation_handler = UserActivationHandler()
-position_change_handler = PositionChangeHandler()
-query_audit_handler = QueryAuditHandler()
-
-for event_type in EventType:
-    event_bus.subscribe(event_type, log_handler.handle)
-
-event_bus.subscribe(EventType.POSITION_CHANGED, position_handler.handle)
-event_bus.subscribe(EventType.SALARY_CHANGED, salary_handler.handle)
-event_bus.subscribe(EventType.DEPARTMENT_CHANGED, department_handler.handle)
-event_bus.subscribe(EventType.USER_ACTIVATED, activation_handler.handle)
-event_bus.subscribe(EventType.USER_DEACTIVATED, activation_handler.handle)
-event_bus.subscribe(EventType.USER_PROMOTED, position_change_handler.handle)
-event_bus.subscribe(EventType.USER_DEMOTED, position_change_handler.handle)
-event_bus.subscribe(EventType.USER_QUERIED, query_audit_handler.handle)
-event_bus.subscribe(EventType.USER_LIST_QUERIED, query_audit_handler.handle)
-event_bus.subscribe(EventType.USER_EVENTS_QUERIED, query_audit_handler.handle)
-
-user_repository = SqliteUserRepository()
-event_store = EventStore()
-user_service = UserService(user_repository, event_store)
-
 user_input_model = ns_user.model(
-    "UserInput", generate_swagger_model_from_class(User, exclude_fields=["id"])
+    "UserInput", generate_swagger_model_from_class(User, exclude_fields=["id", "version"])
+)
+user_patch_model = ns_user.model(
+    "UserPatch", generate_patch_model_from_class(User, exclude_fields=["id", "version"])
 )
 user_response_model = ns_user.model(
     "UserResponse", generate_response_model_from_class(User)
 )
 
 
+_IMPORT_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_IMPORT_MIMETYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+}
+
+
+def _user_importer(import_id: str):
+    if not _IMPORT_ID.match(import_id):
+        ns_user.abort(400, "import_id must be 1-64 letters, digits, '.', '_' or '-'")
+    importer = get_user_importer(import_id)
+    if importer is None:
+        ns_user.abort(501, "Imports require the SQLite storage backend")
+    return importer
+
+
+# maior página de histórico com limit/before
+HISTORY_MAX_LIMIT = 1000
+HISTORY_DEFAULT_LIMIT = 100
+
+
+def _history_page():
+    """(limit, before) do request; limit None quando nenhum dos dois foi passado"""
+    if "limit" not in request.args and "before" not in request.args:
+        return None, None
+    try:
+        limit = int(request.args.get("limit", HISTORY_DEFAULT_LIMIT))
+        before = request.args.get("before")
+        before = int(before) if before is not None else None
+    except ValueError:
+        ns_user.abort(400, "limit and before must be integers")
+    if not 1 <= limit <= HISTORY_MAX_LIMIT:
+        ns_user.abort(400, f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+    return limit, before
+
+
+def _user_validators(user_id, version, updated_at=None):
+    return validator_headers(
+        make_etag("user", user_id, version), to_http_datetime(updated_at)
+    )
+
+
+def _if_match_version(user_id):
+    """Versão esperada pelo If-Match do request (None se ausente); 412 se não bater"""
+    if not request.if_match:
+        return None
+    current = get_user_service().get_user_version(user_id)
+    if precondition_failed(current and make_etag("user", user_id, current[0])):
+        ns_user.abort(412, "User was modified since the given ETag")
+    return current[0]
+
+
 @ns_user.route("/")
 class UsersResource(Resource):
     @ns_user.doc("get_all_users")
@@ -70,8 +101,15 @@ class UsersResource(Resource):
     def get(self):
         """Get the list of users"""
         try:
-            users = user_service.get_all_users()
-            return [user_to_dict(u) for u in users], 200
+            user_service = get_user_service()
+            # the list only changes with a write: repeated polls are served from
+            # the result cache, still recording the list query event
+            return cached_json(
+                "users",
+                user_service.get_state_watermark(),
+                lambda: [user_to_dict(u) for u in user_service.get_all_users()],
+                on_hit=user_service.record_user_list_query,
+            )
         except Exception as e:
             ns_user.abort(500, "Error listing users")
 
@@ -80,11 +118,13 @@ class UsersResource(Resource):
     @ns_user.response(201, "User created successfully", user_response_model)
     @ns_user.response(400, "Invalid data")
     @ns_user.response(500, "Internal error")
+    @ns_user.param(IDEMPOTENCY_KEY_HEADER, "Replays the stored response on retries", _in="header")
+    @idempotent
     def post(self):
         """Create a new user"""
         try:
             user_data = request.json
-            user = user_service.create_user(user_data)
+            user = get_user_service().create_user(user_data)
             return user_to_dict(user), 201
         except ValueError as e:
             ns_user.abort(400, str(e))
@@ -96,14 +136,30 @@ class UsersResource(Resource):
 class UserResource(Resource):
     @ns_user.doc("get_user")
     @ns_user.response(200, "Success", user_response_model)
+    @ns_user.response(304, "Not modified")
     @ns_user.response(404, "User not found")
     @ns_user.response(500, "Internal error")
     def get(self, user_id):
         """Get a specific user by ID"""
         try:
+            user_service = get_user_service()
+            current = user_service.get_user_version(user_id)
+            if current and is_not_modified(
+                make_etag("user", user_id, current[0]), to_http_datetime(current[1])
+            ):
+                user_service.record_user_query(user_id)
+                return not_modified_response(_user_validators(user_id, *current))
+
             user = user_service.get_user(user_id)
             if user:
-                return user_to_dict(user), 200
+                # the ETag comes from the loaded row, so it always matches the
+                # representation even if the user changed after get_user_version
+                updated_at = current[1] if current and current[0] == user.version else None
+                return (
+                    user_to_dict(user),
+                    200,
+                    _user_validators(user_id, user.version, updated_at),
+                )
             ns_user.abort(404, "User not found")
         except Exception as e:
             ns_user.abort(500, "Error fetching user")
@@ -113,31 +169,71 @@ class UserResource(Resource):
     @ns_user.response(200, "User updated successfully", user_response_model)
     @ns_user.response(400, "Invalid data")
     @ns_user.response(404, "User not found")
+    @ns_user.response(409, "User was modified concurrently")
+    @ns_user.response(412, "User was modified since the given If-Match ETag")
     @ns_user.response(500, "Internal error")
     def put(self, user_id):
         """Update an existing user"""
+        expected_version = _if_match_version(user_id)
         try:
             user_data = request.json
-            user = user_service.update_user(user_id, user_data)
+            user = get_user_service().update_user(
+                user_id, user_data, expected_version=expected_version
+            )
             if user:
-                return user_to_dict(user), 200
+                return user_to_dict(user), 200, _user_validators(user_id, user.version)
             ns_user.abort(404, "User not found")
+        except ConcurrencyError as e:
+            ns_user.abort(409, str(e))
+        except ValueError as e:
+            ns_user.abort(400, str(e))
+        except Exception as e:
+            ns_user.abort(500, "Error updating user")
+
+    @ns_user.doc("patch_user")
+    @ns_user.expect(user_patch_model)
+    @ns_user.response(200, "User updated successfully", user_response_model)
+    @ns_user.response(400, "Invalid data")
+    @ns_user.response(404, "User not found")
+    @ns_user.response(409, "User was modified concurrently")
+    @ns_user.response(412, "User was modified since the given If-Match ETag")
+    @ns_user.response(500, "Internal error")
+    def patch(self, user_id):
+        """Update only the given fields of a user"""
+        expected_version = _if_match_version(user_id)
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict):
+            ns_user.abort(400, "Request body must be a JSON object")
+        try:
+            user = get_user_service().patch_user(
+                user_id, changes, expected_version=expected_version
+            )
+        except ConcurrencyError as e:
+            ns_user.abort(409, str(e))
         except ValueError as e:
             ns_user.abort(400, str(e))
         except Exception as e:
             ns_user.abort(500, "Error updating user")
+        if not user:
+            ns_user.abort(404, "User not found")
+        return user_to_dict(user), 200, _user_validators(user_id, user.version)
 
     @ns_user.doc("delete_user")
     @ns_user.response(200, "User deleted successfully")
     @ns_user.response(404, "User not found")
+    @ns_user.response(409, "User was modified concurrently")
+    @ns_user.response(412, "User was modified since the given If-Match ETag")
     @ns_user.response(500, "Internal error")
     def delete(self, user_id):
         """Delete a user"""
+        expected_version = _if_match_version(user_id)
         try:
-            deleted = user_service.delete_user(user_id)
+            deleted = get_user_service().delete_user(user_id, expected_version)
             if deleted:
                 return {"msg": "User deleted successfully"}, 200
             ns_user.abort(404, "User not found")
+        except ConcurrencyError as e:
+            ns_user.abort(409, str(e))
         except Exception as e:
             ns_user.abort(500, "Error deleting user")
 
@@ -145,16 +241,114 @@ class UserResource(Resource):
 @ns_user.route("/<int:user_id>/events")
 class UserEventsResource(Resource):
     @ns_user.doc("get_user_events")
+    @ns_user.param("limit", "Only the last N events (max 1000)")
+    @ns_user.param("before", "Only events with id lower than this (older pages)")
     @ns_user.response(200, "User event history")
+    @ns_user.response(304, "Not modified")
+    @ns_user.response(400, "Invalid parameters")
     def get(self, user_id):
-        """Get a user's event history"""
+        """Get a user's event history, or its most recent events with limit/before"""
+        limit, before = _history_page()
         try:
-            events = user_service.get_user_events(user_id)
-            return [e.to_dict() for e in events], 200
+            user_service = get_user_service()
+            watermark = user_service.get_user_watermark(user_id)
+            etag = watermark and make_etag("events", user_id, watermark[0])
+            last_modified = watermark and to_http_datetime(watermark[1])
+            # query events are appended on every read, so the history is only
+            # semantically unchanged: the ETag is weak
+            headers = validator_headers(etag, last_modified, weak=True)
+            if watermark and is_not_modified(etag, last_modified):
+                user_service.record_user_events_query(user_id)
+                return not_modified_response(headers)
+
+            if limit is not None:
+                rows = user_service.get_recent_user_events_raw(user_id, limit, before)
+                return Response(
+                    iter_encode_event_rows(rows),
+                    status=200,
+                    headers=headers,
+                    mimetype="application/json",
+                )
+
+            rows = user_service.get_user_events_raw(user_id)
+            # the cursor is read while streaming, after the view returns
+            return Response(
+                stream_in_tenant(iter_encode_event_rows(rows)),
+                status=200,
+                headers=headers,
+                mimetype="application/json",
+            )
         except Exception as e:
             ns_user.abort(500, "Error fetching events")
 
 
+@ns_user.route("/<int:user_id>/versions/<int:version>")
+class UserVersionResource(Resource):
+    @ns_user.doc("get_user_version")
+    @ns_user.response(200, "User fields as of the given version")
+    @ns_user.response(404, "User or version not found")
+    @ns_user.response(500, "Internal error")
+    def get(self, user_id, version):
+        """Get a user as it was at a version, rebuilt from its events"""
+        try:
+            image = get_user_service().get_user_image(user_id, version)
+        except Exception as e:
+            ns_user.abort(500, "Error fetching user version")
+        if image is None:
+            ns_user.abort(404, "User version not found")
+        return image
+
+
+@ns_user.route("/import")
+class UserImportResource(Resource):
+    @ns_user.doc("import_users")
+    @ns_user.param("format", "File format (default: from Content-Type)", enum=list(FORMATS))
+    @ns_user.param("import_id", "Resume the import with this id (default: a new one)")
+    @ns_user.response(200, "Import finished; rows that failed are listed in errors")
+    @ns_user.response(400, "Invalid file or parameters")
+    @ns_user.response(501, "Not supported by the storage backend")
+    def post(self):
+        """Bulk import users from a CSV or JSON Lines request body
+
+        Columns are the user fields plus optional "id" and "manager_id" from the
+        source system; "manager_id" is another row's "id", or "user:<id>" for an
+        existing user. Managers are created before their reports. Re-posting the
+        same file with the same import_id resumes an interrupted import.
+        """
+        file_format = request.args.get("format") or _IMPORT_MIMETYPES.get(
+            request.mimetype
+        )
+        if file_format not in FORMATS:
+            ns_user.abort(400, f"format must be one of: {', '.join(FORMATS)}")
+        importer = _user_importer(request.args.get("import_id") or uuid.uuid4().hex)
+        try:
+            stream = io.BufferedReader(request.stream)
+            return importer.run(stream, file_format, source="api"), 200
+        except UserImportError as e:
+            ns_user.abort(400, str(e))
+
+
+@ns_user.route("/import/<string:import_id>")
+class UserImportStatusResource(Resource):
+    @ns_user.doc("get_user_import")
+    @ns_user.param("after", "Only errors after this row number")
+    @ns_user.param("limit", "Maximum errors returned (default 100)")
+    @ns_user.response(200, "Import progress and error report")
+    @ns_user.response(404, "Import not found")
+    def get(self, import_id):
+        """Get the progress and the error report of an import"""
+        importer = _user_importer(import_id)
+        try:
+            after = int(request.args.get("after", 0))
+            limit = min(int(request.args.get("limit", 100)), 1000)
+        except ValueError:
+            ns_user.abort(400, "after and limit must be integers")
+        progress = importer.progress(errors_after=after, errors_limit=limit)
+        if progress is None:
+            ns_user.abort(404, "Import not found")
+        return progress, 200
+
+
 @ns_user.route("/<int:user_id>/change-position")
 class UserPositionChangeResource(Resource):
     @ns_user.doc("change_position")
@@ -177,6 +371,9 @@ class UserPositionChangeResource(Resource):
     @ns_user.response(200, "Position changed successfully", user_response_model)
     @ns_user.response(404, "User not found")
     @ns_user.response(400, "Invalid data")
+    @ns_user.response(409, "User was modified concurrently")
+    @ns_user.param(IDEMPOTENCY_KEY_HEADER, "Replays the stored response on retries", _in="header")
+    @idempotent
     def post(self, user_id):
         """Change an employee's position (promotion, demotion, or lateral move)"""
         try:
@@ -185,12 +382,14 @@ class UserPositionChangeResource(Resource):
             new_salary = data.get("new_salary")
             changed_by = data.get("changed_by")
 
-            user = user_service.change_position(
+            user = get_user_service().change_position(
                 user_id, new_position, new_salary, changed_by
             )
             if user:
                 return user_to_dict(user), 200
             ns_user.abort(404, "User not found")
+        except ConcurrencyError as e:
+            ns_user.abort(409, str(e))
         except ValueError as e:
             ns_user.abort(400, str(e))
         except Exception as e:
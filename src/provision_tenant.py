@@ -0,0 +1,30 @@
+"""Cria o shard SQLite de um ou mais tenants em TENANT_DATA_DIR.
+
+A API só atende tenants já provisionados (X-Tenant-ID de um tenant sem shard
+recebe 404). Rodar de novo para um tenant existente só atualiza o schema.
+
+Uso (a partir de src/):
+    TENANT_DATA_DIR=tenants python provision_tenant.py acme [beta ...]
+"""
+
+import argparse
+from infrastructure.db.database import TENANT_DATA_DIR, provision_tenant
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("tenants", nargs="+")
+    args = parser.parse_args()
+    if TENANT_DATA_DIR is None:
+        parser.error("TENANT_DATA_DIR is not set")
+
+    for tenant_id in args.tenants:
+        try:
+            created = provision_tenant(tenant_id)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{tenant_id}: {'created' if created else 'schema updated'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Recalcula as projeções de relatório a partir do log de events.
+
+Necessário só depois de mudar a lógica de uma projeção: no uso normal elas
+são mantidas pelos handlers e fazem o backfill sozinhas na primeira vez.
+Com TENANT_DATA_DIR, use --tenant para cada tenant.
+
+Uso (a partir de src/):
+    python rebuild_projections.py [--tenant acme] [payroll ...]
+"""
+
+import argparse
+import time
+from contextlib import nullcontext
+from infrastructure.bootstrap import PROJECTIONS, init_schema
+from infrastructure.db.database import tenant_scope
+
+
+def main():
+    names = [projection.name for projection in PROJECTIONS]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("projections", nargs="*", help=", ".join(names))
+    parser.add_argument("--tenant")
+    args = parser.parse_args()
+    unknown = set(args.projections) - set(names)
+    if unknown:
+        parser.error(f"unknown projection(s): {', '.join(sorted(unknown))}")
+
+    init_schema()
+    with tenant_scope(args.tenant) if args.tenant else nullcontext():
+        for projection in PROJECTIONS:
+            if args.projections and projection.name not in args.projections:
+                continue
+            started = time.perf_counter()
+            applied = projection.rebuild()
+            elapsed = time.perf_counter() - started
+            print(f"{projection.name}: {applied} events in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
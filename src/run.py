@@ -1,4 +1,13 @@
-from infrastructure.db.routes import app
+import os
+from infrastructure.db.routes import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # development server only; see gunicorn.conf.py for production
+    app.run(
+        host="0.0.0.0",
+        port=5000,
+        debug=os.environ.get("FLASK_DEBUG", "1") == "1",
+        threaded=True,
+    )
@@ -0,0 +1,5 @@
+from infrastructure.db.routes import create_app
+
+# entry point for production WSGI servers, e.g.:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()